@@ -1,25 +1,277 @@
 ﻿"""
 backup_utils.py - Утилиты для создания и управления бэкапами базы данных
+
+Копия снимается онлайн через sqlite3 backup API: по BACKUP_PAGES_PER_STEP
+страниц за шаг с паузой между шагами, так что бот продолжает писать в базу,
+а копия всегда согласована (не "рваная", как при побайтовом копировании
+файла). Каждая копия проверяется PRAGMA integrity_check. Все функции
+блокирующие - из бота их вызывают через create_backup_async (в потоке).
+
+Отпечаток содержимого (SHA-256 строк всех таблиц, кроме служебных
+Config.BACKUP_IGNORED_TABLES) сохраняется после каждого бэкапа. С
+skip_unchanged=True отпечаток снимка сравнивается с последним бэкапом, и если
+база не изменилась, снимок удаляется, а create_backup вернёт BACKUP_UNCHANGED.
+Живая база при этом не читается целиком под одной транзакцией.
+
+Все бэкапы записаны в каталог (database_backups/catalog.json): статистика и
+список берутся из него, без обхода папки. Хранение - "дед-отец-сын":
+последние MAX_BACKUP_FILES плюс по одному бэкапу на день, неделю и месяц
+(BACKUP_KEEP_DAILY / WEEKLY / MONTHLY), остальное удаляется.
 """
 
+import asyncio
+import hashlib
 import sqlite3
 import os
 import shutil
+import tempfile
+import threading
+import time
 import gzip
 import json
+import re
 from datetime import datetime, timedelta
 import logging
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Set
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Строк за одно чтение курсора / одну пачку вставки при экспорте и импорте NDJSON
+EXPORT_BATCH = 1000
+NDJSON_OPTIONS = {"ensure_ascii": False, "separators": (",", ":"), "default": str}
+
+BACKUP_PREFIX = "database_backup_"
+DELTA_PREFIX = "database_delta_"
+CATALOG_NAME = "catalog.json"
+READ_BLOCK = 1024 * 1024
+# Результат create_backup(skip_unchanged=True), если база не менялась (пустая строка, не None - это ошибка)
+BACKUP_UNCHANGED = ""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def format_size(size: int) -> str:
+    if size > 1024 * 1024:
+        return f"{size / (1024 * 1024):.2f} MB"
+    if size > 1024:
+        return f"{size / 1024:.2f} KB"
+    return f"{size} байт"
+
+
+def quote_identifier(name: str) -> str:
+    """Имя таблицы/колонки для SQL: в кавычках, кавычки внутри удваиваются"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def backup_format(filename: str) -> str:
+    """Формат файла по расширению: db, db.gz, ndjson, ndjson.gz или json"""
+    for suffix in ("db.gz", "db", "ndjson.gz", "ndjson"):
+        if filename.endswith("." + suffix):
+            return suffix
+    return "json"
+
+
+def content_fingerprint(conn: sqlite3.Connection) -> str:
+    """SHA-256 содержимого таблиц (без служебных, которые меняются сами по себе)"""
+    digest = hashlib.sha256()
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    for table in tables:
+        if table in Config.BACKUP_IGNORED_TABLES:
+            continue
+        digest.update(f"\x00{table}\x00".encode())
+        cursor = conn.execute(f'SELECT * FROM {quote_identifier(table)} ORDER BY rowid')
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH)
+            if not rows:
+                break
+            for row in rows:
+                digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def gfs_keep(entries: List[Dict], recent: int, daily: int, weekly: int, monthly: int) -> Set[str]:
+    """
+    Какие бэкапы оставить по схеме "дед-отец-сын"
+    
+    Всегда остаются recent самых новых; кроме них - самый новый бэкап
+    каждого из последних daily дней, weekly недель и monthly месяцев.
+    
+    Args:
+        entries: Записи каталога одного вида, новые первыми
+    
+    Returns:
+        Имена файлов, которые нужно сохранить
+    """
+    keep = {entry["file"] for entry in entries[:recent]}
+    periods: List[tuple] = [
+        (daily, lambda moment: moment.date()),
+        (weekly, lambda moment: moment.isocalendar()[:2]),
+        (monthly, lambda moment: (moment.year, moment.month)),
+    ]
+    for limit, period_of in periods:
+        seen = set()
+        for entry in entries:
+            period = period_of(datetime.fromtimestamp(entry["timestamp"]))
+            if period in seen:
+                continue
+            if len(seen) >= limit:
+                break
+            seen.add(period)
+            keep.add(entry["file"])
+    return keep
+
+
+class BackupCatalog:
+    """
+    Каталог бэкапов (catalog.json в папке бэкапов)
+    
+    Запись на каждый файл: вид (full - копия базы, json - экспорт NDJSON,
+    delta - инкрементальная дельта), формат, размер, SHA-256, время
+    создания; у полной копии - отпечаток содержимого, у дельты - имя
+    полного снимка, к которому она применяется (base). Каталог держится в
+    памяти и переписывается атомарно при каждом изменении. Если файла нет
+    (первый запуск, удалён вручную), он один раз собирается обходом папки.
+    """
+    
+    def __init__(self, backup_dir: str):
+        self.backup_dir = backup_dir
+        self.path = os.path.join(backup_dir, CATALOG_NAME)
+        self._entries: Optional[List[Dict]] = None  # Новые первыми
+        self._lock = threading.RLock()
+    
+    def load(self) -> List[Dict]:
+        with self._lock:
+            if self._entries is None:
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._entries = json.load(f)["backups"]
+                except FileNotFoundError:
+                    self._entries = self._scan()
+                    self._save()
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Каталог бэкапов повреждён ({e}), собираю заново")
+                    self._entries = self._scan()
+                    self._save()
+                self._entries.sort(key=lambda entry: entry["timestamp"], reverse=True)
+            return self._entries
+    
+    def _save(self):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "backups": self._entries}, f, ensure_ascii=False, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+    
+    @staticmethod
+    def _describe(path: str, kind: str, timestamp: float, base: Optional[str] = None,
+                  fingerprint: Optional[str] = None) -> Dict:
+        filename = os.path.basename(path)
+        return {
+            "file": filename,
+            "kind": kind,
+            "format": backup_format(filename),
+            "size": os.path.getsize(path),
+            "sha256": file_sha256(path),
+            "created": datetime.fromtimestamp(timestamp).isoformat(timespec="seconds"),
+            "timestamp": timestamp,
+            "base": base,
+            "fingerprint": fingerprint,
+        }
+    
+    def _scan(self) -> List[Dict]:
+        """Сборка каталога по файлам в папке (время - из имени файла)"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        
+        legacy = {}
+        legacy_path = os.path.join(self.backup_dir, ".last_backup.json")
+        try:
+            with open(legacy_path, encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            pass
+        
+        entries = []
+        for filename in os.listdir(self.backup_dir):
+            if not filename.startswith((BACKUP_PREFIX, DELTA_PREFIX)) or filename.endswith(".tmp"):
+                continue
+            path = os.path.join(self.backup_dir, filename)
+            match = re.search(r"_(\d{8}_\d{6})", filename)
+            if match:
+                timestamp = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+            else:
+                timestamp = os.path.getmtime(path)
+            if filename.startswith(DELTA_PREFIX):
+                kind = "delta"
+            elif ".db" in filename:
+                kind = "full"
+            else:
+                kind = "json"
+            fingerprint = legacy.get("fingerprint") if legacy.get("file") == filename else None
+            entries.append(self._describe(path, kind, timestamp, fingerprint=fingerprint))
+        
+        # Основа дельты - последний полный снимок до неё
+        entries.sort(key=lambda entry: (entry["timestamp"], entry["kind"] != "full"))
+        base = None
+        for entry in entries:
+            if entry["kind"] == "full":
+                base = entry["file"]
+            elif entry["kind"] == "delta":
+                entry["base"] = base
+        
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        logger.info(f"Каталог бэкапов собран по папке: {len(entries)} файлов")
+        return entries
+    
+    def add(self, path: str, kind: str, base: Optional[str] = None,
+            fingerprint: Optional[str] = None) -> Dict:
+        """Запись нового файла (блокирующий вызов - считает SHA-256)"""
+        entry = self._describe(path, kind, time.time(), base, fingerprint)
+        with self._lock:
+            entries = [item for item in self.load() if item["file"] != entry["file"]]
+            self._entries = [entry] + entries
+            self._save()
+        return entry
+    
+    def remove(self, filenames: Set[str]):
+        """Удаление файлов с диска и из каталога"""
+        with self._lock:
+            for filename in filenames:
+                try:
+                    os.remove(os.path.join(self.backup_dir, filename))
+                    logger.info(f"Удален старый бэкап: {filename}")
+                except FileNotFoundError:
+                    pass
+            self._entries = [entry for entry in self.load() if entry["file"] not in filenames]
+            self._save()
+    
+    def entries(self, kind: Optional[str] = None) -> List[Dict]:
+        return [entry for entry in self.load() if kind is None or entry["kind"] == kind]
+    
+    def latest(self, kind: str, where: Optional[Callable[[Dict], bool]] = None) -> Optional[Dict]:
+        for entry in self.load():
+            if entry["kind"] == kind and (where is None or where(entry)):
+                return entry
+        return None
+
+
 class DatabaseBackup:
     def __init__(self, db_path: str = Config.DATABASE_PATH):
         self.db_path = db_path
         self.backup_dir = "database_backups"
-        self.max_backups = 30  # Хранить максимум 30 бэкапов
-        self.ensure_backup_dir()
+        self.catalog = BackupCatalog(self.backup_dir)
+        # Ручной /backup, плановый и финальный бэкап в одном процессе идут по очереди
+        self._lock = threading.Lock()
+        # Папка создаётся при первом обращении, а не при импорте модуля
     
     def ensure_backup_dir(self):
         """Создание папки для бэкапов"""
@@ -27,49 +279,120 @@ class DatabaseBackup:
             os.makedirs(self.backup_dir)
             logger.info(f"Создана папка для бэкапов: {self.backup_dir}")
     
-    def create_backup(self, compress: bool = True) -> Optional[str]:
+    def snapshot(self, dest_path: str) -> str:
+        """
+        Согласованная копия базы в dest_path через backup API
+        
+        Запись в базу блокируется только на время одного шага. Если базу
+        изменили между шагами, SQLite начинает копирование заново; когда
+        при постоянной записи пошаговая копия не успевает за
+        BACKUP_STEP_DEADLINE секунд, база копируется одним шагом (писатели
+        подождут это время в пределах своего timeout).
+        
+        Returns:
+            Отпечаток содержимого копии
+        
+        Raises:
+            sqlite3.DatabaseError: если копия не прошла integrity_check
+        """
+        deadline = time.monotonic() + Config.BACKUP_STEP_DEADLINE
+        
+        def progress(status, remaining, total):
+            if time.monotonic() > deadline:
+                raise TimeoutError
+        
+        source = sqlite3.connect(self.db_path, timeout=30)
+        target = sqlite3.connect(dest_path)
+        try:
+            try:
+                source.backup(target, pages=Config.BACKUP_PAGES_PER_STEP,
+                              progress=progress, sleep=Config.BACKUP_STEP_SLEEP)
+            except TimeoutError:
+                logger.warning("Пошаговая копия не завершилась из-за постоянной записи, копирую одним шагом")
+                source.backup(target)
+            result = target.execute("PRAGMA integrity_check").fetchall()
+            if result != [("ok",)]:
+                problems = "; ".join(row[0] for row in result[:5])
+                raise sqlite3.DatabaseError(f"integrity_check копии не пройден: {problems}")
+            return content_fingerprint(target)
+        finally:
+            target.close()
+            source.close()
+    
+    def reserve_backup_path(self, prefix: str, extension: str) -> str:
         """
-        Создание бэкапа базы данных
+        Свободное имя для нового бэкапа (файл создаётся пустым и занят за вызывающим)
+        
+        Бэкап в ту же секунду, в том числе из другого процесса бота, получает
+        суффикс _2, _3... вместо того чтобы перезаписать чужой файл.
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        number = 1
+        while True:
+            suffix = f"_{number}" if number > 1 else ""
+            path = os.path.join(self.backup_dir, f"{prefix}{timestamp}{suffix}{extension}")
+            try:
+                with open(path, 'x'):
+                    return path
+            except FileExistsError:
+                number += 1
+    
+    def create_backup(self, compress: Optional[bool] = None, skip_unchanged: bool = False) -> Optional[str]:
+        """Создание бэкапа (см. _create_backup); одновременные вызовы выполняются по очереди"""
+        with self._lock:
+            return self._create_backup(compress, skip_unchanged)
+    
+    def _create_backup(self, compress: Optional[bool] = None, skip_unchanged: bool = False) -> Optional[str]:
+        """
+        Создание бэкапа базы данных (блокирующий вызов)
         
         Args:
-            compress: Сжимать ли файл с помощью gzip
+            compress: Сжимать ли файл с помощью gzip (по умолчанию Config.BACKUP_COMPRESSION)
+            skip_unchanged: Не сохранять снимок, если его отпечаток совпал с последним бэкапом
             
         Returns:
-            Путь к созданному бэкапу или None в случае ошибки
+            Путь к созданному бэкапу, BACKUP_UNCHANGED если база не менялась
+            (только при skip_unchanged) или None в случае ошибки
         """
+        self.ensure_backup_dir()
         if not os.path.exists(self.db_path):
             logger.error(f"База данных не найдена: {self.db_path}")
             return None
         
+        if compress is None:
+            compress = Config.BACKUP_COMPRESSION
+        
+        backup_path = self.reserve_backup_path(BACKUP_PREFIX, ".db" + (".gz" if compress else ""))
+        backup_name = os.path.basename(backup_path)
+        fd, snapshot_path = tempfile.mkstemp(prefix=".snapshot_", suffix=".db", dir=self.backup_dir)
+        os.close(fd)
+        
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            fingerprint = self.snapshot(snapshot_path)
+            last = self.get_last_backup() if skip_unchanged else None
+            if last and last["fingerprint"] == fingerprint:
+                for leftover in (snapshot_path, backup_path):
+                    os.remove(leftover)
+                logger.info(f"База не менялась с бэкапа {last['file']}, снимок удалён")
+                return BACKUP_UNCHANGED
+            snapshot_size = os.path.getsize(snapshot_path)
             
             if compress:
-                backup_name = f"database_backup_{timestamp}.db.gz"
-                backup_path = os.path.join(self.backup_dir, backup_name)
+                with open(snapshot_path, 'rb') as f_in:
+                    with gzip.open(backup_path + ".tmp", 'wb') as f_out:
+                        shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+                os.replace(backup_path + ".tmp", backup_path)
+                os.remove(snapshot_path)
                 
-                # Создаем сжатый бэкап
-                with open(self.db_path, 'rb') as f_in:
-                    with gzip.open(backup_path, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                
-                # Получаем размеры файлов
-                original_size = os.path.getsize(self.db_path)
                 compressed_size = os.path.getsize(backup_path)
-                compression_ratio = (1 - compressed_size / original_size) * 100
-                
-                logger.info(f"Создан сжатый бэкап: {backup_name}")
-                logger.info(f"Размер: {original_size:,} → {compressed_size:,} байт ({compression_ratio:.1f}% сжатия)")
-                
+                compression_ratio = (1 - compressed_size / snapshot_size) * 100 if snapshot_size else 0
+                logger.info(f"Создан сжатый бэкап: {backup_name} (integrity_check: ok)")
+                logger.info(f"Размер: {snapshot_size:,} → {compressed_size:,} байт ({compression_ratio:.1f}% сжатия)")
             else:
-                backup_name = f"database_backup_{timestamp}.db"
-                backup_path = os.path.join(self.backup_dir, backup_name)
-                
-                # Просто копируем файл
-                shutil.copy2(self.db_path, backup_path)
-                
-                file_size = os.path.getsize(backup_path)
-                logger.info(f"Создан бэкап: {backup_name} ({file_size:,} байт)")
+                os.replace(snapshot_path, backup_path)
+                logger.info(f"Создан бэкап: {backup_name} ({snapshot_size:,} байт, integrity_check: ok)")
+            
+            self.catalog.add(backup_path, "full", fingerprint=fingerprint)
             
             # Очищаем старые бэкапы
             self.cleanup_old_backups()
@@ -78,120 +401,226 @@ class DatabaseBackup:
             
         except Exception as e:
             logger.error(f"Ошибка создания бэкапа: {e}")
+            for leftover in (snapshot_path, backup_path + ".tmp", backup_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
             return None
     
-    def create_json_backup(self) -> Optional[str]:
-        """Создание бэкапа в формате JSON (легче для чтения)"""
+    async def create_backup_async(self, compress: Optional[bool] = None,
+                                  skip_unchanged: bool = False) -> Optional[str]:
+        """create_backup в отдельном потоке - цикл событий не блокируется"""
+        return await asyncio.to_thread(self.create_backup, compress, skip_unchanged)
+    
+    # ========== ОБНАРУЖЕНИЕ ИЗМЕНЕНИЙ ==========
+    
+    def get_last_backup(self) -> Optional[Dict]:
+        """Запись каталога о последнем полном бэкапе с отпечатком (fingerprint, file, created)"""
+        return self.catalog.latest("full", lambda entry: entry["fingerprint"] is not None)
+    
+    def create_json_backup(self, compress: Optional[bool] = None) -> Optional[str]:
+        """Экспорт в NDJSON (см. _create_json_backup); одновременные вызовы выполняются по очереди"""
+        with self._lock:
+            return self._create_json_backup(compress)
+    
+    def _create_json_backup(self, compress: Optional[bool] = None) -> Optional[str]:
+        """
+        Потоковый экспорт в NDJSON (блокирующий вызов)
+        
+        Одна строка - один JSON-объект: заголовок, схема таблицы, затем её
+        строки по одной прямо из курсора. Память не зависит от размера базы;
+        при compress файл сжимается gzip на лету. Читается не рабочая база,
+        а её согласованная копия (snapshot - пошагово, как для обычного
+        бэкапа): долгий экспорт не держит блокировку чтения, и бот всё это
+        время пишет в базу. Копия удаляется после экспорта.
+        
+        Returns:
+            Путь к файлу или None в случае ошибки
+        """
+        self.ensure_backup_dir()
+        if compress is None:
+            compress = Config.BACKUP_COMPRESSION
+        
+        json_path = self.reserve_backup_path(BACKUP_PREFIX, ".ndjson" + (".gz" if compress else ""))
+        json_name = os.path.basename(json_path)
+        fd, snapshot_path = tempfile.mkstemp(prefix=".snapshot_", suffix=".db", dir=self.backup_dir)
+        os.close(fd)
+        rows_total = 0
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Получаем все таблицы
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [row[0] for row in cursor.fetchall()]
-            
-            backup_data = {
-                "timestamp": datetime.now().isoformat(),
-                "tables": {}
-            }
-            
-            for table in tables:
-                cursor.execute(f"SELECT * FROM {table}")
-                rows = cursor.fetchall()
+            self.snapshot(snapshot_path)
+            conn = sqlite3.connect(snapshot_path)
+            try:
+                schema = conn.execute(
+                    "SELECT type, name, sql FROM sqlite_master "
+                    "WHERE type IN ('table', 'index') AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+                ).fetchall()
+                tables = [name for obj_type, name, _ in schema if obj_type == "table"]
+                # Счётчики AUTOINCREMENT (в том числе seq журнала изменений для дельт)
+                sequences = {}
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+                    sequences = dict(conn.execute("SELECT name, seq FROM sqlite_sequence").fetchall())
                 
-                # Конвертируем строки в словари
-                table_data = []
-                for row in rows:
-                    table_data.append(dict(row))
-                
-                backup_data["tables"][table] = table_data
-            
-            conn.close()
-            
-            # Сохраняем в JSON
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            json_name = f"database_backup_{timestamp}.json"
-            json_path = os.path.join(self.backup_dir, json_name)
+                opener = gzip.open if compress else open
+                with opener(json_path + ".tmp", 'wt', encoding='utf-8') as f:
+                    write = lambda record: f.write(json.dumps(record, **NDJSON_OPTIONS) + "\n")
+                    write({"type": "header", "created": datetime.now().isoformat(),
+                           "tables": tables, "sequences": sequences})
+                    
+                    for obj_type, name, sql in schema:
+                        if obj_type != "table":
+                            continue
+                        write({"type": "table", "name": name, "sql": sql})
+                        cursor = conn.execute(f'SELECT * FROM {quote_identifier(name)}')
+                        columns = [column[0] for column in cursor.description]
+                        while True:
+                            rows = cursor.fetchmany(EXPORT_BATCH)
+                            if not rows:
+                                break
+                            for row in rows:
+                                write({"t": name, "r": dict(zip(columns, row))})
+                            rows_total += len(rows)
+                    
+                    # Индексы - в конце: при импорте их дешевле строить после вставки строк
+                    for obj_type, name, sql in schema:
+                        if obj_type == "index":
+                            write({"type": "index", "name": name, "sql": sql})
+            finally:
+                conn.close()
+                os.remove(snapshot_path)
             
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, ensure_ascii=False, indent=2, default=str)
+            os.replace(json_path + ".tmp", json_path)
+            entry = self.catalog.add(json_path, "json")
+            logger.info(f"Создан JSON бэкап: {json_name} ({rows_total:,} строк, {entry['size']:,} байт)")
             
-            file_size = os.path.getsize(json_path)
-            logger.info(f"Создан JSON бэкап: {json_name} ({file_size:,} байт)")
+            self.cleanup_old_backups()
             
             return json_path
             
         except Exception as e:
             logger.error(f"Ошибка создания JSON бэкапа: {e}")
+            for leftover in (snapshot_path, json_path + ".tmp", json_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
             return None
     
+    @staticmethod
+    def import_json_backup(json_path: str, target_db_path: str) -> Dict[str, int]:
+        """
+        Потоковый импорт NDJSON-бэкапа в новую базу (блокирующий вызов)
+        
+        Строки вставляются пачками по EXPORT_BATCH; в памяти держится только
+        текущая пачка. Если импорт не удался, недоделанная база удаляется.
+        
+        Returns:
+            Количество строк по таблицам
+        """
+        if os.path.exists(target_db_path):
+            raise FileExistsError(f"{target_db_path} уже существует")
+        
+        counts: Dict[str, int] = {}
+        sequences: Dict[str, int] = {}
+        conn = sqlite3.connect(target_db_path)
+        batch: List = []
+        batch_sql = None
+        
+        def flush():
+            if batch:
+                conn.executemany(batch_sql, batch)
+                batch.clear()
+        
+        try:
+            opener = gzip.open if json_path.endswith(".gz") else open
+            with opener(json_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    
+                    if "t" in record:
+                        row = record["r"]
+                        columns = ", ".join(quote_identifier(column) for column in row)
+                        sql = (f'INSERT INTO {quote_identifier(record["t"])} ({columns}) '
+                               f'VALUES ({", ".join("?" for _ in row)})')
+                        if sql != batch_sql or len(batch) >= EXPORT_BATCH:
+                            flush()
+                            batch_sql = sql
+                        batch.append(tuple(row.values()))
+                        counts[record["t"]] = counts.get(record["t"], 0) + 1
+                    elif record["type"] in ("table", "index"):
+                        flush()
+                        conn.execute(record["sql"])
+                    elif record["type"] == "header":
+                        sequences = record.get("sequences", {})
+            flush()
+            for name, seq in sequences.items():
+                if not conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (seq, name)).rowcount:
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, seq))
+            conn.commit()
+        except BaseException:
+            conn.close()
+            os.remove(target_db_path)
+            raise
+        conn.close()
+        
+        return counts
+    
     def cleanup_old_backups(self):
-        """Удаление старых бэкапов"""
+        """
+        Удаление старых бэкапов по схеме "дед-отец-сын"
+        
+        Полные копии и JSON-экспорты прореживаются отдельно (gfs_keep);
+        дельта остаётся, пока остаётся её полный снимок - без него она
+        бесполезна, а снимок дельты никогда не удаляется раньше неё.
+        """
         try:
-            backup_files = []
-            for filename in os.listdir(self.backup_dir):
-                if filename.startswith("database_backup_"):
-                    filepath = os.path.join(self.backup_dir, filename)
-                    backup_files.append((filepath, os.path.getmtime(filepath)))
-            
-            # Сортируем по дате изменения (старые первыми)
-            backup_files.sort(key=lambda x: x[1])
+            keep = set()
+            for kind in ("full", "json"):
+                keep |= gfs_keep(
+                    self.catalog.entries(kind),
+                    recent=max(1, Config.MAX_BACKUP_FILES),
+                    daily=Config.BACKUP_KEEP_DAILY,
+                    weekly=Config.BACKUP_KEEP_WEEKLY,
+                    monthly=Config.BACKUP_KEEP_MONTHLY,
+                )
+            for entry in self.catalog.entries("delta"):
+                if entry["base"] in keep:
+                    keep.add(entry["file"])
             
-            # Удаляем лишние файлы
-            while len(backup_files) > self.max_backups:
-                old_file = backup_files.pop(0)[0]
-                os.remove(old_file)
-                logger.info(f"Удален старый бэкап: {os.path.basename(old_file)}")
+            expired = {entry["file"] for entry in self.catalog.entries()} - keep
+            if expired:
+                self.catalog.remove(expired)
                 
         except Exception as e:
             logger.error(f"Ошибка очистки бэкапов: {e}")
     
     def get_backup_stats(self) -> Dict:
-        """Получение статистики по бэкапам"""
+        """Статистика по бэкапам (из каталога, без обращения к файлам)"""
         stats = {
             "total_backups": 0,
             "total_size": 0,
             "oldest_backup": None,
             "newest_backup": None,
-            "backup_types": {"db": 0, "db.gz": 0, "json": 0}
+            "backup_types": {"db": 0, "db.gz": 0, "json": 0, "ndjson.gz": 0, "delta": 0}
         }
         
         try:
-            for filename in os.listdir(self.backup_dir):
-                if filename.startswith("database_backup_"):
-                    filepath = os.path.join(self.backup_dir, filename)
-                    stats["total_backups"] += 1
-                    stats["total_size"] += os.path.getsize(filepath)
-                    
-                    # Определяем тип файла
-                    if filename.endswith('.db.gz'):
-                        stats["backup_types"]["db.gz"] += 1
-                    elif filename.endswith('.db'):
-                        stats["backup_types"]["db"] += 1
-                    elif filename.endswith('.json'):
-                        stats["backup_types"]["json"] += 1
-                    
-                    # Обновляем даты
-                    mtime = os.path.getmtime(filepath)
-                    mtime_dt = datetime.fromtimestamp(mtime)
-                    
-                    if not stats["oldest_backup"] or mtime_dt < stats["oldest_backup"]:
-                        stats["oldest_backup"] = mtime_dt
-                    
-                    if not stats["newest_backup"] or mtime_dt > stats["newest_backup"]:
-                        stats["newest_backup"] = mtime_dt
-            
-            # Форматируем размер
-            if stats["total_size"] > 0:
-                if stats["total_size"] > 1024 * 1024:  # MB
-                    stats["total_size_formatted"] = f"{stats['total_size'] / (1024 * 1024):.2f} MB"
-                elif stats["total_size"] > 1024:  # KB
-                    stats["total_size_formatted"] = f"{stats['total_size'] / 1024:.2f} KB"
+            entries = self.catalog.entries()
+            for entry in entries:
+                stats["total_backups"] += 1
+                stats["total_size"] += entry["size"]
+                if entry["kind"] == "delta":
+                    stats["backup_types"]["delta"] += 1
+                elif entry["format"] in stats["backup_types"]:
+                    stats["backup_types"][entry["format"]] += 1
                 else:
-                    stats["total_size_formatted"] = f"{stats['total_size']} байт"
-            else:
-                stats["total_size_formatted"] = "0 байт"
+                    stats["backup_types"]["json"] += 1
+            
+            if entries:
+                # Каталог упорядочен: новые первыми
+                stats["newest_backup"] = datetime.fromtimestamp(entries[0]["timestamp"])
+                stats["oldest_backup"] = datetime.fromtimestamp(entries[-1]["timestamp"])
+            
+            stats["total_size_formatted"] = format_size(stats["total_size"])
                 
         except Exception as e:
             logger.error(f"Ошибка получения статистики бэкапов: {e}")
@@ -199,42 +628,26 @@ class DatabaseBackup:
         return stats
     
     def list_backups(self) -> List[Dict]:
-        """Список всех бэкапов"""
+        """Список всех бэкапов из каталога (новые первыми)"""
         backups = []
+        types = {"db.gz": "compressed", "db": "database"}
         
         try:
-            for filename in os.listdir(self.backup_dir):
-                if filename.startswith("database_backup_"):
-                    filepath = os.path.join(self.backup_dir, filename)
-                    
-                    backup_info = {
-                        "filename": filename,
-                        "path": filepath,
-                        "size": os.path.getsize(filepath),
-                        "modified": datetime.fromtimestamp(os.path.getmtime(filepath)),
-                        "type": "unknown"
-                    }
-                    
-                    if filename.endswith('.db.gz'):
-                        backup_info["type"] = "compressed"
-                    elif filename.endswith('.db'):
-                        backup_info["type"] = "database"
-                    elif filename.endswith('.json'):
-                        backup_info["type"] = "json"
-                    
-                    # Форматируем размер
-                    size = backup_info["size"]
-                    if size > 1024 * 1024:
-                        backup_info["size_formatted"] = f"{size / (1024 * 1024):.2f} MB"
-                    elif size > 1024:
-                        backup_info["size_formatted"] = f"{size / 1024:.2f} KB"
-                    else:
-                        backup_info["size_formatted"] = f"{size} байт"
-                    
-                    backups.append(backup_info)
-            
-            # Сортируем по дате (новые первыми)
-            backups.sort(key=lambda x: x["modified"], reverse=True)
+            for entry in self.catalog.entries():
+                if entry["kind"] == "full":
+                    backup_type = types.get(entry["format"], "database")
+                else:
+                    backup_type = entry["kind"]
+                backups.append({
+                    "filename": entry["file"],
+                    "path": os.path.join(self.backup_dir, entry["file"]),
+                    "size": entry["size"],
+                    "size_formatted": format_size(entry["size"]),
+                    "modified": datetime.fromtimestamp(entry["timestamp"]),
+                    "type": backup_type,
+                    "sha256": entry["sha256"],
+                    "base": entry["base"],
+                })
             
         except Exception as e:
             logger.error(f"Ошибка получения списка бэкапов: {e}")
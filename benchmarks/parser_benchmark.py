@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+parser_benchmark.py - Микробенчмарк парсера сообщений канала
+
+Прогоняет MessageFilter.classify_message, extract_fruits, extract_totem_info,
+format_food_message и format_totem_message на корпусе реальных постов
+(benchmarks/corpus.json), проверяет результаты по эталону и сравнивает
+задержку с сохранённой базовой линией.
+
+Примеры:
+    python benchmarks/parser_benchmark.py                  # прогон и проверка
+    python benchmarks/parser_benchmark.py --save-baseline  # сохранить базовую линию
+    python benchmarks/parser_benchmark.py --record         # перезаписать эталон в корпусе
+    python benchmarks/parser_benchmark.py --threshold 0.5  # допустимая деградация 50%
+
+Код возврата 1, если результат разошёлся с эталоном или медианная задержка
+выросла больше порога относительно базовой линии. Базовая линия зависит от
+машины и в git не хранится: без неё (свежий checkout, CI) результаты всё
+равно сверяются с эталоном, пропускается только сравнение задержки.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# Файлы данных (locales/, fruits.json) модули бота ищут от BASE_DIR, cwd не важен
+sys.path.insert(0, ROOT_DIR)
+
+from utils.filters import MessageFilter  # noqa: E402
+
+CORPUS_PATH = os.path.join(BENCH_DIR, "corpus.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+
+def load_corpus(path: str = CORPUS_PATH) -> dict:
+    """Загрузка корпуса и сборка текстов постов (включая увеличенные)"""
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    for case in corpus["cases"]:
+        text = case["text"]
+        repeat = case.get("repeat")
+        if repeat:
+            text += repeat["text"] * repeat["times"]
+        text += case.get("suffix", "")
+        case["_post"] = text
+
+    return corpus
+
+
+def snapshot(text: str) -> dict:
+    """Полный результат разбора поста - то, что сверяется с эталоном"""
+    classification = MessageFilter.classify_message(text)
+    result = {"classification": classification}
+
+    if classification["type"] == "food":
+        result["RUS"] = MessageFilter.format_food_message(classification["data"], "RUS")
+        result["EN"] = MessageFilter.format_food_message(classification["data"], "EN")
+    elif classification["type"] == "totem":
+        for lang in ("RUS", "EN"):
+            result[lang] = MessageFilter.format_totem_message(
+                classification["subtype"], classification["text"], classification["link"], lang
+            )
+
+    return result
+
+
+def build_workloads(cases: list) -> dict:
+    """Набор вызовов для замера: имя функции -> список (аргументы) по всему корпусу"""
+    posts = [case["_post"] for case in cases]
+
+    food_lists = []
+    totems = []
+    for post in posts:
+        classification = MessageFilter.classify_message(post)
+        if classification["type"] == "food":
+            food_lists.append(classification["data"])
+        elif classification["type"] == "totem":
+            totems.append((classification["subtype"], classification["text"], classification["link"]))
+
+    return {
+        "classify_message": (MessageFilter.classify_message, [(p,) for p in posts]),
+        "extract_fruits": (MessageFilter.extract_fruits, [(p,) for p in posts]),
+        "extract_totem_info": (MessageFilter.extract_totem_info, [(p,) for p in posts]),
+        "format_food_message": (MessageFilter.format_food_message,
+                                [(f, lang) for f in food_lists for lang in ("RUS", "EN")]),
+        "format_totem_message": (MessageFilter.format_totem_message,
+                                 [t + (lang,) for t in totems for lang in ("RUS", "EN")]),
+    }
+
+
+def measure(func, calls: list, rounds: int, min_time: float) -> dict:
+    """
+    Замер одной функции
+
+    Каждый раунд прогоняет весь набор вызовов достаточное число раз, чтобы
+    набрать min_time секунд; из раундов берутся медиана и p95 задержки.
+    """
+    # Подбираем число повторов на раунд
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            for args in calls:
+                func(*args)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    samples = []
+    total_calls = 0
+    total_time = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            for args in calls:
+                func(*args)
+        elapsed = time.perf_counter() - start
+        n = loops * len(calls)
+        samples.append(elapsed / n * 1e6)
+        total_calls += n
+        total_time += elapsed
+
+    samples.sort()
+    return {
+        "calls": total_calls,
+        "median_us": statistics.median(samples),
+        "p95_us": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "throughput": total_calls / total_time if total_time else 0.0,
+    }
+
+
+def check_expected(corpus: dict, record: bool) -> list:
+    """Сверка результатов с эталоном; при record эталон перезаписывается"""
+    mismatches = []
+
+    for case in corpus["cases"]:
+        actual = snapshot(case["_post"])
+        if record:
+            case["expected"] = actual
+        elif case.get("expected") != actual:
+            mismatches.append(case["name"])
+
+    if record:
+        for case in corpus["cases"]:
+            case.pop("_post", None)
+        with open(CORPUS_PATH, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, ensure_ascii=False, indent=4)
+            f.write("\n")
+
+    return mismatches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк парсера сообщений канала")
+    parser.add_argument("--rounds", type=int, default=20, help="число раундов замера")
+    parser.add_argument("--min-time", type=float, default=0.02, help="минимальная длительность раунда, с")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="допустимый рост медианной задержки (0.25 = +25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="файл базовой линии")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты как базовую линию")
+    parser.add_argument("--record", action="store_true", help="перезаписать эталонные результаты в корпусе")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    cases = corpus["cases"]
+
+    mismatches = check_expected(corpus, args.record)
+    if args.record:
+        print(f"📝 Эталон перезаписан для {len(cases)} постов")
+        return 0
+
+    workloads = build_workloads(cases)
+    results = {}
+    for name, (func, calls) in workloads.items():
+        results[name] = measure(func, calls, args.rounds, args.min_time)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print("=" * 78)
+    print(f"🧪 БЕНЧМАРК ПАРСЕРА ({len(cases)} постов, {args.rounds} раундов)")
+    print("=" * 78)
+    print(f"{'функция':<22}{'медиана, мкс':>14}{'p95, мкс':>12}{'вызовов/с':>14}{'к базе':>12}")
+
+    regressions = []
+    for name, result in results.items():
+        delta = ""
+        base = baseline.get(name)
+        if base:
+            ratio = result["median_us"] / base["median_us"] - 1
+            delta = f"{ratio:+.1%}"
+            if ratio > args.threshold:
+                regressions.append(f"{name}: {base['median_us']:.2f} → {result['median_us']:.2f} мкс ({delta})")
+
+        print(f"{name:<22}{result['median_us']:>14.2f}{result['p95_us']:>12.2f}"
+              f"{result['throughput']:>14,.0f}{delta:>12}")
+
+    print("=" * 78)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Базовая линия сохранена: {args.baseline}")
+    elif not baseline:
+        print(f"⚠️ Базовая линия не найдена ({args.baseline}), сравнение задержки пропущено")
+        print("   Сохраните её на этой машине: python benchmarks/parser_benchmark.py --save-baseline")
+
+    failed = False
+    if mismatches:
+        failed = True
+        print(f"❌ Результат разбора отличается от эталона: {', '.join(mismatches)}")
+    if regressions:
+        failed = True
+        print(f"❌ Деградация больше {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"   • {line}")
+
+    if not failed:
+        print("✅ Все проверки пройдены")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
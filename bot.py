@@ -1,211 +1,401 @@
 import asyncio
 import logging
-import sys
 import os
-from datetime import datetime
+import re
+import sqlite3
+import time
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.types import BufferedInputFile
 
 from config import Config
-from database import Database
-from utils.subscription import daily_subscription_check
+from backup_utils import backup_manager, BACKUP_UNCHANGED
+from utils.backup_sender import send_backup_to_admin
+from utils.incremental_backup import IncrementalBackup
+from utils.app_context import init_app
+from utils.fruit_catalog import get_catalog
+from utils.messages import locale_manager
+from utils.subscription import scheduled_subscription_check
+from utils.hot_reload import check_for_changes
+from utils.leader import LeaderElection
+from utils.delivery import get_queue, resume_queued
+from utils import lifecycle
+from utils.state_storage import SQLiteStorage
+from utils.metrics import setup_metrics, save_metrics_snapshot
+from utils.scheduler import Scheduler
+from utils.loop_monitor import monitor as loop_monitor, report_loop_blocking
+from utils import health
+from utils.logging_setup import setup_logging, kv
 from handlers.start import get_user_language
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    stream=sys.stdout
-)
+# Настройка логирования: запись в stdout из отдельного потока через очередь
+setup_logging()
 logger = logging.getLogger(__name__)
 
-async def create_backup():
-    """Простая функция создания бэкапа"""
-    try:
-        import shutil
-        import gzip
-        
-        backup_dir = "database_backups"
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"database_backup_{timestamp}.db.gz"
-        backup_path = os.path.join(backup_dir, backup_name)
-        
-        with open("database.db", 'rb') as f_in:
-            with gzip.open(backup_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        
-        file_size = os.path.getsize(backup_path)
-        logger.info(f"💾 Бэкап создан: {backup_name} ({file_size:,} байт)")
-        return backup_path
-        
-    except Exception as e:
-        logger.error(f"❌ Ошибка создания бэкапа: {e}")
-        return None
+# Журнал изменений для режима BACKUP_MODE=incremental
+incremental = IncrementalBackup(backup_dir=backup_manager.backup_dir, catalog=backup_manager.catalog)
+
+async def make_backup() -> tuple:
+    """
+    Бэкап по текущему режиму: полная копия или дельта
+    
+    Если база не менялась с прошлого бэкапа (Config.BACKUP_SKIP_UNCHANGED),
+    снятый снимок удаляется и бэкап не создаётся.
+    
+    Returns:
+        (путь или None, подпись для отправки, были ли изменения)
+    """
+    if Config.BACKUP_MODE != "incremental":
+        backup_path = await backup_manager.create_backup_async(skip_unchanged=Config.BACKUP_SKIP_UNCHANGED)
+        if backup_path == BACKUP_UNCHANGED:
+            return None, None, False
+        return backup_path, "💾 Бэкап базы данных", True
+    
+    if not await asyncio.to_thread(incremental.needs_full):
+        # Пустой журнал - дельты нет
+        delta_path = await asyncio.to_thread(incremental.create_delta)
+        return delta_path, "🧩 Инкрементальный бэкап (дельта)", delta_path is not None
+    
+    started = time.time()
+    backup_path = await backup_manager.create_backup_async()
+    if backup_path:
+        # Дельты прошлых снимков удаляет вместе с ними хранение по GFS (cleanup_old_backups)
+        await asyncio.to_thread(incremental.mark_full, started)
+    return backup_path, "💾 Полный снимок базы (основа для дельт)", True
+
+def unchanged_note() -> str:
+    """Текст "изменений нет" со ссылкой на последний бэкап"""
+    last = backup_manager.get_last_backup()
+    if last:
+        return f"✅ База не менялась с бэкапа {last['file']} ({last['created']}), бэкап пропущен"
+    return "✅ База не менялась с прошлого бэкапа, бэкап пропущен"
+
+async def scheduled_backup(bot: Bot):
+    """Автоматический бэкап (раз в Config.AUTO_BACKUP_INTERVAL часов по планировщику)"""
+    logger.info("🔄 Создаю автоматический бэкап...")
+    backup_path, caption, changed = await make_backup()
+    if backup_path:
+        await send_backup_to_admin(bot, backup_path, caption)
+    elif not changed:
+        logger.info(unchanged_note())
+        if Config.BACKUP_HEARTBEAT:
+            await bot.send_message(Config.ADMIN_ID, unchanged_note())
+
+# Аренда лидера для задач в единственном экземпляре (создаётся при старте)
+leader = None
+
+# Периодические задачи: каждого процесса и только лидера (время запусков лидера хранится в базе)
+local_jobs = Scheduler("local")
+leader_jobs = Scheduler("leader")
+
+def setup_jobs(bot: Bot):
+    """Регистрация периодических задач"""
+    leader_jobs.add_job(
+        "subscription_check", lambda: scheduled_subscription_check(bot),
+        interval=Config.SUBSCRIPTION_CHECK_INTERVAL, jitter=Config.SCHEDULER_JITTER
+    )
+    if Config.BACKUP_ENABLED:
+        # Как и раньше, первый бэкап - через минуту после старта (без изменений в базе он пропускается)
+        leader_jobs.add_job(
+            "auto_backup", lambda: scheduled_backup(bot),
+            interval=Config.AUTO_BACKUP_INTERVAL * 3600, first_delay=60, jitter=Config.SCHEDULER_JITTER,
+            run_on_start=True
+        )
+    
+    if Config.HOT_RELOAD_ENABLED:
+        local_jobs.add_job(
+            "hot_reload", check_for_changes,
+            interval=Config.HOT_RELOAD_INTERVAL, persistent=False, catch_up=False
+        )
+    if Config.METRICS_ENABLED:
+        local_jobs.add_job(
+            "metrics_snapshot", save_metrics_snapshot,
+            interval=Config.METRICS_SNAPSHOT_INTERVAL, first_delay=Config.METRICS_SNAPSHOT_INTERVAL,
+            persistent=False, catch_up=False
+        )
+    if Config.LOOP_MONITOR_ENABLED:
+        local_jobs.add_job(
+            "loop_report", lambda: report_loop_blocking(bot),
+            interval=Config.LOOP_REPORT_INTERVAL, first_delay=Config.LOOP_REPORT_INTERVAL,
+            persistent=False, catch_up=False
+        )
+
+def create_dispatcher() -> Dispatcher:
+    """Создание диспетчера с роутерами и общими хуками старта/остановки"""
+    # FSM в SQLite - незавершённые диалоги переживают перезапуск
+    dp = Dispatcher(storage=SQLiteStorage())
+    
+    # Регистрируем роутеры - В ТОЧНОСТИ КАК В ИЗНАЧАЛЬНОМ КОДЕ!
+    from handlers.start import router as start_router
+    from handlers.settings import router as settings_router
+    from handlers.admin import router as admin_router
+    from handlers.channel import router as channel_router
+    from handlers.group_commands import router as group_commands_router
+    from handlers.publish import router as publish_router
+    
+    # ИЗНАЧАЛЬНЫЙ ПОРЯДОК - group_commands ПЕРВЫМ!
+    dp.include_router(group_commands_router)  # !число - перехватывает все сообщения с '!'
+    dp.include_router(start_router)           # /start
+    dp.include_router(settings_router)        # настройки
+    dp.include_router(admin_router)           # админка
+    dp.include_router(channel_router)         # каналы
+    dp.include_router(publish_router)         # публикации
+    
+    # Метрики по типам обновлений и по каждому обработчику
+    if Config.METRICS_ENABLED:
+        setup_metrics(dp)
+    
+    # Одни и те же задачи старта/остановки для polling и webhook
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    
+    return dp
 
-async def send_backup_to_admin(bot: Bot, backup_path: str):
-    """Отправка бэкапа администратору"""
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    """Запуск фоновых задач (и регистрация вебхука в режиме webhook)"""
+    global leader
     try:
-        if not os.path.exists(backup_path):
-            logger.error(f"❌ Файл не найден: {backup_path}")
-            return False
+        setup_jobs(bot)
         
-        file_size = os.path.getsize(backup_path)
-        file_size_mb = file_size / (1024 * 1024)
+        # Проверка подписок и бэкапы - только в одном процессе из всех запущенных
+        leader = LeaderElection("singleton-jobs")
+        lifecycle.start_task(leader.run({"scheduler": leader_jobs.run}), "leader")
+        logger.info("✅ Проверка подписок и автобэкапы запущены (при получении лидерства)")
         
-        if file_size_mb > 48:
-            logger.warning(f"⚠️ Файл слишком большой: {file_size_mb:.1f} MB")
-            return False
+        lifecycle.start_task(local_jobs.run(), "scheduler")
+        if Config.LOOP_MONITOR_ENABLED:
+            lifecycle.start_task(loop_monitor.run(), "loop_monitor")
         
-        with open(backup_path, 'rb') as file:
-            file_data = file.read()
-            
-        input_file = BufferedInputFile(
-            file=file_data,
-            filename=os.path.basename(backup_path)
-        )
-        
-        await bot.send_document(
-            chat_id=Config.ADMIN_ID,
-            document=input_file,
-            caption=f"💾 Бэкап базы данных\nРазмер: {file_size_mb:.2f} MB\nДата: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        )
+        if Config.HEALTH_ENABLED:
+            health.state.schedulers = [local_jobs, leader_jobs]
+            health.state.leader = leader
+            lifecycle.start_task(health.health_server(), "health")
+        if Config.HOT_RELOAD_ENABLED:
+            logger.info("✅ Горячая перезагрузка данных запущена")
         
-        logger.info("✅ Бэкап отправлен администратору")
-        return True
+        # Сообщения, сохранённые при прошлой остановке (в режиме queue их разошлёт worker.py)
+        if Config.DELIVERY_MODE == "inline":
+            lifecycle.start_task(resume_queued(bot), "resume_deliveries")
         
     except Exception as e:
-        logger.error(f"❌ Ошибка отправки бэкапа: {e}")
-        return False
+        logger.error(f"❌ Ошибка запуска фоновых задач: {e}")
+    
+    if Config.RUN_MODE == "webhook":
+        webhook_url = Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH
+        await bot.set_webhook(
+            url=webhook_url,
+            secret_token=Config.WEBHOOK_SECRET,
+            allowed_updates=dispatcher.resolve_used_update_types()
+        )
+        health.state.webhook_set = True
+        logger.info(f"🌐 Вебхук установлен: {webhook_url}")
 
-async def auto_backup_task(bot: Bot):
-    """Задача автоматических бэкапов"""
-    await asyncio.sleep(60)
+async def on_shutdown(bot: Bot):
+    """
+    Корректная остановка (приём обновлений к этому моменту уже остановлен)
+    
+    1. Рассылкам даётся Config.SHUTDOWN_DRAIN_TIMEOUT секунд на завершение
+    2. Неотправленное из прерванных рассылок сохраняется в очередь доставки
+    3. Фоновые задачи останавливаются, лидер освобождает аренду
+    4. WAL очереди переносится в основной файл
+    5. Лидер делает финальный бэкап
+    6. Администратор получает отчёт
+    """
+    started = time.monotonic()
+    lifecycle.begin_shutdown()
+    logger.info("🛑 Остановка бота...")
+    
+    report = []
+    
+    drained, remaining = await lifecycle.drain_fanouts(Config.SHUTDOWN_DRAIN_TIMEOUT)
+    report.append(f"📤 Рассылок завершено: {drained}")
+    
+    if remaining:
+        try:
+            persisted = await asyncio.to_thread(get_queue().enqueue_many, remaining)
+            report.append(f"💾 Сохранено в очередь неотправленных: {persisted}")
+        except Exception as e:
+            logger.error(f"❌ Не удалось сохранить неотправленные сообщения: {e}")
+            report.append(f"❌ Потеряно неотправленных: {len(remaining)} ({e})")
+    
+    was_leader = leader is not None and leader.is_leader
+    stopped = await lifecycle.stop_tasks()
+    report.append(f"⏹ Остановлены задачи: {', '.join(stopped) or 'нет'}")
     
     try:
-        logger.info("🔄 Создаю стартовый бэкап...")
-        backup_path = await create_backup()
-        if backup_path:
-            await send_backup_to_admin(bot, backup_path)
+        await asyncio.to_thread(get_queue().checkpoint)
     except Exception as e:
-        logger.error(f"❌ Ошибка стартового бэкапа: {e}")
+        logger.error(f"❌ Ошибка checkpoint очереди: {e}")
     
-    while True:
+    # Финальный бэкап - только у лидера, чтобы копии бота не дублировали его
+    if Config.BACKUP_ENABLED and was_leader:
         try:
-            now = datetime.now()
-            
-            if now.hour == 3 and now.minute == 0:
-                logger.info("🔄 Создаю автоматический бэкап...")
-                backup_path = await create_backup()
-                
-                if backup_path:
-                    await send_backup_to_admin(bot, backup_path)
-            
-            await asyncio.sleep(60)
-            
+            logger.info("🔄 Создаю финальный бэкап...")
+            backup_path, caption, changed = await make_backup()
+            if backup_path:
+                report.append(f"🗄 Финальный бэкап: {os.path.basename(backup_path)}")
+                await send_backup_to_admin(bot, backup_path, caption)
+            elif not changed:
+                report.append(f"🗄 {unchanged_note()}")
         except Exception as e:
-            logger.error(f"❌ Ошибка в задаче бэкапа: {e}")
-            await asyncio.sleep(300)
+            logger.error(f"❌ Ошибка финального бэкапа: {e}")
+            report.append(f"❌ Финальный бэкап не создан: {e}")
+    
+    report.append(f"⏱ Остановка заняла {time.monotonic() - started:.1f} с")
+    
+    for line in report:
+        logger.info(line)
+    
+    try:
+        await bot.send_message(Config.ADMIN_ID, "🛑 <b>Бот остановлен</b>\n\n" + "\n".join(report))
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось отправить отчёт об остановке: {e}")
+
+async def run_polling(dp: Dispatcher, bot: Bot):
+    """Получение обновлений через long polling"""
+    # Если раньше бот работал через вебхук, polling без его удаления не запустится
+    await bot.delete_webhook()
+    await dp.start_polling(bot)
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Получение обновлений через вебхук на встроенном aiohttp-сервере"""
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+    
+    app = web.Application()
+    # Привязывает startup/shutdown диспетчера к жизненному циклу приложения.
+    # Порядок важен: хуки on_shutdown выполняются по очереди, а register()
+    # добавляет закрытие сессии бота - оно должно идти после on_shutdown,
+    # иначе досылка рассылок и финальный бэкап остаются без сессии
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=Config.WEBHOOK_SECRET
+    ).register(app, path=Config.WEBHOOK_PATH)
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=Config.WEBHOOK_HOST, port=Config.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"🌐 Сервер вебхука слушает {Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT}{Config.WEBHOOK_PATH}")
+    
+    # Работаем до SIGINT/SIGTERM; cleanup сначала закрывает приём запросов, затем вызывает on_shutdown
+    stop = asyncio.Event()
+    lifecycle.install_signal_handlers(stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+def warm_up_data():
+    """Загрузка каталога фруктов, каталога бэкапов и локалей (блокирующее чтение файлов)"""
+    get_catalog()
+    backup_manager.catalog.load()
+    locale_manager.load_locales()
 
 async def main():
     """Основная функция запуска бота"""
+    phases = {}
+    phase_started = time.perf_counter()
+    
+    def phase_done(name: str):
+        nonlocal phase_started
+        now = time.perf_counter()
+        phases[name] = now - phase_started
+        phase_started = now
+    
     if not Config.BOT_TOKEN:
         logger.error("❌ BOT_TOKEN не найден!")
         return
     
-    # Проверяем наличие базы данных
-    if not os.path.exists(Config.DATABASE_PATH):
-        logger.warning(f"⚠️ База данных {Config.DATABASE_PATH} не найдена")
-        logger.info("🆕 Создаю новую базу...")
-        try:
-            db = Database()
-            logger.info("✅ Новая база создана")
-        except Exception as e:
-            logger.error(f"❌ Не удалось создать базу: {e}")
-            return
-    else:
-        try:
-            db = Database()
-            logger.info("✅ База данных инициализирована")
-        except Exception as e:
-            logger.error(f"❌ Ошибка инициализации БД: {e}")
-            return
+    if Config.RUN_MODE not in ("polling", "webhook"):
+        logger.error(f"❌ Неизвестный RUN_MODE: {Config.RUN_MODE} (ожидается polling или webhook)")
+        return
     
-    # Создаем бота
-    bot = Bot(
-        token=Config.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    if Config.RUN_MODE == "webhook" and not Config.WEBHOOK_URL:
+        logger.error("❌ Для RUN_MODE=webhook нужен WEBHOOK_URL")
+        return
     
-    # Проверяем доступ к каналу
-    try:
-        chat = await bot.get_chat(Config.SOURCE_CHANNEL_ID)
-        logger.info(f"✅ Бот имеет доступ к каналу: {chat.title}")
-    except Exception as e:
-        logger.warning(f"⚠️ Нет доступа к каналу {Config.SOURCE_CHANNEL_ID}: {e}")
+    # Без секрета любой, кто знает адрес, может присылать боту поддельные обновления
+    if Config.RUN_MODE == "webhook" and not re.fullmatch(r"[A-Za-z0-9_-]{16,256}", Config.WEBHOOK_SECRET):
+        logger.error("❌ Для RUN_MODE=webhook нужен WEBHOOK_SECRET: 16-256 символов A-Z, a-z, 0-9, _ и -")
+        return
+    phase_done("config")
     
-    # Создаем диспетчер
-    dp = Dispatcher()
-
-    # Регистрируем роутеры - В ТОЧНОСТИ КАК В ИЗНАЧАЛЬНОМ КОДЕ!
+    # Единственный экземпляр базы на процесс: схема создаётся здесь один раз
+    is_new_db = not os.path.exists(Config.DATABASE_PATH)
+    if is_new_db:
+        logger.warning(f"⚠️ База данных {Config.DATABASE_PATH} не найдена, создаю новую...")
     try:
-        from handlers.start import router as start_router
-        from handlers.settings import router as settings_router
-        from handlers.admin import router as admin_router
-        from handlers.channel import router as channel_router
-        from handlers.group_commands import router as group_commands_router
-        from handlers.publish import router as publish_router
-        
-        # ИЗНАЧАЛЬНЫЙ ПОРЯДОК - group_commands ПЕРВЫМ!
-        dp.include_router(group_commands_router)  # !число - перехватывает все сообщения с '!'
-        dp.include_router(start_router)           # /start
-        dp.include_router(settings_router)        # настройки
-        dp.include_router(admin_router)           # админка
-        dp.include_router(channel_router)         # каналы
-        dp.include_router(publish_router)         # публикации
-        
-        logger.info("✅ Все роутеры зарегистрированы")
-        
-    except ImportError as e:
-        logger.error(f"❌ Ошибка импорта роутера: {e}")
+        init_app(Config.DATABASE_PATH)
+        logger.info("✅ Новая база создана" if is_new_db else "✅ База данных инициализирована")
+    except Exception as e:
+        logger.error(f"❌ Ошибка инициализации БД: {e}")
         return
     
-    # Запускаем фоновые задачи
+    # Триггеры журнала изменений есть в базе только в режиме incremental
     try:
-        asyncio.create_task(daily_subscription_check(bot))
-        logger.info("✅ Проверка подписок запущена")
-        
-        asyncio.create_task(auto_backup_task(bot))
-        logger.info("✅ Автобэкапы запущены")
-        
-    except Exception as e:
-        logger.error(f"❌ Ошибка запуска фоновых задач: {e}")
+        if Config.BACKUP_MODE == "incremental":
+            incremental.install()
+        else:
+            incremental.uninstall()
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(f"❌ Ошибка настройки журнала изменений: {e}")
+    phase_done("database")
     
-    # Запуск бота
-    logger.info("🤖 Бот запущен и готов к работе!")
+    # Создаем бота
+    bot = Bot(
+        token=Config.BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
     
     try:
-        bot_info = await bot.get_me()
+        # Проверки Telegram и чтение данных с диска идут одновременно
+        chat, bot_info, warm_up = await asyncio.gather(
+            bot.get_chat(Config.SOURCE_CHANNEL_ID),
+            bot.get_me(),
+            asyncio.to_thread(warm_up_data),
+            return_exceptions=True
+        )
+        phase_done("checks")
+        
+        if isinstance(bot_info, Exception):
+            logger.critical(f"💥 Не удалось получить данные бота (проверьте BOT_TOKEN): {bot_info}")
+            return
         logger.info(f"👤 Бот: @{bot_info.username}")
         
-        await dp.start_polling(bot)
+        if isinstance(chat, Exception):
+            logger.warning(f"⚠️ Нет доступа к каналу {Config.SOURCE_CHANNEL_ID}: {chat}")
+        else:
+            logger.info(f"✅ Бот имеет доступ к каналу: {chat.title}")
         
-    except KeyboardInterrupt:
-        logger.info("🛑 Бот остановлен пользователем")
+        if isinstance(warm_up, Exception):
+            logger.warning(f"⚠️ Ошибка загрузки каталога/локалей: {warm_up}")
         
+        # Создаем диспетчер
         try:
-            logger.info("🔄 Создаю финальный бэкап...")
-            backup_path = await create_backup()
-            if backup_path:
-                await send_backup_to_admin(bot, backup_path)
-        except Exception as e:
-            logger.error(f"❌ Ошибка финального бэкапа: {e}")
-            
+            dp = create_dispatcher()
+            if Config.HEALTH_ENABLED:
+                health.setup_health(dp, bot)
+            logger.info("✅ Все роутеры зарегистрированы")
+        except ImportError as e:
+            logger.error(f"❌ Ошибка импорта роутера: {e}")
+            return
+        phase_done("dispatcher")
+        
+        total = sum(phases.values())
+        logger.info(
+            f"🤖 Бот запущен и готов к работе за {total:.2f} с! Режим: {Config.RUN_MODE}",
+            extra=kv(**{f"{name}_ms": round(seconds * 1000) for name, seconds in phases.items()})
+        )
+        
+        if Config.RUN_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await run_polling(dp, bot)
+        
     except Exception as e:
         logger.error(f"💥 Критическая ошибка: {e}")
         
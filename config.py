@@ -3,8 +3,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Корень проекта: относительно него ищутся файлы данных (fruits.json, locales/)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
-    # Токен бота (единственная переменная из .env)
+    # Токен бота (из .env; там же настройки вебхука, см. ниже)
     BOT_TOKEN = os.getenv("BOT_TOKEN")
     
     # ID канала-источника (встроенные в код)
@@ -21,122 +24,81 @@ class Config:
     # Настройки базы данных
     DATABASE_PATH = "database.db"
     
-    # Английские названия фруктов (без @)
-    AVAILABLE_FRUITS_EN = [
-        "Pear", "Pineapple", "Gold Mango", "Dragon Fruit", 
-        "Bloodstone Cycad", "Colossal Pinecone", "Franken Kiwi",
-        "Pumpkin", "Durian", "Candy Corn", "Deepsea Pearl Fruit",
-        "Volt Ginkgo", "Cranberry", "Acorn", "Gingerbread", "Candycane" # "Cherry"
-    ]
-    
-    # Русские названия фруктов (переводы)
-    FRUIT_TRANSLATIONS = {
-        # Английское: Русское
-        "Pear": "Груша",
-        "Pineapple": "Ананас",
-        "Gold Mango": "Манго",
-        "Dragon Fruit": "Драконий фрукт",
-        "Bloodstone Cycad": "Bloodstone Cycad",
-        "Colossal Pinecone": "Colossal Pinecone",
-        "Franken Kiwi": "Франкен Киви",
-        "Pumpkin": "Тыква",
-        "Durian": "Дуриан",
-        "Candy Corn": "Конфета",
-        "Deepsea Pearl Fruit": "Ракушка",
-        "Volt Ginkgo": "Volt Ginkgo",  # Исправлено: было "Volt Gingko"
-        "Cranberry": "Клюква",
-        "Acorn": "Желудь",
-        "Gingerbread": "Пряничный человечек",
-        "Candycane": "Конфетная трость"
-        #"Cherry": "Вишня"
-    }
+    # Каталог фруктов: id, названия, эмодзи, выделение жирным, варианты написания.
+    # Чтобы добавить фрукт (например, "Cherry"), поправьте файл - перезапуск не нужен
+    FRUIT_CATALOG_PATH = "fruits.json"
     
-    # Эмодзи для фруктов (русская версия)
-    FRUIT_EMOJIS_RU = {
-        "Груша": "🍐",
-        "Ананас": "🍍",
-        "Манго": "🥭",
-        "Драконий фрукт": "🐲",
-        "Bloodstone Cycad": "🩸",
-        "Colossal Pinecone": "❇️",
-        "Франкен Киви": "🥝",
-        "Тыква": "🎃",
-        "Дуриан": "❄️",
-        "Конфета": "🍬",
-        "Ракушка": "🐚",
-        "Volt Ginkgo": "⚡️🦕",
-        "Клюква": "🍇",
-        "Желудь": "🌰",
-        "Пряничный человечек": "🍪",
-        "Конфетная трость": "🎄🍭"
-        # "Вишня": "🍒"
-    }
+    # Горячая перезагрузка каталога фруктов и locales/*.json по изменению файлов
+    HOT_RELOAD_ENABLED = True
+    HOT_RELOAD_INTERVAL = 10  # Секунд между проверками времени изменения файлов
     
-    # Эмодзи для фруктов (английская версия - используем русские эмодзи)
-    FRUIT_EMOJIS_EN = {
-        "Pear": "🍐",
-        "Pineapple": "🍍",
-        "Gold Mango": "🥭",
-        "Dragon Fruit": "🐲",
-        "Bloodstone Cycad": "🩸",
-        "Colossal Pinecone": "❇️",
-        "Franken Kiwi": "🥝",
-        "Pumpkin": "🎃",
-        "Durian": "❄️",
-        "Candy Corn": "🍬",
-        "Deepsea Pearl Fruit": "🐚",
-        "Volt Ginkgo": "⚡️🦕",
-        "Cranberry": "🍇",
-        "Acorn": "🌰",
-        "Gingerbread": "🍪",
-        "Candycane": "🎄🍭"
-        # "Cherry": "🍒"
-    }
+    # Режим получения обновлений: "polling" (по умолчанию) или "webhook"
+    RUN_MODE = os.getenv("RUN_MODE", "polling")
     
-    # Фрукты, которые нужно выделять жирным (True/False)
-    BOLD_FRUITS = {
-        "Pear": False,
-        "Pineapple": False,
-        "Gold Mango": False,
-        "Dragon Fruit": False,
-        "Bloodstone Cycad": False,
-        "Colossal Pinecone": False,
-        "Franken Kiwi": True,
-        "Pumpkin": True,
-        "Durian": True,
-        "Candy Corn": True,
-        "Deepsea Pearl Fruit": True,
-        "Volt Ginkgo": True,
-        "Cranberry": True,
-        "Acorn": True,
-        "Gingerbread": True,
-        "Candycane": True
-        #"Cherry": True
-    }
+    # Настройки вебхука (используются только при RUN_MODE=webhook)
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")        # Публичный адрес, например https://bot.example.com
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    # Обязателен: заголовок X-Telegram-Bot-Api-Secret-Token, 16-256 символов A-Z, a-z, 0-9, _ и -
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")  # Где слушает встроенный сервер
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    
+    # Доставка уведомлений: "inline" - рассылает сам бот, "queue" - бот ставит
+    # сообщения в очередь, а отправляют процессы worker.py
+    DELIVERY_MODE = os.getenv("DELIVERY_MODE", "inline")
+    DELIVERY_QUEUE_PATH = "delivery_queue.db"
+    DELIVERY_CONCURRENCY = 20      # Одновременных отправок в режиме inline
+    DELIVERY_WORKERS = 2           # Процессов worker.py по умолчанию
+    DELIVERY_RATE_LIMIT = 25       # Сообщений в секунду на всех воркеров вместе (лимит Telegram ~30)
+    DELIVERY_BATCH_SIZE = 50       # Сколько заданий воркер берёт за раз
+    DELIVERY_LEASE_SECONDS = 120   # Через сколько неподтверждённая пачка вернётся в очередь
+    DELIVERY_MAX_ATTEMPTS = 3      # Попыток на одно сообщение
+    DELIVERY_KEEP_SECONDS = 86400  # Сколько хранить выполненные задания
+    
+    # Состояние, переживающее перезапуск: FSM (диалоги настроек, рассылки) и активные чаты с админом
+    STATE_DB_PATH = "state.db"
+    FSM_STATE_TTL = 86400           # Сколько секунд хранится незавершённый диалог
+    FSM_CACHE_SIZE = 10000          # Сколько состояний держать в памяти
+    RELAY_CHAT_TTL = 7 * 86400      # Сколько живёт забытый чат админа с пользователем
     
-    # Словарь для замены @-версий фруктов
-    REPLACE_WORDS = {
-        "@Pear": "Pear",
-        "@Pineapple": "Pineapple",
-        "@Gold Mango": "Gold Mango",
-        "@DragonFruit": "Dragon Fruit",
-        "@BloodstoneCycad": "Bloodstone Cycad",
-        "@ColossalPinecone": "Colossal Pinecone",
-        "@FrankenKiwi": "Franken Kiwi",
-        "@Pumpkin": "Pumpkin",
-        "@Durian": "Durian",
-        "@CandyCorn": "Candy Corn",
-        "@DeepseaPearlFruit": "Deepsea Pearl Fruit",
-        "@VoltGinkgo": "Volt Ginkgo",
-        "@Cranberry": "Cranberry",
-        "@Acorn": "Acorn",
-        "@Gingerbread": "Gingerbread",
-        "@Candycane": "Candycane"
-        # "@Cherry": "Cherry"
+    # Логирование: уровень и прореживание частых логгеров (имя -> пропускать одну запись из N)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_SAMPLING = {
+        "aiogram.event": 20,             # "Update id=... is handled" на каждое обновление
+        "handlers.group_commands": 10,   # Калькулятор в группах
     }
     
+    # Метрики обработчиков: снимок в формате OpenMetrics и команда /metrics
+    METRICS_ENABLED = True
+    METRICS_SNAPSHOT_PATH = "metrics.prom"
+    METRICS_SNAPSHOT_INTERVAL = 60  # Секунд между записями снимка
+    
+    # Монитор цикла событий: задержка и стек вызовов, блокирующих цикл (команда /loop)
+    LOOP_MONITOR_ENABLED = True
+    LOOP_MONITOR_INTERVAL = 0.1    # Период пульса, секунды
+    LOOP_BLOCK_THRESHOLD = 0.5     # Блокировка дольше этого (секунды) попадает в отчёт со стеком
+    LOOP_REPORT_INTERVAL = 3600    # Как часто присылать администратору новые блокировки, секунды
+    
+    # HTTP-проверки живости/готовности для супервизора (/healthz, /readyz), только localhost
+    HEALTH_ENABLED = False
+    HEALTH_HOST = "127.0.0.1"
+    HEALTH_PORT = 8081
+    HEALTH_POLL_STALE = 120     # Сколько секунд без успешного getUpdates считается "не готов"
+    HEALTH_CACHE_SECONDS = 5    # Как долго переиспользовать результат проверки базы и очереди
+    
+    # Сколько секунд при остановке ждать незавершённые рассылки (остаток уйдёт в очередь)
+    SHUTDOWN_DRAIN_TIMEOUT = 20
+    
+    # Выбор лидера: проверка подписок и автобэкапы идут только в одном из запущенных процессов
+    LEADER_LEASE_TTL = 15        # Через сколько секунд аренда упавшего лидера истекает
+    LEADER_RENEW_INTERVAL = 5    # Как часто лидер продлевает аренду (и остальные пробуют её забрать)
+    
+    # Планировщик периодических задач (utils/scheduler.py)
+    SCHEDULER_MISFIRE_GRACE = 600  # Опоздание (секунды), при котором запуск ещё выполняется
+    SCHEDULER_JITTER = 30          # Случайная задержка запуска задач лидера, секунды
+    
     # Интервал проверки подписок (в секундах)
-    SUBSCRIPTION_CHECK_INTERVAL = 21600  # 24 часа
+    SUBSCRIPTION_CHECK_INTERVAL = 21600  # 6 часов
     
     # Настройки группы для публикации
     PUBLISH_GROUP_ID = -1002927295087  # Тот же ID что и для проверки подписок
@@ -147,5 +109,21 @@ class Config:
 
     BACKUP_ENABLED = True
     AUTO_BACKUP_INTERVAL = 6  # Часы между автоматическими бэкапами
-    MAX_BACKUP_FILES = 5     # Максимальное количество хранимых бэкапов
+    MAX_BACKUP_FILES = 5     # Последние N бэкапов хранятся всегда
+    # Кроме них - по одному бэкапу за каждый из последних дней / недель / месяцев
+    BACKUP_KEEP_DAILY = 7
+    BACKUP_KEEP_WEEKLY = 4
+    BACKUP_KEEP_MONTHLY = 6
     BACKUP_COMPRESSION = True # Сжимать ли бэкапы
+    BACKUP_PAGES_PER_STEP = 256  # Страниц базы за один шаг онлайн-копирования
+    BACKUP_STEP_SLEEP = 0.005    # Пауза между шагами, секунды (в это время бот пишет в базу)
+    # full - каждый раз полная копия; incremental - дельты изменённых строк и редкие полные снимки
+    BACKUP_MODE = os.getenv("BACKUP_MODE", "full")
+    INCREMENTAL_TABLES = ("users", "user_fruits", "subscription_exceptions")
+    FULL_BACKUP_INTERVAL_DAYS = 7  # Как часто в режиме incremental снимать полную копию
+    # Не делать бэкап, если база не изменилась с прошлого (администратор может форсировать: /backup force)
+    BACKUP_SKIP_UNCHANGED = True
+    BACKUP_HEARTBEAT = True        # Вместо пропущенного бэкапа прислать администратору "изменений нет"
+    BACKUP_IGNORED_TABLES = ("leader_lease", "scheduler_runs", "change_journal", "backup_meta")
+    BACKUP_UPLOAD_LIMIT_MB = 45  # Больше - бэкап отправляется частями с манифестом (лимит бота 50 MB)
+    BACKUP_STEP_DEADLINE = 30    # Если пошаговая копия не успела (база всё время меняется) - одним шагом
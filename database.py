@@ -3,6 +3,7 @@ import logging
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 from config import Config
+from utils.fruit_catalog import get_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -243,11 +244,12 @@ class Database:
             
             # Форматируем статистику фруктов с переводами
             formatted_fruit_stats = {}
+            catalog = get_catalog()
             for fruit, count in fruit_stats:
                 if fruit == "all":
                     formatted_fruit_stats["Все фрукты"] = count
                 else:
-                    russian_name = Config.FRUIT_TRANSLATIONS.get(fruit, fruit)
+                    russian_name = catalog.translate(fruit, "RUS")
                     formatted_fruit_stats[russian_name] = count
             
             return {
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Отправка поддельных обновлений на локальный вебхук бота
+
+Нужен для проверки режима RUN_MODE=webhook без Telegram: собирает Update
+в формате Bot API и отправляет его POST-запросом с секретным заголовком,
+как это делает Telegram. Ответы бота уходят в настоящий Bot API, поэтому
+для сообщений лучше указывать свой ID (по умолчанию - ADMIN_ID).
+
+Примеры:
+    python fake_update.py --channel "x2 Pear"          # пост в канале-источнике
+    python fake_update.py --text /start                 # личное сообщение
+    python fake_update.py --text !36455 --chat-id -100123 --chat-type supergroup
+    python fake_update.py --file update.json            # готовый Update из файла
+"""
+
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from config import Config
+
+
+def build_message(text: str, chat_id: int, chat_type: str, user_id: int = None) -> dict:
+    """Минимальный объект Message"""
+    message = {
+        "message_id": int(time.time()) % 1000000,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": chat_type},
+        "text": text
+    }
+    if chat_type == "private":
+        message["chat"]["first_name"] = "Fake"
+    else:
+        message["chat"]["title"] = "Fake chat"
+    if user_id is not None:
+        message["from"] = {"id": user_id, "is_bot": False, "first_name": "Fake"}
+    return message
+
+
+def build_update(args) -> dict:
+    """Update из аргументов командной строки"""
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            update = json.load(f)
+        update.setdefault("update_id", int(time.time()))
+        return update
+
+    update = {"update_id": int(time.time())}
+    if args.channel is not None:
+        update["channel_post"] = build_message(args.channel, Config.SOURCE_CHANNEL_ID, "channel")
+    else:
+        chat_id = args.chat_id if args.chat_id is not None else args.user_id
+        update["message"] = build_message(args.text, chat_id, args.chat_type, args.user_id)
+    return update
+
+
+def post_update(url: str, update: dict, secret: str) -> int:
+    """Отправка Update на вебхук; возвращает HTTP-статус"""
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    if secret:
+        request.add_header("X-Telegram-Bot-Api-Secret-Token", secret)
+
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except urllib.error.URLError as e:
+        print(f"❌ Вебхук недоступен: {e.reason}")
+        return 0
+
+
+def main() -> int:
+    default_url = f"http://127.0.0.1:{Config.WEBHOOK_PORT}{Config.WEBHOOK_PATH}"
+
+    parser = argparse.ArgumentParser(description="Поддельные обновления для локального вебхука")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--channel", help="текст поста в канале-источнике")
+    source.add_argument("--text", help="текст сообщения от пользователя")
+    source.add_argument("--file", help="JSON-файл с готовым Update")
+    parser.add_argument("--user-id", type=int, default=Config.ADMIN_ID, help="ID отправителя")
+    parser.add_argument("--chat-id", type=int, help="ID чата (по умолчанию - ЛС с отправителем)")
+    parser.add_argument("--chat-type", default="private", help="тип чата: private, group, supergroup")
+    parser.add_argument("--url", default=default_url, help="адрес вебхука")
+    parser.add_argument("--secret", default=Config.WEBHOOK_SECRET, help="секретный токен вебхука")
+    parser.add_argument("--count", type=int, default=1, help="сколько раз отправить")
+    args = parser.parse_args()
+
+    failed = 0
+    for i in range(args.count):
+        update = build_update(args)
+        update["update_id"] += i
+        status = post_update(args.url, update, args.secret)
+        if status == 200:
+            print(f"✅ Update {update['update_id']} принят")
+        else:
+            failed += 1
+            if status:
+                print(f"❌ Update {update['update_id']}: HTTP {status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
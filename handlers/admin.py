@@ -7,16 +7,22 @@ from datetime import datetime, timedelta
 import logging
 import asyncio
 from typing import List, Dict
-from backup_utils import backup_manager
+from backup_utils import backup_manager, BACKUP_UNCHANGED
+from utils.backup_sender import send_backup
 import os
+import html
 
-from database import Database
+from utils.app_context import db
 from config import Config
 from utils.messages import locale_manager
+from utils.hot_reload import reload_data
+from utils.state_storage import StateMap
+from utils.metrics import registry as metrics_registry, get_snapshot_path
+from utils.loop_monitor import monitor as loop_monitor, format_report as format_loop_report
+from utils.logging_setup import kv
 
 logger = logging.getLogger(__name__)
 router = Router()
-db = Database()
 
 # ========== СПИСОК АДМИНИСТРАТОРОВ ==========
 ADMIN_IDS = [1835558263, 8529443364, 1012045768]  # ВАШ ID
@@ -39,7 +45,7 @@ class ChatStates(StatesGroup):
 USER_PER_PAGE = 10
 
 # ========== ГЛОБАЛЬНЫЙ СЛОВАРЬ ДЛЯ АКТИВНЫХ ЧАТОВ ==========
-active_chats = {}  # {user_id: admin_id}
+active_chats = StateMap("active_chats", ttl=Config.RELAY_CHAT_TTL)  # {user_id: admin_id}, сохраняется в базе состояний
 
 # ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
 
@@ -754,68 +760,6 @@ async def forward_admin_message(message: Message, state: FSMContext):
                 del active_chats[user_id]
             await state.clear()
 
-# ========== ОБРАБОТКА СООБЩЕНИЙ ОТ ПОЛЬЗОВАТЕЛЕЙ АДМИНИСТРАТОРАМ ==========
-
-@router.message(F.chat.type == "private")
-async def handle_user_to_admin(message: Message):
-    """Обработка сообщений от пользователей администратору"""
-    user_id = message.from_user.id
-    
-    # Проверяем, не является ли отправитель администратором
-    if is_admin(user_id):
-        return
-    
-    # Проверяем, есть ли активный чат с этим пользователем
-    if user_id not in active_chats:
-        # Нет активного чата - игнорируем
-        return
-    
-    admin_id = active_chats[user_id]
-    
-    # Проверяем команду /stop
-    if message.text and message.text.strip() == "/stop":
-        # Пользователь завершил чат
-        try:
-            user_info = f"ID: {user_id}"
-            user = db.get_user(user_id)
-            if user and user.get("username"):
-                user_info += f" (@{user['username']})"
-            
-            await message.bot.send_message(
-                admin_id,
-                f"❌ Пользователь {user_info} завершил диалог командой /stop"
-            )
-        except:
-            pass
-        
-        # Удаляем из активных чатов
-        del active_chats[user_id]
-        return
-    
-    try:
-        # Получаем информацию о пользователе
-        user_info = f"ID: {user_id}"
-        user = db.get_user(user_id)
-        if user and user.get("username"):
-            user_info += f" (@{user['username']})"
-        
-        # Пересылаем сообщение админу
-        await message.forward(admin_id)
-        
-        # Отправляем админу информацию о пользователе
-        await message.bot.send_message(
-            admin_id,
-            f"📨 <b>Сообщение от пользователя:</b>\n{user_info}",
-            parse_mode="HTML"
-        )
-        
-        # Подтверждение пользователю
-    except Exception as e:
-        await message.answer(f"❌ Ошибка отправки: {e}")
-        # Если админ заблокировал бота или чат не найден
-        if "Forbidden" in str(e) or "chat not found" in str(e):
-            del active_chats[user_id]
-
 # ========== КОМАНДА ДЛЯ ПРОСМОТРА АКТИВНЫХ ЧАТОВ ==========
 
 @router.message(Command("active_chats"))
@@ -957,30 +901,32 @@ async def process_exception_action(message: Message, state: FSMContext):
     if input_text.startswith('@'):
         # Убираем @ и пробелы
         username_to_find = input_text[1:].strip().lower()
-        logger.info(f"🔍 Ищем пользователя по username: @{username_to_find}")
         
         # Ищем всех пользователей
         all_users = db.get_all_users()
-        logger.info(f"📊 Всего пользователей в БД: {len(all_users)}")
+        match = "none"
         
         # Простой поиск (точное совпадение в нижнем регистре)
         for u in all_users:
-            if u.get("username"):
-                db_username = u["username"].lower().strip()
-                logger.debug(f"  Проверяем: @{db_username}")
-                if db_username == username_to_find:
-                    user = u
-                    logger.info(f"✅ Найден точный матч: ID {u['user_id']}, @{u['username']}")
-                    break
+            if u.get("username") and u["username"].lower().strip() == username_to_find:
+                user = u
+                match = "exact"
+                break
         
         if not user:
             # Если точного совпадения нет, ищем частичное
             for u in all_users:
                 if u.get("username") and username_to_find in u["username"].lower():
                     user = u
-                    logger.info(f"✅ Найден частичный матч: ID {u['user_id']}, @{u['username']}")
+                    match = "partial"
                     break
         
+        # Одна запись на поиск вместо строки на каждого проверенного пользователя
+        logger.info("🔍 Поиск пользователя по username", extra=kv(
+            query=username_to_find, scanned=len(all_users), match=match,
+            user_id=user["user_id"] if user else None
+        ))
+        
         if not user:
             # Показываем всех пользователей для отладки
             debug_msg = f"❌ Не найдено пользователя @{input_text[1:]}\n\n"
@@ -1366,6 +1312,9 @@ async def cmd_help_admin(message: Message):
         "<b>/broadcast_all</b> - 🌍 Рассылка всем\n"
         "<b>/exceptions</b> - 📋 Управление исключениями\n"
         "<b>/active_chats</b> - 💬 Показать активные чаты\n"
+        "<b>/reload</b> - 🔄 Перечитать каталог фруктов и локализации\n"
+        "<b>/metrics</b> - ⏱ Время работы обработчиков\n"
+        "<b>/loop</b> - 🩺 Задержка цикла и блокирующие вызовы\n"
         "<b>/help_admin</b> - ❓ Эта справка\n\n"
         "<b>📋 В админ-панели:</b>\n"
         "• 📊 Статистика и детальная статистика\n"
@@ -1384,6 +1333,73 @@ async def cmd_help_admin(message: Message):
     
     await message.answer(help_text, parse_mode="HTML")
 
+@router.message(Command("reload"))
+async def cmd_reload(message: Message):
+    """Перезагрузка каталога фруктов и локализаций без перезапуска"""
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет прав администратора")
+        return
+    
+    try:
+        result = await reload_data()
+    except Exception as e:
+        logger.error(f"❌ Ошибка перезагрузки данных: {e}")
+        await message.answer(f"❌ Ошибка перезагрузки, оставлены прежние данные:\n{e}")
+        return
+    
+    await message.answer(
+        f"✅ Данные перезагружены\n\n"
+        f"🍎 Фруктов в каталоге: {result['fruits']}\n"
+        f"🌐 Языки: {', '.join(result['languages'])}"
+    )
+
+@router.message(Command("metrics"))
+async def cmd_metrics(message: Message):
+    """Метрики обработчиков: количество, ошибки, задержки"""
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет прав администратора")
+        return
+    
+    if not metrics_registry.handlers:
+        await message.answer("📭 Метрик пока нет")
+        return
+    
+    lines = [f"{'обработчик':<32}{'вызовов':>8}{'ошиб':>6}{'сред,мс':>9}{'p95,мс':>9}"]
+    for (router_name, handler_name), series in metrics_registry.top_handlers():
+        avg_ms = series.latency.sum / series.latency.total * 1000 if series.latency.total else 0
+        p95_ms = series.latency.quantile(0.95) * 1000
+        name = f"{router_name}.{handler_name}"[:31]
+        lines.append(f"{name:<32}{series.count:>8}{series.errors:>6}{avg_ms:>9.1f}{p95_ms:>9.0f}")
+    
+    updates = ", ".join(
+        f"{event_type}: {series.count} (в работе {series.in_flight})"
+        for event_type, series in metrics_registry.updates.items()
+    )
+    
+    text = (
+        f"⏱ <b>Метрики обработчиков</b> (по суммарному времени)\n\n"
+        f"<pre>{html.escape(chr(10).join(lines))}</pre>\n"
+        f"📨 <b>Обновления:</b> {html.escape(updates)}\n"
+        f"📄 Снимок: <code>{html.escape(get_snapshot_path())}</code>"
+    )
+    await message.answer(text, parse_mode="HTML")
+
+@router.message(Command("loop"))
+async def cmd_loop(message: Message):
+    """Задержка цикла событий и места, которые его блокировали"""
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет прав администратора")
+        return
+    
+    offenders = loop_monitor.top_offenders(limit=5)
+    text = format_loop_report(offenders, with_stack=False)
+    if offenders:
+        # Стек - только у самого тяжёлого, чтобы уложиться в лимит сообщения
+        text += f"\n\n<b>Стек {html.escape(offenders[0].location)}:</b>\n<pre>{html.escape(offenders[0].stack[-2500:])}</pre>"
+    else:
+        text += "\n\n✅ Блокировок не было"
+    await message.answer(text, parse_mode="HTML")
+
 # Добавьте этот callback после других обработчиков в admin.py:
 @router.callback_query(F.data == "admin_backup_menu")
 async def admin_backup_callback(callback: types.CallbackQuery):
@@ -1412,6 +1428,12 @@ async def admin_backup_callback(callback: types.CallbackQuery):
         if count > 0:
             text += f"• {file_type}: {count}\n"
     
+    text += (
+        f"\n🗂 <b>Хранение:</b> последние {Config.MAX_BACKUP_FILES}, "
+        f"по одному за {Config.BACKUP_KEEP_DAILY} дн., {Config.BACKUP_KEEP_WEEKLY} нед. "
+        f"и {Config.BACKUP_KEEP_MONTHLY} мес.\n"
+    )
+    
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="📥 Создать бэкап (DB)", callback_data="create_db_backup"),
@@ -1442,13 +1464,13 @@ async def create_backup_handler(callback: types.CallbackQuery):
     await callback.message.edit_text("🔄 Создаю бэкап...")
     
     if backup_type == "db":
-        backup_path = backup_manager.create_backup(compress=False)
+        backup_path = await backup_manager.create_backup_async(compress=False)
         backup_type_name = "обычный"
     elif backup_type == "compressed":
-        backup_path = backup_manager.create_backup(compress=True)
+        backup_path = await backup_manager.create_backup_async(compress=True)
         backup_type_name = "сжатый"
     elif backup_type == "json":
-        backup_path = backup_manager.create_json_backup()
+        backup_path = await asyncio.to_thread(backup_manager.create_json_backup)
         backup_type_name = "JSON"
     else:
         await callback.message.edit_text("❌ Неизвестный тип бэкапа")
@@ -1458,38 +1480,16 @@ async def create_backup_handler(callback: types.CallbackQuery):
         await callback.message.edit_text("❌ Ошибка создания бэкапа")
         return
     
-    # Отправляем файл администратору
+    # Отправляем файл администратору (большой - частями)
     try:
-        file_size = os.path.getsize(backup_path)
-        file_size_mb = file_size / (1024 * 1024)
-        
-        # Проверяем размер файла (Telegram лимит 50MB для ботов)
-        if file_size_mb > 48:
-            await callback.message.edit_text(
-                f"❌ Файл слишком большой для отправки: {file_size_mb:.1f} MB\n"
-                f"Лимит Telegram: 50 MB\n\n"
-                f"Файл сохранен локально: {os.path.basename(backup_path)}"
-            )
-            return
-        
-        # Открываем файл
         if backup_path.endswith('.gz'):
-            file_type = "document"
-            caption = f"📦 Сжатый бэкап базы данных\nРазмер: {file_size_mb:.2f} MB"
+            caption = "📦 Сжатый бэкап базы данных"
         elif backup_path.endswith('.json'):
-            file_type = "document"
-            caption = f"📄 JSON бэкап базы данных\nРазмер: {file_size_mb:.2f} MB"
+            caption = "📄 JSON бэкап базы данных"
         else:
-            file_type = "document"
-            caption = f"💾 Бэкап базы данных\nРазмер: {file_size_mb:.2f} MB"
+            caption = "💾 Бэкап базы данных"
         
-        # Отправляем файл
-        with open(backup_path, 'rb') as file:
-            await callback.bot.send_document(
-                chat_id=callback.from_user.id,
-                document=types.InputFile(file, filename=os.path.basename(backup_path)),
-                caption=caption
-            )
+        await send_backup(callback.bot, callback.from_user.id, backup_path, caption)
         
         await callback.message.edit_text(f"✅ {backup_type_name.capitalize()} бэкап создан и отправлен!")
         
@@ -1558,7 +1558,7 @@ async def send_backup_handler(callback: types.CallbackQuery):
         return
     
     filename = callback.data.replace("send_backup_", "")
-    backup_path = os.path.join("database_backups", filename)
+    backup_path = os.path.join(backup_manager.backup_dir, filename)
     
     if not os.path.exists(backup_path):
         await callback.answer("❌ Файл не найден", show_alert=True)
@@ -1567,22 +1567,7 @@ async def send_backup_handler(callback: types.CallbackQuery):
     await callback.message.edit_text(f"📤 Отправляю {filename}...")
     
     try:
-        file_size = os.path.getsize(backup_path)
-        file_size_mb = file_size / (1024 * 1024)
-        
-        if file_size_mb > 48:
-            await callback.message.edit_text(
-                f"❌ Файл слишком большой: {file_size_mb:.1f} MB\n"
-                f"Лимит Telegram: 50 MB"
-            )
-            return
-        
-        with open(backup_path, 'rb') as file:
-            await callback.bot.send_document(
-                chat_id=callback.from_user.id,
-                document=types.InputFile(file, filename=filename),
-                caption=f"💾 Бэкап: {filename}\nРазмер: {file_size_mb:.2f} MB"
-            )
+        await send_backup(callback.bot, callback.from_user.id, backup_path, f"💾 Бэкап: {filename}")
         
         await callback.message.edit_text(f"✅ Бэкап {filename} отправлен!")
         
@@ -1592,49 +1577,35 @@ async def send_backup_handler(callback: types.CallbackQuery):
 
 @router.message(Command("backup"))
 async def cmd_backup(message: Message):
-    """Создание и отправка бэкапа администратору"""
+    """Создание и отправка бэкапа администратору (/backup force - даже без изменений)"""
     if not is_admin(message.from_user.id):
         await message.answer("⛔ У вас нет прав администратора")
         return
     
+    force = "force" in (message.text or "").split()[1:]
     await message.answer("🔄 Создаю бэкап базы данных...")
     
-    # Простая функция создания бэкапа
-    import os
-    import shutil
-    import gzip
-    from datetime import datetime
-    from aiogram.types import BufferedInputFile
+    backup_path = await backup_manager.create_backup_async(
+        compress=True, skip_unchanged=not force and Config.BACKUP_SKIP_UNCHANGED
+    )
+    if backup_path == BACKUP_UNCHANGED:
+        last = backup_manager.get_last_backup()
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="💾 Всё равно создать", callback_data="create_compressed_backup")]
+        ])
+        await message.answer(
+            f"✅ База не менялась с последнего бэкапа <code>{html.escape(last['file'])}</code> "
+            f"({last['created']}).\n\nЧтобы создать бэкап всё равно: /backup force",
+            parse_mode="HTML", reply_markup=keyboard
+        )
+        return
+    
+    if not backup_path:
+        await message.answer("❌ Ошибка создания бэкапа (подробности в логе)")
+        return
     
     try:
-        backup_dir = "database_backups"
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"database_backup_{timestamp}.db.gz"
-        backup_path = os.path.join(backup_dir, backup_name)
-        
-        with open("database.db", 'rb') as f_in:
-            with gzip.open(backup_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        
-        # Отправка
-        file_size = os.path.getsize(backup_path)
-        file_size_mb = file_size / (1024 * 1024)
-        
-        with open(backup_path, 'rb') as file:
-            file_data = file.read()
-            input_file = BufferedInputFile(
-                file=file_data,
-                filename=backup_name
-            )
-            
-            await message.bot.send_document(
-                chat_id=message.from_user.id,
-                document=input_file,
-                caption=f"💾 Бэкап базы данных\nРазмер: {file_size_mb:.2f} MB\nДата: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-            )
+        await send_backup(message.bot, message.from_user.id, backup_path)
         
         await message.answer("✅ Бэкап создан и отправлен!")
         
@@ -1648,22 +1619,14 @@ async def cmd_backup_json(message: Message):
         await message.answer("⛔ У вас нет прав администратора")
         return
     
-    backup_path = backup_manager.create_json_backup()
+    backup_path = await asyncio.to_thread(backup_manager.create_json_backup)
     
     if not backup_path or not os.path.exists(backup_path):
         await message.answer("❌ Ошибка создания JSON бэкапа")
         return
     
     try:
-        file_size = os.path.getsize(backup_path)
-        file_size_mb = file_size / (1024 * 1024)
-        
-        with open(backup_path, 'rb') as file:
-            await message.bot.send_document(
-                chat_id=message.from_user.id,
-                document=types.InputFile(file, filename=os.path.basename(backup_path)),
-                caption=f"📄 JSON бэкап базы данных\nРазмер: {file_size_mb:.2f} MB"
-            )
+        await send_backup(message.bot, message.from_user.id, backup_path, "📄 JSON бэкап базы данных")
         
         await message.answer("✅ JSON бэкап создан и отправлен!")
         
@@ -1701,3 +1664,67 @@ async def cmd_backup_stats(message: Message):
     ])
     
     await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+# ========== ОБРАБОТКА СООБЩЕНИЙ ОТ ПОЛЬЗОВАТЕЛЕЙ АДМИНИСТРАТОРАМ ==========
+
+# Объявлен последним в роутере: команды админки выше (/reload, /backup...) проверяются раньше.
+# Только пользователи с активным чатом - остальные личные сообщения идут в следующие роутеры
+@router.message(F.chat.type == "private", F.from_user.id.in_(active_chats))
+async def handle_user_to_admin(message: Message):
+    """Обработка сообщений от пользователей администратору"""
+    user_id = message.from_user.id
+    
+    # Проверяем, не является ли отправитель администратором
+    if is_admin(user_id):
+        return
+    
+    # Проверяем, есть ли активный чат с этим пользователем
+    if user_id not in active_chats:
+        # Нет активного чата - игнорируем
+        return
+    
+    admin_id = active_chats[user_id]
+    
+    # Проверяем команду /stop
+    if message.text and message.text.strip() == "/stop":
+        # Пользователь завершил чат
+        try:
+            user_info = f"ID: {user_id}"
+            user = db.get_user(user_id)
+            if user and user.get("username"):
+                user_info += f" (@{user['username']})"
+            
+            await message.bot.send_message(
+                admin_id,
+                f"❌ Пользователь {user_info} завершил диалог командой /stop"
+            )
+        except:
+            pass
+        
+        # Удаляем из активных чатов
+        del active_chats[user_id]
+        return
+    
+    try:
+        # Получаем информацию о пользователе
+        user_info = f"ID: {user_id}"
+        user = db.get_user(user_id)
+        if user and user.get("username"):
+            user_info += f" (@{user['username']})"
+        
+        # Пересылаем сообщение админу
+        await message.forward(admin_id)
+        
+        # Отправляем админу информацию о пользователе
+        await message.bot.send_message(
+            admin_id,
+            f"📨 <b>Сообщение от пользователя:</b>\n{user_info}",
+            parse_mode="HTML"
+        )
+        
+        # Подтверждение пользователю
+    except Exception as e:
+        await message.answer(f"❌ Ошибка отправки: {e}")
+        # Если админ заблокировал бота или чат не найден
+        if "Forbidden" in str(e) or "chat not found" in str(e):
+            del active_chats[user_id]
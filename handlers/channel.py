@@ -1,57 +1,19 @@
-import asyncio
 import logging
+import time
 from aiogram import Router, Bot, F  # ДОБАВЬТЕ F СЮДА!
 from aiogram.types import Message
 from aiogram.filters import Command
-from aiogram import exceptions
 from aiogram.enums import ChatType
 
-from database import Database
+from utils.app_context import db
 from config import Config
 from utils.filters import MessageFilter
+from utils.delivery import deliver
+from utils.logging_setup import kv
 
 router = Router()
-db = Database()
 logger = logging.getLogger(__name__)
 
-async def send_with_semaphore(bot: Bot, user_id: int, text: str, parse_mode: str, semaphore: asyncio.Semaphore):
-    """Отправка сообщения с ограничением количества одновременных запросов"""
-    async with semaphore:
-        try:
-            await bot.send_message(user_id, text, parse_mode=parse_mode)
-            return True, None
-        except exceptions.TelegramAPIError as e:
-            # Проверяем, не является ли это ошибкой rate limit
-            error_msg = str(e)
-            if "Too Many Requests" in error_msg or "retry after" in error_msg.lower():
-                # Пытаемся извлечь время ожидания из ошибки
-                import re
-                retry_match = re.search(r'retry after (\d+)', error_msg.lower())
-                if retry_match:
-                    wait_time = int(retry_match.group(1))
-                else:
-                    wait_time = 5  # По умолчанию 5 секунд
-                
-                logger.warning(f"Rate limit hit for user {user_id}, waiting {wait_time} seconds")
-                await asyncio.sleep(wait_time)
-                # Пробуем еще раз после ожидания
-                try:
-                    await bot.send_message(user_id, text, parse_mode=parse_mode)
-                    return True, None
-                except Exception as retry_error:
-                    return False, str(retry_error)
-            else:
-                return False, error_msg
-        except Exception as e:
-            error_msg = str(e)
-            if "Forbidden" in error_msg or "bot was blocked" in error_msg:
-                logger.warning(f"User {user_id} blocked the bot")
-            elif "chat not found" in error_msg:
-                logger.warning(f"Chat with user {user_id} not found")
-            else:
-                logger.error(f"Error sending to user {user_id}: {error_msg}")
-            return False, error_msg
-
 @router.channel_post()
 async def handle_channel_post(message: Message, bot: Bot):
     """Обработка сообщений из каналов"""
@@ -64,12 +26,14 @@ async def handle_channel_post(message: Message, bot: Bot):
     if not text:
         return
     
-    logger.info(f"🚀 ПОЛУЧЕНО СООБЩЕНИЕ ИЗ КАНАЛА!")
-    logger.info(f"📝 Текст: {text[:200]}")
+    # Текст поста - только в DEBUG, в INFO одна запись с результатом разбора
+    logger.debug(f"📝 Текст: {text[:200]}")
     
     # Классифицируем сообщение
     classification = MessageFilter.classify_message(text)
-    logger.info(f"🔍 Классификация: {classification['type']}")
+    logger.info("🚀 Пост из канала", extra=kv(
+        message_id=message.message_id, length=len(text), type=classification["type"]
+    ))
     
     if classification["type"] == "food":
         fruits = classification["data"]
@@ -77,24 +41,23 @@ async def handle_channel_post(message: Message, bot: Bot):
             logger.warning("⚠️ Найдены фрукты, но список пуст!")
             return
             
-        logger.info(f"🍎 Найдены фрукты ({len(fruits)} шт): {[f['name'] for f in fruits]}")
         await process_food_notification(fruits, bot)
-        logger.info(f"✅ Рассылка еды завершена")
         
     elif classification["type"] == "totem":
-        logger.info(f"🗿 Найден тотем ({classification['subtype']})")
         await process_totem_notification(
             classification["subtype"],
             classification["text"],
             classification["link"],
             bot
         )
-        logger.info(f"✅ Рассылка тотемов завершена")
     else:
         logger.warning(f"❌ Сообщение не распознано")
 
 async def process_food_notification(fruits_data: list, bot: Bot):
-    """Обработка и рассылка уведомлений о еде"""
+    """Обработка и рассылка уведомлений о еде (в лог - одна итоговая запись)"""
+    started = time.perf_counter()
+    fruit_names = ",".join(f["name"] for f in fruits_data)
+    
     # Собираем всех пользователей для всех фруктов
     all_user_ids = set()
     fruit_users = {}
@@ -105,27 +68,24 @@ async def process_food_notification(fruits_data: list, bot: Bot):
         fruit_users[fruit_name] = user_ids
         all_user_ids.update(user_ids)
     
-    logger.info(f"🍎 Рассылка уведомлений для {len(all_user_ids)} пользователей")
-    logger.info(f"🍏 Фрукты для рассылки: {[f['name'] for f in fruits_data]}")
-    
     if not all_user_ids:
-        logger.warning("⚠️ Нет пользователей для рассылки!")
+        logger.warning("⚠️ Нет пользователей для рассылки!", extra=kv(job="food", fruits=fruit_names))
         return
     
-    # Создаем семафор для ограничения одновременных отправок (20 одновременных запросов)
-    semaphore = asyncio.Semaphore(20)
-    tasks = []
-    sent_count = 0
-    error_count = 0
+    messages = []
+    # Причины пропуска считаем, а не логируем по каждому пользователю
+    skipped_missing = 0
+    skipped_unsubscribed = 0
+    skipped_no_fruits = 0
     
     for user_id in all_user_ids:
         user = db.get_user(user_id)
         if not user:
-            logger.warning(f"❌ Пользователь {user_id} не найден в БД")
+            skipped_missing += 1
             continue
         
         if not user.get("is_subscribed", 0):
-            logger.warning(f"❌ Пользователь {user_id} не подписан, пропускаем")
+            skipped_unsubscribed += 1
             continue
         
         lang = user.get("language", "RUS")
@@ -138,45 +98,47 @@ async def process_food_notification(fruits_data: list, bot: Bot):
                 user_fruits.append(fruit_data)
         
         if not user_fruits:
-            logger.debug(f"🔕 Пользователь {user_id} не подписан на эти фрукты")
+            skipped_no_fruits += 1
             continue
         
         # Форматируем сообщение БЕЗ заголовка
         message_text = MessageFilter.format_food_message(user_fruits, lang)
         
-        # Создаем задачу для отправки
-        task = send_with_semaphore(bot, user_id, message_text, "HTML", semaphore)
-        tasks.append(task)
-    
-    # Выполняем все задачи параллельно с ограничением
-    results = await asyncio.gather(*tasks)
-    
-    for success, error in results:
-        if success:
-            sent_count += 1
-        else:
-            error_count += 1
-    
-    logger.info(f"📊 Итог: отправлено {sent_count}, ошибок {error_count}")
+        messages.append((user_id, message_text, "HTML"))
+    
+    # Отправляем сразу или через очередь - см. Config.DELIVERY_MODE
+    sent_count, error_count = await deliver(bot, messages)
+    
+    logger.info("📊 Рассылка еды завершена", extra=kv(
+        job="food",
+        fruits=fruit_names,
+        candidates=len(all_user_ids),
+        sent=sent_count,
+        errors=error_count,
+        skipped_unsubscribed=skipped_unsubscribed,
+        skipped_missing=skipped_missing,
+        skipped_no_fruits=skipped_no_fruits,
+        mode=Config.DELIVERY_MODE,
+        duration_ms=round((time.perf_counter() - started) * 1000)
+    ))
 
 async def process_totem_notification(totem_type: str, text: str, link: str, bot: Bot):
-    """Обработка и рассылка уведомлений о тотемах"""
+    """Обработка и рассылка уведомлений о тотемах (в лог - одна итоговая запись)"""
+    started = time.perf_counter()
     is_free = totem_type == "free"
     user_ids = db.get_users_for_totem(is_free)
     
-    logger.info(f"🗿 Рассылка {totem_type} тотемов для {len(user_ids)} пользователей")
-    
     if not user_ids:
-        logger.warning(f"⚠️ Нет пользователей для рассылки {totem_type} тотемов")
+        logger.warning("⚠️ Нет пользователей для рассылки тотемов", extra=kv(job="totem", subtype=totem_type))
         return
     
-    # Создаем семафор для ограничения одновременных отправок
-    semaphore = asyncio.Semaphore(20)
-    tasks = []
+    messages = []
+    skipped = 0
     
     for user_id in user_ids:
         user = db.get_user(user_id)
         if not user or not user.get("is_subscribed", 0):
+            skipped += 1
             continue
         
         lang = user.get("language", "RUS")
@@ -184,17 +146,21 @@ async def process_totem_notification(totem_type: str, text: str, link: str, bot:
         # Форматируем сообщение
         message_text = MessageFilter.format_totem_message(totem_type, text, link, lang)
         
-        # Создаем задачу для отправки
-        task = send_with_semaphore(bot, user_id, message_text, "Markdown", semaphore)
-        tasks.append(task)
-    
-    # Выполняем все задачи параллельно с ограничением
-    results = await asyncio.gather(*tasks)
-    
-    sent_count = sum(1 for success, _ in results if success)
-    error_count = sum(1 for success, _ in results if not success)
-    
-    logger.info(f"📊 Итог тотемы: отправлено {sent_count}, ошибок {error_count}")
+        messages.append((user_id, message_text, "Markdown"))
+    
+    # Отправляем сразу или через очередь - см. Config.DELIVERY_MODE
+    sent_count, error_count = await deliver(bot, messages)
+    
+    logger.info("📊 Рассылка тотемов завершена", extra=kv(
+        job="totem",
+        subtype=totem_type,
+        candidates=len(user_ids),
+        sent=sent_count,
+        errors=error_count,
+        skipped=skipped,
+        mode=Config.DELIVERY_MODE,
+        duration_ms=round((time.perf_counter() - started) * 1000)
+    ))
 
 
 # ========== КОМАНДЫ ТОЛЬКО В ЛИЧНЫХ СООБЩЕНИЯХ ==========
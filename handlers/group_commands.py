@@ -9,6 +9,9 @@ from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 import re
 import logging
 from datetime import datetime
+from functools import lru_cache
+
+from utils.callbacks import MutationCallback, WeatherCallback
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -80,66 +83,81 @@ WEATHER_EMOJIS = {
     "Админ": "🪯"
 }
 
-# Хранилище для отслеживания авторов сообщений
-message_authors = {}
+# ========== ПРЕДВЫЧИСЛЕННЫЕ ТАБЛИЦЫ ==========
+
+# Мутации по индексу: (эмодзи, название, проценты, названия погод)
+# Индексы мутаций и погод - это то, что уходит в callback-данные кнопок
+MUTATION_TABLE = tuple(
+    (emoji, data["name"], tuple(data["percentages"]), tuple(data["names"]))
+    for emoji, data in MUTATIONS.items()
+)
+
+# Готовые части строк результата: (начало строки, хвост с процентом)
+RESULT_LINES = tuple(
+    tuple(
+        (f"{WEATHER_EMOJIS[name]}<b>{name}:</b> ", f" (+{percentage}%)\n")
+        for name, percentage in zip(names, percentages)
+    )
+    for _, _, percentages, names in MUTATION_TABLE
+)
+
+# Тексты кнопок не зависят от числа - собираем один раз
+MUTATION_BUTTON_TEXTS = tuple(f"{emoji} {name}" for emoji, name, _, _ in MUTATION_TABLE)
+WEATHER_BUTTON_TEXTS = tuple(
+    tuple(f"{WEATHER_EMOJIS[name]} {name}" for name in names)
+    for _, _, _, names in MUTATION_TABLE
+)
+
+# Сколько клавиатур держать в кэше (ключ - число, мутация и автор)
+KEYBOARD_CACHE_SIZE = 1024
+# Длиннее - callback-данные кнопок не влезут в лимит Telegram (64 байта)
+MAX_NUMBER_DIGITS = 30
 
 # ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
 
-def get_mutation_keyboard(number: int) -> InlineKeyboardMarkup:
+def calculate_results(number: int, mutation_index: int) -> list:
+    """Результаты для всех погод одной мутации за один проход"""
+    return [int(number + (number * percentage / 100)) for percentage in MUTATION_TABLE[mutation_index][2]]
+
+def render_results(mutation_index: int, results: list) -> str:
+    """Строки результатов по погодам из готовых фрагментов"""
+    return "".join(
+        f"{head}{result}{tail}"
+        for (head, tail), result in zip(RESULT_LINES[mutation_index], results)
+    )
+
+def build_rows(buttons: list, width: int = 2) -> list:
+    """Раскладка кнопок по рядам"""
+    return [buttons[i:i + width] for i in range(0, len(buttons), width)]
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def get_mutation_keyboard(number: int, author_id: int = 0) -> InlineKeyboardMarkup:
     """Создает инлайн-клавиатуру для выбора мутации"""
-    keyboard = []
-    row = []
-    
-    for i, (emoji, data) in enumerate(MUTATIONS.items(), 1):
-        row.append(
-            InlineKeyboardButton(
-                text=f"{emoji} {data['name']}",
-                callback_data=f"mut_{emoji}_{number}"
-            )
+    buttons = [
+        InlineKeyboardButton(
+            text=text,
+            callback_data=MutationCallback(m=i, n=number, a=author_id).pack()
         )
-        
-        if i % 2 == 0:
-            keyboard.append(row)
-            row = []
+        for i, text in enumerate(MUTATION_BUTTON_TEXTS)
+    ]
     
-    if row:
-        keyboard.append(row)
-    
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return InlineKeyboardMarkup(inline_keyboard=build_rows(buttons))
 
-def get_weather_keyboard(number: int, mutation_emoji: str) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def get_weather_keyboard(number: int, mutation_index: int, author_id: int = 0) -> InlineKeyboardMarkup:
     """Создает инлайн-клавиатуру для выбора погоды (БЕЗ процентов)"""
-    keyboard = []
-    row = []
-    
-    mutation = MUTATIONS[mutation_emoji]
-    
-    for i, weather_name in enumerate(mutation["names"]):
-        emoji = WEATHER_EMOJIS[weather_name]
-        
-        row.append(
-            InlineKeyboardButton(
-                text=f"{emoji} {weather_name}",
-                callback_data=f"weather_{weather_name}_{mutation_emoji}_{number}"
-            )
+    buttons = [
+        InlineKeyboardButton(
+            text=text,
+            callback_data=WeatherCallback(m=mutation_index, w=i, n=number, a=author_id).pack()
         )
-        
-        if (i + 1) % 2 == 0:
-            keyboard.append(row)
-            row = []
-    
-    if row:
-        keyboard.append(row)
+        for i, text in enumerate(WEATHER_BUTTON_TEXTS[mutation_index])
+    ]
     
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return InlineKeyboardMarkup(inline_keyboard=build_rows(buttons))
 
-async def check_author(callback: types.CallbackQuery) -> bool:
-    """Проверяет, является ли пользователь автором сообщения"""
-    message_id = callback.message.message_id
-    chat_id = callback.message.chat.id
-    key = f"{chat_id}_{message_id}"
-    
-    author_id = message_authors.get(key)
+async def check_author(callback: types.CallbackQuery, author_id: int) -> bool:
+    """Проверяет, является ли пользователь автором сообщения (ID автора приходит в callback-данных)"""
     if not author_id:
         return True
     
@@ -162,13 +180,19 @@ async def handle_exclamation_command(message: Message):
         logger.warning(f"❌ Неправильный формат команды: {text}")
         return
     
+    if len(match.group(1)) > MAX_NUMBER_DIGITS:
+        logger.warning(f"❌ Слишком длинное число: {len(match.group(1))} цифр")
+        return
+    
     number = int(match.group(1))
     logger.info(f"✅ Формат правильный! Число: {number}")
     
-    keyboard = get_mutation_keyboard(number)
+    # Автор зашит в кнопки - хранить его на стороне бота не нужно
+    author_id = message.from_user.id if message.from_user else 0
     
     try:
-        sent_message = await message.reply(
+        keyboard = get_mutation_keyboard(number, author_id)
+        await message.reply(
             f"🧮 <b>Калькулятор мутаций</b>\n\n"
             f"<b>Число:</b> {number}\n"
             f"<b>Выберите мутацию:</b>",
@@ -176,54 +200,40 @@ async def handle_exclamation_command(message: Message):
             reply_markup=keyboard
         )
         
-        # Сохраняем автора сообщения
-        key = f"{sent_message.chat.id}_{sent_message.message_id}"
-        message_authors[key] = message.from_user.id
-        logger.info(f"✅ Автор сохранен: {message.from_user.id} для сообщения {key}")
-        
     except Exception as e:
         logger.error(f"❌ Ошибка отправки: {type(e).__name__}: {str(e)}")
 
 # ========== ОБРАБОТКА ВЫБОРА МУТАЦИИ ==========
 
-@router.callback_query(F.data.startswith("mut_"))
-async def handle_mutation_selection(callback: types.CallbackQuery):
+@router.callback_query(MutationCallback.filter())
+async def handle_mutation_selection(callback: types.CallbackQuery, callback_data: MutationCallback):
     """Обработка выбора мутации"""
     # Проверяем автора
-    if not await check_author(callback):
+    if not await check_author(callback, callback_data.a):
         return
     
     logger.info(f"🔘 Выбрана мутация: {callback.data}")
     
-    parts = callback.data.split("_")
-    if len(parts) != 3:
-        logger.error(f"❌ Неправильный формат callback: {callback.data}")
-        await callback.answer("❌ Ошибка данных")
-        return
-    
-    mutation_emoji = parts[1]
-    number = int(parts[2])
+    mutation_index = callback_data.m
+    number = callback_data.n
     
-    if mutation_emoji not in MUTATIONS:
-        logger.error(f"❌ Мутация не найдена: {mutation_emoji}")
+    if not 0 <= mutation_index < len(MUTATION_TABLE):
+        logger.error(f"❌ Мутация не найдена: {mutation_index}")
         await callback.answer("❌ Мутация не найдена")
         return
     
-    mutation = MUTATIONS[mutation_emoji]
+    mutation_emoji, mutation_name, _, _ = MUTATION_TABLE[mutation_index]
     
     # Формируем результат БЕЗ погоды
-    result_text = f"🧮 <b>Результаты для {number}</b>\n\n"
-    result_text += f"<b>Мутация:</b> {mutation_emoji} {mutation['name']}\n"
-    result_text += f"🌤 <b>Погода: Отсутствует</b>\n\n"
-    
-    for i, percentage in enumerate(mutation["percentages"]):
-        weather_name = mutation["names"][i]
-        emoji = WEATHER_EMOJIS[weather_name]
-        result = int(number + (number * percentage / 100))
-        result_text += f"{emoji}<b>{weather_name}:</b> {result} (+{percentage}%)\n"
+    result_text = (
+        f"🧮 <b>Результаты для {number}</b>\n\n"
+        f"<b>Мутация:</b> {mutation_emoji} {mutation_name}\n"
+        f"🌤 <b>Погода: Отсутствует</b>\n\n"
+    )
+    result_text += render_results(mutation_index, calculate_results(number, mutation_index))
     
     # Добавляем кнопки выбора погоды
-    weather_keyboard = get_weather_keyboard(number, mutation_emoji)
+    weather_keyboard = get_weather_keyboard(number, mutation_index, callback_data.a)
     
     try:
         await callback.message.edit_text(
@@ -231,64 +241,54 @@ async def handle_mutation_selection(callback: types.CallbackQuery):
             parse_mode="HTML",
             reply_markup=weather_keyboard
         )
-        logger.info(f"✅ Результат обновлен для мутации {mutation['name']}")
+        logger.info(f"✅ Результат обновлен для мутации {mutation_name}")
         await callback.answer("✅ Выберите погоду")
     except Exception as e:
         logger.error(f"❌ Ошибка обновления сообщения: {type(e).__name__}: {str(e)}")
 
 # ========== ОБРАБОТКА ВЫБОРА ПОГОДЫ ==========
 
-@router.callback_query(F.data.startswith("weather_"))
-async def handle_weather_selection(callback: types.CallbackQuery):
+@router.callback_query(WeatherCallback.filter())
+async def handle_weather_selection(callback: types.CallbackQuery, callback_data: WeatherCallback):
     """Обработка выбора погоды"""
     # Проверяем автора
-    if not await check_author(callback):
+    if not await check_author(callback, callback_data.a):
         return
     
     logger.info(f"☀️ Выбрана погода: {callback.data}")
     
-    parts = callback.data.split("_")
-    if len(parts) != 4:
-        logger.error(f"❌ Неправильный формат callback: {callback.data}")
-        await callback.answer("❌ Ошибка данных")
-        return
-    
-    weather_name = parts[1]
-    mutation_emoji = parts[2]
-    number_with_weather = int(parts[3])
+    mutation_index = callback_data.m
+    weather_index = callback_data.w
+    number_with_weather = callback_data.n
     
-    if mutation_emoji not in MUTATIONS:
-        logger.error(f"❌ Мутация не найдена: {mutation_emoji}")
+    if not (0 <= mutation_index < len(MUTATION_TABLE)
+            and 0 <= weather_index < len(MUTATION_TABLE[mutation_index][3])):
+        logger.error(f"❌ Мутация или погода не найдена: {mutation_index} {weather_index}")
         await callback.answer("❌ Мутация не найдена")
         return
     
-    mutation = MUTATIONS[mutation_emoji]
+    mutation_emoji, mutation_name, percentages, names = MUTATION_TABLE[mutation_index]
+    weather_name = names[weather_index]
     
     # Находим процент выбранной погоды
-    weather_index = mutation["names"].index(weather_name)
-    weather_percentage = mutation["percentages"][weather_index]
+    weather_percentage = percentages[weather_index]
     
     # Вычисляем ИЗНАЧАЛЬНОЕ число БЕЗ погоды
     base_number = int(number_with_weather / (1 + weather_percentage / 100))
     
     weather_emoji = WEATHER_EMOJIS[weather_name]
     
-    # Формируем результат С погодой
-    result_text = f"🧮 <b>Результаты для {number_with_weather}</b>\n\n"
-    result_text += f"<b>Мутация:</b> {mutation_emoji} {mutation['name']}\n"
-    result_text += f"{weather_emoji} <b>Погода: {weather_name} (+{weather_percentage}%)</b>\n\n"
+    # Все погоды считаем от base_number, для выбранной показываем исходное число
+    results = calculate_results(base_number, mutation_index)
+    results[weather_index] = number_with_weather
     
-    for i, percentage in enumerate(mutation["percentages"]):
-        current_weather_name = mutation["names"][i]
-        emoji = WEATHER_EMOJIS[current_weather_name]
-        
-        if current_weather_name == weather_name:
-            # Это выбранная погода - показываем исходное число
-            result_text += f"{emoji}<b>{current_weather_name}:</b> {number_with_weather} (+{percentage}%)\n"
-        else:
-            # Остальные погоды - считаем от base_number
-            result = int(base_number + (base_number * percentage / 100))
-            result_text += f"{emoji}<b>{current_weather_name}:</b> {result} (+{percentage}%)\n"
+    # Формируем результат С погодой
+    result_text = (
+        f"🧮 <b>Результаты для {number_with_weather}</b>\n\n"
+        f"<b>Мутация:</b> {mutation_emoji} {mutation_name}\n"
+        f"{weather_emoji} <b>Погода: {weather_name} (+{weather_percentage}%)</b>\n\n"
+    )
+    result_text += render_results(mutation_index, results)
     
     try:
         await callback.message.edit_text(
@@ -300,6 +300,13 @@ async def handle_weather_selection(callback: types.CallbackQuery):
     except Exception as e:
         logger.error(f"❌ Ошибка обновления сообщения: {type(e).__name__}: {str(e)}")
 
+# ========== СТАРЫЕ КНОПКИ ==========
+
+@router.callback_query(F.data.startswith("mut_") | F.data.startswith("weather_"))
+async def handle_legacy_calculator(callback: types.CallbackQuery):
+    """Кнопки калькуляторов, отправленных до перехода на компактный формат"""
+    await callback.answer("⌛ Этот калькулятор устарел. Отправьте !число ещё раз", show_alert=True)
+
 # ========== КОМАНДА ПОМОЩИ ==========
 
 @router.message(Command("help_group"))
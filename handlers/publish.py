@@ -12,10 +12,8 @@ import logging
 import asyncio
 
 from config import Config
-from database import Database
 
 router = Router()
-db = Database()
 logger = logging.getLogger(__name__)
 
 # Проверка админа (импортируем из admin.py)
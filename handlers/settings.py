@@ -10,14 +10,14 @@ from aiogram.fsm.state import State, StatesGroup
 from typing import List
 import logging
 
-from database import Database
-from config import Config
+from utils.app_context import db
 from utils.messages import locale_manager
+from utils.fruit_catalog import get_catalog
+from utils.callbacks import FruitCallback
 from utils.keyboards import get_main_keyboard
 
 logger = logging.getLogger(__name__)
 router = Router()
-db = Database()
 
 # Состояния FSM для выбора фруктов
 class FruitSelection(StatesGroup):
@@ -88,18 +88,12 @@ def get_fruits_keyboard(lang: str, selected_fruits: List[str] = None) -> InlineK
     ])
     
     # Кнопки для каждого фрукта
-    for fruit_en in Config.AVAILABLE_FRUITS_EN:
-        if lang == "RUS":
-            fruit_display = Config.FRUIT_TRANSLATIONS.get(fruit_en, fruit_en)
-            emoji = Config.FRUIT_EMOJIS_RU.get(fruit_display, "🍎")
-        else:
-            fruit_display = fruit_en
-            emoji = Config.FRUIT_EMOJIS_EN.get(fruit_en, "🍎")
-        
+    for fruit in get_catalog().records:
+        fruit_en = fruit.key
         is_selected = "all" in selected_fruits or fruit_en in selected_fruits
         
-        button_text = f"{'✅' if is_selected else '☑️'} {emoji} {fruit_display}"
-        callback_data = f"fruit_{fruit_en}"
+        button_text = f"{'✅' if is_selected else '☑️'} {fruit.locale(lang).display}"
+        callback_data = FruitCallback(f=fruit.id).pack()
         
         # Располагаем по 2 кнопки в ряд
         if len(keyboard[-1]) < 2 and len(keyboard) > 0:
@@ -174,10 +168,8 @@ async def select_fruits(callback: CallbackQuery, state: FSMContext):
     )
     await callback.answer()
 
-@router.callback_query(F.data.startswith("fruit_"))
-async def toggle_fruit(callback: CallbackQuery, state: FSMContext):
-    """Выбор/отмена выбора фрукта"""
-    fruit_en = callback.data.replace("fruit_", "")
+async def apply_fruit_toggle(callback: CallbackQuery, state: FSMContext, fruit_en: str = None):
+    """Переключение фрукта в выборе (если fruit_en задан) и перерисовка клавиатуры"""
     user_id = callback.from_user.id
     lang = await get_user_language(user_id)
     
@@ -185,25 +177,44 @@ async def toggle_fruit(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     selected_fruits = data.get("selected_fruits", [])
     
-    # Если выбран "all", очищаем список
-    if "all" in selected_fruits:
-        selected_fruits.remove("all")
-    
-    # Переключаем фрукт
-    if fruit_en in selected_fruits:
-        selected_fruits.remove(fruit_en)
-    else:
-        selected_fruits.append(fruit_en)
-    
-    # Обновляем состояние
-    await state.update_data(selected_fruits=selected_fruits)
+    if fruit_en:
+        # Если выбран "all", очищаем список
+        if "all" in selected_fruits:
+            selected_fruits.remove("all")
+        
+        # Переключаем фрукт
+        if fruit_en in selected_fruits:
+            selected_fruits.remove(fruit_en)
+        else:
+            selected_fruits.append(fruit_en)
+        
+        # Обновляем состояние
+        await state.update_data(selected_fruits=selected_fruits)
     
-    # Обновляем клавиатуру
+    # Обновляем клавиатуру (кнопки - всегда в текущем формате FruitCallback)
     await callback.message.edit_reply_markup(
         reply_markup=get_fruits_keyboard(lang, selected_fruits)
     )
     await callback.answer()
 
+@router.callback_query(FruitCallback.filter())
+async def toggle_fruit(callback: CallbackQuery, callback_data: FruitCallback, state: FSMContext):
+    """Выбор/отмена выбора фрукта"""
+    fruit = get_catalog().get_by_id(callback_data.f)
+    if not fruit:
+        # Фрукт убрали из каталога, пока был открыт выбор
+        await callback.answer("❌ Фрукт не найден")
+        return
+    
+    await apply_fruit_toggle(callback, state, fruit.key)
+
+@router.callback_query(F.data.startswith("fruit_"))
+async def toggle_fruit_legacy(callback: CallbackQuery, state: FSMContext):
+    """Кнопки "fruit_<название>", отправленные до перехода на FruitCallback"""
+    fruit = get_catalog().get(callback.data[len("fruit_"):])
+    # Неизвестный фрукт - просто перерисовываем клавиатуру в новом формате
+    await apply_fruit_toggle(callback, state, fruit.key if fruit else None)
+
 @router.callback_query(F.data == "select_all_fruits")
 async def select_all_fruits(callback: CallbackQuery, state: FSMContext):
     """Выбрать все фрукты"""
@@ -5,7 +5,7 @@ start.py - Обработчик команды /start и проверки под
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-from database import Database
+from utils.app_context import db
 from utils.messages import locale_manager
 from utils.keyboards import get_main_keyboard
 from utils.subscription import check_user_subscription
@@ -13,7 +13,6 @@ from config import Config
 import logging
 
 router = Router()
-db = Database()
 logger = logging.getLogger(__name__)
 
 async def get_user_language(user_id: int) -> str:
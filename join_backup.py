@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Сборка бэкапа, присланного ботом частями
+
+Положите части и манифест в одну папку и запустите:
+
+    python join_backup.py database_backup_20250101_030000.db.gz.manifest.json
+
+Скрипт проверяет SHA-256 каждой части, склеивает их и проверяет
+контрольную сумму собранного файла. Испорченная или недостающая часть
+называется по имени - перезапросить можно только её.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+READ_BLOCK = 1024 * 1024
+
+
+def sha256_of(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def join_backup(manifest_path: str, output_dir: str = None) -> bool:
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    parts_dir = os.path.dirname(os.path.abspath(manifest_path))
+    output_path = os.path.join(output_dir or parts_dir, manifest["file"])
+
+    print(f"🧾 {manifest['file']}: {len(manifest['parts'])} частей, {manifest['size']:,} байт")
+
+    broken = []
+    for part in manifest["parts"]:
+        part_path = os.path.join(parts_dir, part["name"])
+        if not os.path.exists(part_path):
+            print(f"❌ Нет части: {part['name']}")
+            broken.append(part["name"])
+        elif sha256_of(part_path) != part["sha256"]:
+            print(f"❌ Контрольная сумма не совпала: {part['name']}")
+            broken.append(part["name"])
+        else:
+            print(f"✅ {part['name']}")
+
+    if broken:
+        print(f"\n⚠️ Перезапросите части: {', '.join(broken)}")
+        return False
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    digest = hashlib.sha256()
+    with open(output_path, "wb") as output:
+        for part in manifest["parts"]:
+            with open(os.path.join(parts_dir, part["name"]), "rb") as f:
+                for block in iter(lambda: f.read(READ_BLOCK), b""):
+                    output.write(block)
+                    digest.update(block)
+
+    if digest.hexdigest() != manifest["sha256"] or os.path.getsize(output_path) != manifest["size"]:
+        print(f"❌ Собранный файл не совпадает с манифестом: {output_path}")
+        return False
+
+    print(f"\n✅ Бэкап собран и проверен: {output_path}")
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python join_backup.py <манифест.json> [папка для результата]")
+        sys.exit(2)
+    sys.exit(0 if join_backup(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None) else 1)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Восстановление базы из полного снимка и инкрементальных дельт
+
+    python restore_backup.py database_backups/database_backup_20250101_030000.db.gz restored.db
+    python restore_backup.py <снимок .db, .db.gz или .ndjson[.gz]> <новая база> [папка с дельтами]
+
+По умолчанию дельты ищутся рядом со снимком. Применяются только дельты
+этого снимка (поле base в заголовке дельты или в каталоге бэкапов),
+созданные после него (to_seq больше последнего seq журнала в снимке), по
+порядку. Диапазоны seq должны идти без пропусков: если дельты не хватает,
+восстановление прерывается с указанием недостающих seq, а не молча теряет
+изменения. Результат проверяется PRAGMA integrity_check.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+
+from backup_utils import CATALOG_NAME, DatabaseBackup
+from utils.incremental_backup import DELTA_PREFIX, apply_delta, journal_high_water, read_delta
+
+
+def catalog_bases(deltas_dir: str) -> dict:
+    """Основы дельт по каталогу бэкапов (для дельт без base в заголовке)"""
+    try:
+        with open(os.path.join(deltas_dir, CATALOG_NAME), encoding="utf-8") as f:
+            return {entry["file"]: entry.get("base") for entry in json.load(f)["backups"]}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def restore(snapshot_path: str, output_path: str, deltas_dir: str = None) -> bool:
+    if os.path.exists(output_path):
+        print(f"❌ {output_path} уже существует - укажите новый файл")
+        return False
+
+    deltas_dir = deltas_dir or os.path.dirname(os.path.abspath(snapshot_path))
+    snapshot_name = os.path.basename(snapshot_path)
+    # У экспорта NDJSON своих дельт нет - к нему подходят любые, лишь бы seq шли подряд
+    is_export = ".ndjson" in snapshot_name
+
+    if is_export:
+        counts = DatabaseBackup.import_json_backup(snapshot_path, output_path)
+        print(f"📦 Импортировано из NDJSON: {sum(counts.values()):,} строк, таблиц {len(counts)}")
+    else:
+        opener = gzip.open if snapshot_path.endswith(".gz") else open
+        with opener(snapshot_path, "rb") as f_in, open(output_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        print(f"📦 Снимок распакован: {output_path}")
+
+    conn = sqlite3.connect(output_path)
+    try:
+        base_seq = journal_high_water(conn)
+    finally:
+        conn.close()
+    print(f"🔢 Последний seq журнала в снимке: {base_seq}")
+
+    bases = catalog_bases(deltas_dir)
+    deltas = []
+    for filename in os.listdir(deltas_dir):
+        if filename.startswith(DELTA_PREFIX) and filename.endswith(".ndjson.gz"):
+            header, records = read_delta(os.path.join(deltas_dir, filename))
+            base = header.get("base", bases.get(filename))
+            if base and base != snapshot_name and not is_export:
+                continue
+            if header["to_seq"] > base_seq:
+                deltas.append((header["to_seq"], header["from_seq"], filename, records))
+    deltas.sort()
+
+    next_seq = base_seq + 1
+    for to_seq, from_seq, filename, _ in deltas:
+        if from_seq > next_seq:
+            os.remove(output_path)
+            print(f"❌ Нет дельты с изменениями seq {next_seq}..{from_seq - 1} (перед {filename})")
+            print("   Восстановить этот снимок полностью нельзя - выберите более новый")
+            return False
+        next_seq = to_seq + 1
+
+    conn = sqlite3.connect(output_path)
+    try:
+        for to_seq, from_seq, filename, records in deltas:
+            apply_delta(conn, records)
+            conn.commit()
+            print(f"🧩 {filename}: {len(records)} записей")
+
+        # Журнал восстановленной базы относится к старой истории - начинаем с чистого
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_journal'").fetchone():
+            conn.execute("DELETE FROM change_journal")
+            conn.commit()
+
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+    if result != "ok":
+        print(f"❌ integrity_check: {result}")
+        return False
+
+    print(f"\n✅ Восстановлено: снимок + {len(deltas)} дельт -> {output_path}")
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Использование: python restore_backup.py <снимок> <новая база> [папка с дельтами]")
+        sys.exit(2)
+    sys.exit(0 if restore(*sys.argv[1:4]) else 1)
@@ -0,0 +1,51 @@
+"""
+app_context.py - Общий контекст приложения
+
+Один экземпляр Database на процесс: схема создаётся один раз, когда
+bot.main создаёт контекст, а не при импорте каждого модуля. Модули
+обращаются к базе через прокси db - его можно импортировать до создания
+контекста, база понадобится только при первом вызове метода.
+"""
+
+import logging
+import time
+from typing import Optional
+
+from config import Config
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class AppContext:
+    """Общие объекты приложения"""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.started_at = time.time()
+
+
+_app: Optional[AppContext] = None
+
+
+def init_app(db_path: str = Config.DATABASE_PATH) -> AppContext:
+    """Создание контекста (повторный вызов возвращает уже созданный)"""
+    global _app
+    if _app is None:
+        _app = AppContext(Database(db_path))
+    return _app
+
+
+def get_app() -> AppContext:
+    """Текущий контекст; вне бота (скрипты) создаётся при первом обращении"""
+    return _app or init_app()
+
+
+class DatabaseProxy:
+    """db.get_user(...) -> get_app().db.get_user(...)"""
+
+    def __getattr__(self, name):
+        return getattr(get_app().db, name)
+
+
+db = DatabaseProxy()
@@ -0,0 +1,146 @@
+"""
+backup_sender.py - Отправка бэкапов в Telegram
+
+Файл отправляется прямо с диска (FSInputFile), без чтения в память.
+Бэкап больше лимита загрузки бота (Config.BACKUP_UPLOAD_LIMIT_MB) режется
+на пронумерованные части ниже лимита; к частям прикладывается манифест с
+SHA-256 каждой части и всего файла. Каждую часть можно проверить отдельно
+(sha256sum), а собрать и проверить целиком - скриптом join_backup.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import FSInputFile
+
+from backup_utils import READ_BLOCK, file_sha256
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def upload_limit() -> int:
+    return int(Config.BACKUP_UPLOAD_LIMIT_MB * 1024 * 1024)
+
+
+def get_parts_dir(path: str) -> str:
+    return os.path.join(os.path.dirname(path), ".parts", os.path.basename(path))
+
+
+def split_backup(path: str, chunk_size: int) -> Tuple[str, List[Dict]]:
+    """
+    Нарезка файла на части по chunk_size байт (блокирующий вызов)
+
+    Части и манифест пишутся во временную папку .parts/<бэкап> рядом с бэкапом.
+
+    Returns:
+        (путь к манифесту, описания частей: name, path, size, sha256)
+    """
+    name = os.path.basename(path)
+    parts_dir = get_parts_dir(path)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    total = hashlib.sha256()
+    parts = []
+    with open(path, "rb") as source:
+        number = 1
+        while True:
+            part_name = f"{name}.part{number:03d}"
+            part_path = os.path.join(parts_dir, part_name)
+            digest = hashlib.sha256()
+            written = 0
+            with open(part_path, "wb") as part:
+                while written < chunk_size:
+                    block = source.read(min(READ_BLOCK, chunk_size - written))
+                    if not block:
+                        break
+                    part.write(block)
+                    digest.update(block)
+                    total.update(block)
+                    written += len(block)
+            if not written:
+                os.remove(part_path)
+                break
+            parts.append({"name": part_name, "path": part_path, "size": written, "sha256": digest.hexdigest()})
+            number += 1
+
+    manifest = {
+        "file": name,
+        "size": os.path.getsize(path),
+        "sha256": total.hexdigest(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "parts": [{key: part[key] for key in ("name", "size", "sha256")} for part in parts],
+        "join": f"python join_backup.py {name}.manifest.json",
+    }
+    manifest_path = os.path.join(parts_dir, f"{name}.manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest_path, parts
+
+
+async def send_backup(bot: Bot, chat_id: int, path: str, caption: str = "💾 Бэкап базы данных") -> bool:
+    """
+    Отправка бэкапа целиком или частями
+
+    Returns:
+        True, если отправлены все части (и манифест)
+    """
+    if not os.path.exists(path):
+        logger.error(f"❌ Файл не найден: {path}")
+        return False
+
+    name = os.path.basename(path)
+    size = os.path.getsize(path)
+    size_mb = size / (1024 * 1024)
+    date = datetime.now().strftime('%d.%m.%Y %H:%M')
+
+    if size <= upload_limit():
+        checksum = await asyncio.to_thread(file_sha256, path)
+        await bot.send_document(
+            chat_id=chat_id,
+            document=FSInputFile(path, filename=name),
+            caption=f"{caption}\nРазмер: {size_mb:.2f} MB\nДата: {date}\nSHA-256: {checksum[:16]}…"
+        )
+        logger.info(f"✅ Бэкап {name} отправлен ({size_mb:.2f} MB)")
+        return True
+
+    manifest_path, parts = await asyncio.to_thread(split_backup, path, upload_limit())
+    logger.info(f"📦 Бэкап {name} ({size_mb:.1f} MB) разбит на {len(parts)} частей")
+    try:
+        for number, part in enumerate(parts, 1):
+            await bot.send_document(
+                chat_id=chat_id,
+                document=FSInputFile(part["path"], filename=part["name"]),
+                caption=f"{caption}\nЧасть {number}/{len(parts)} · {part['size'] / (1024 * 1024):.2f} MB\n"
+                        f"SHA-256: {part['sha256'][:16]}…"
+            )
+        await bot.send_document(
+            chat_id=chat_id,
+            document=FSInputFile(manifest_path),
+            caption=f"🧾 Манифест {name}: {len(parts)} частей, {size_mb:.1f} MB, {date}\n"
+                    f"Сборка и проверка: python join_backup.py {os.path.basename(manifest_path)}"
+        )
+    finally:
+        # Части - временные: сам бэкап остаётся на диске целиком
+        await asyncio.to_thread(shutil.rmtree, get_parts_dir(path), True)
+
+    logger.info(f"✅ Бэкап {name} отправлен частями: {len(parts)}")
+    return True
+
+
+async def send_backup_to_admin(bot: Bot, backup_path: str, caption: str = "💾 Бэкап базы данных",
+                               chat_id: Optional[int] = None) -> bool:
+    """Отправка бэкапа администратору; ошибки пишутся в лог"""
+    try:
+        return await send_backup(bot, chat_id or Config.ADMIN_ID, backup_path, caption)
+    except Exception as e:
+        logger.error(f"❌ Ошибка отправки бэкапа: {e}")
+        return False
@@ -0,0 +1,33 @@
+"""
+callbacks.py - Компактные callback-данные для инлайн-кнопок
+
+Формат: "<код><версия>:<поле>:<поле>..." - только короткий код операции и
+целые числа, без эмодзи и названий. Например, "w1:9:1:36455:1835558263"
+вместо "weather_Аврора_🎄_36455". Разбор - один split, коллизий с
+подчёркиваниями в названиях нет, до лимита Telegram в 64 байта далеко.
+
+При изменении набора полей увеличивайте версию в префиксе, чтобы старые
+кнопки не разбирались по новой схеме.
+"""
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class MutationCallback(CallbackData, prefix="m1"):
+    """Калькулятор: выбор мутации"""
+    m: int      # Индекс мутации в MUTATION_TABLE
+    n: int      # Число из команды !число
+    a: int = 0  # ID автора калькулятора (0 - без проверки)
+
+
+class WeatherCallback(CallbackData, prefix="w1"):
+    """Калькулятор: выбор погоды"""
+    m: int      # Индекс мутации в MUTATION_TABLE
+    w: int      # Индекс погоды
+    n: int      # Число
+    a: int = 0  # ID автора калькулятора (0 - без проверки)
+
+
+class FruitCallback(CallbackData, prefix="f1"):
+    """Настройки: выбор/отмена фрукта"""
+    f: int      # Стабильный id фрукта из каталога (fruits.json)
@@ -0,0 +1,220 @@
+"""
+delivery.py - Доставка уведомлений пользователям
+
+Обработчики канала только готовят сообщения (user_id, текст, parse_mode) и
+передают их в deliver(). Дальше в зависимости от Config.DELIVERY_MODE:
+- "inline" - рассылка прямо в процессе бота (как раньше, до 20 запросов разом);
+- "queue"  - сообщения кладутся в очередь (utils/delivery_queue.py), а
+  отправляют их отдельные процессы worker.py, каждый со своей HTTP-сессией
+  и своей долей общего лимита скорости.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import socket
+import time
+from typing import List, Optional, Tuple
+
+from aiogram import Bot, exceptions
+
+from config import Config
+from utils.delivery_queue import DeliveryQueue
+from utils import lifecycle
+
+logger = logging.getLogger(__name__)
+
+# Сообщение для рассылки: (user_id, текст, parse_mode)
+OutgoingMessage = Tuple[int, str, Optional[str]]
+
+_queue: Optional[DeliveryQueue] = None
+
+
+def get_queue() -> DeliveryQueue:
+    """Очередь доставки (создаётся при первом обращении)"""
+    global _queue
+    if _queue is None:
+        _queue = DeliveryQueue()
+    return _queue
+
+
+class RateLimiter:
+    """Равномерное ограничение скорости: не больше rate операций в секунду"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self):
+        """Дождаться своей очереди на отправку"""
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds: float):
+        """Пауза для всех следующих отправок (после ответа Telegram "retry after")"""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+async def send_with_semaphore(bot: Bot, user_id: int, text: str, parse_mode: str, semaphore: asyncio.Semaphore):
+    """Отправка сообщения с ограничением количества одновременных запросов"""
+    async with semaphore:
+        try:
+            await bot.send_message(user_id, text, parse_mode=parse_mode)
+            return True, None
+        except exceptions.TelegramAPIError as e:
+            # Проверяем, не является ли это ошибкой rate limit
+            error_msg = str(e)
+            if "Too Many Requests" in error_msg or "retry after" in error_msg.lower():
+                # Пытаемся извлечь время ожидания из ошибки
+                retry_match = re.search(r'retry after (\d+)', error_msg.lower())
+                if retry_match:
+                    wait_time = int(retry_match.group(1))
+                else:
+                    wait_time = 5  # По умолчанию 5 секунд
+
+                logger.warning(f"Rate limit hit for user {user_id}, waiting {wait_time} seconds")
+                await asyncio.sleep(wait_time)
+                # Пробуем еще раз после ожидания
+                try:
+                    await bot.send_message(user_id, text, parse_mode=parse_mode)
+                    return True, None
+                except Exception as retry_error:
+                    return False, str(retry_error)
+            else:
+                return False, error_msg
+        except Exception as e:
+            error_msg = str(e)
+            # Частые ошибки по отдельным пользователям - только в DEBUG, итог пишет рассылка
+            if "Forbidden" in error_msg or "bot was blocked" in error_msg:
+                logger.debug(f"User {user_id} blocked the bot")
+            elif "chat not found" in error_msg:
+                logger.debug(f"Chat with user {user_id} not found")
+            else:
+                logger.error(f"Error sending to user {user_id}: {error_msg}")
+            return False, error_msg
+
+
+async def send_job(bot: Bot, job: dict) -> Tuple[bool, Optional[str], Optional[float]]:
+    """
+    Отправка одного задания из очереди
+
+    Returns:
+        (успех, ошибка, через сколько секунд повторить - None если повтор не нужен)
+    """
+    try:
+        await bot.send_message(job["user_id"], job["text"], parse_mode=job["parse_mode"])
+        return True, None, None
+    except exceptions.TelegramRetryAfter as e:
+        return False, str(e), float(e.retry_after)
+    except (exceptions.TelegramForbiddenError, exceptions.TelegramBadRequest) as e:
+        # Бот заблокирован, чат не найден, кривая разметка - повтор не поможет
+        return False, str(e), None
+    except (exceptions.TelegramNetworkError, exceptions.TelegramServerError) as e:
+        return False, str(e), 5.0
+    except Exception as e:
+        logger.error(f"Error sending job {job['id']} to user {job['user_id']}: {e}")
+        return False, str(e), None
+
+
+async def deliver_batch(bot: Bot, jobs: List[dict], limiter: RateLimiter,
+                        stop: Optional[asyncio.Event] = None) -> Tuple[int, int]:
+    """
+    Отправка арендованной из очереди пачки с подтверждением
+
+    Returns:
+        (отправлено, ошибок)
+    """
+    queue = get_queue()
+    tasks = []
+    unsent = []
+
+    for job in jobs:
+        if stop is not None and stop.is_set():
+            # Остановка посреди пачки - остаток вернём в очередь
+            unsent.append(job["id"])
+            continue
+        await limiter.acquire()
+        tasks.append((job, asyncio.create_task(send_job(bot, job))))
+
+    completed = []
+    failures = []
+    for job, task in tasks:
+        success, error, retry_after = await task
+        if success:
+            completed.append(job["id"])
+            continue
+
+        if retry_after is not None:
+            limiter.pause(retry_after)
+        failures.append((job["id"], error, retry_after))
+
+    def settle():
+        queue.fail_many(failures)
+        queue.complete(completed)
+        queue.release(unsent)
+
+    # Коммиты SQLite - в потоке, как и аренда
+    await asyncio.to_thread(settle)
+    return len(completed), len(failures)
+
+
+async def resume_queued(bot: Bot):
+    """
+    Досылка сообщений, сохранённых в очередь при прошлой остановке
+
+    Нужна в режиме inline, где нет worker.py; в режиме queue их разошлют воркеры.
+    """
+    queue = get_queue()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-bot"
+    limiter = RateLimiter(Config.DELIVERY_RATE_LIMIT)
+    sent_total = 0
+    failed_total = 0
+
+    while True:
+        jobs = await asyncio.to_thread(
+            queue.lease, worker_id, Config.DELIVERY_BATCH_SIZE, Config.DELIVERY_LEASE_SECONDS
+        )
+        if not jobs:
+            break
+        sent, failed = await deliver_batch(bot, jobs, limiter)
+        sent_total += sent
+        failed_total += failed
+
+    if sent_total or failed_total:
+        logger.info(f"📬 Досланы сохранённые сообщения: отправлено {sent_total}, ошибок {failed_total}")
+
+
+async def deliver(bot: Bot, messages: List[OutgoingMessage]) -> Tuple[int, int]:
+    """
+    Рассылка подготовленных сообщений
+
+    Returns:
+        (отправлено или поставлено в очередь, ошибок)
+    """
+    if not messages:
+        return 0, 0
+
+    # Во время остановки новые рассылки не начинаем - сразу в очередь
+    if Config.DELIVERY_MODE == "queue" or lifecycle.is_stopping():
+        queued = await asyncio.to_thread(get_queue().enqueue_many, messages)
+        logger.info(f"📥 В очередь доставки поставлено {queued} сообщений")
+        return queued, 0
+
+    # Создаем семафор для ограничения одновременных отправок
+    semaphore = asyncio.Semaphore(Config.DELIVERY_CONCURRENCY)
+
+    async def send(index: int, message: OutgoingMessage):
+        result = await send_with_semaphore(bot, *message, semaphore)
+        fanout.mark_sent(index)
+        return result
+
+    # Рассылка регистрируется, чтобы при остановке неотправленное не потерялось
+    with lifecycle.FanOut(messages) as fanout:
+        results = await asyncio.gather(*[send(i, message) for i, message in enumerate(messages)])
+
+    sent_count = sum(1 for success, _ in results if success)
+    return sent_count, len(results) - sent_count
@@ -0,0 +1,188 @@
+"""
+delivery_queue.py - Очередь доставки уведомлений в SQLite (WAL)
+
+Процесс бота (приём постов) кладёт сюда готовые сообщения, а процессы
+worker.py забирают их пачками в аренду и отправляют. Аренда с таймаутом:
+если воркер упал, не подтвердив пачку, после lease_until задания снова
+становятся доступны другим воркерам.
+
+Очередь живёт в отдельном файле, чтобы частые записи не мешали основной
+базе и не попадали в её бэкапы.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import Config, BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Статусы заданий
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class DeliveryQueue:
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(BASE_DIR, Config.DELIVERY_QUEUE_PATH)
+        self.init_db()
+
+    def get_connection(self):
+        """Подключение к очереди (WAL - читатели не блокируют писателя)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_db(self):
+        """Создание таблицы заданий"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS delivery_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    parse_mode TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    lease_until REAL,
+                    worker TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON delivery_jobs(status, available_at)')
+            conn.commit()
+
+    def enqueue_many(self, messages: Iterable[Tuple[int, str, Optional[str]]]) -> int:
+        """Добавление сообщений (user_id, text, parse_mode) одной транзакцией"""
+        now = time.time()
+        rows = [(user_id, text, parse_mode, now, now) for user_id, text, parse_mode in messages]
+        if not rows:
+            return 0
+
+        with self.get_connection() as conn:
+            conn.executemany(
+                'INSERT INTO delivery_jobs (user_id, text, parse_mode, available_at, created_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.commit()
+        return len(rows)
+
+    def lease(self, worker_id: str, limit: int, lease_seconds: float) -> List[Dict]:
+        """
+        Аренда пачки заданий
+
+        Один UPDATE ... RETURNING выполняется под блокировкой записи, поэтому
+        два воркера никогда не получат одно и то же задание. Каждая аренда
+        считается попыткой: задание, аренда которого истекла уже
+        DELIVERY_MAX_ATTEMPTS раз (воркер падает на нём), помечается как
+        проваленное, а не раздаётся снова бесконечно.
+        """
+        now = time.time()
+        with self.get_connection() as conn:
+            dead = conn.execute('''
+                UPDATE delivery_jobs
+                SET status = 'failed', lease_until = NULL, last_error = 'аренда истекла, попытки исчерпаны'
+                WHERE status = 'leased' AND lease_until < ? AND attempts >= ?
+            ''', (now, Config.DELIVERY_MAX_ATTEMPTS)).rowcount
+            if dead:
+                logger.warning(f"☠️ Заданий с исчерпанными попытками (аренда истекла): {dead}")
+            rows = conn.execute('''
+                UPDATE delivery_jobs
+                SET status = 'leased', lease_until = ?, worker = ?, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM delivery_jobs
+                    WHERE (status = 'pending' AND available_at <= ?)
+                       OR (status = 'leased' AND lease_until < ?)
+                    ORDER BY id
+                    LIMIT ?
+                )
+                RETURNING id, user_id, text, parse_mode, attempts
+            ''', (now + lease_seconds, worker_id, now, now, limit)).fetchall()
+            conn.commit()
+        return [dict(row) for row in rows]
+
+    def complete(self, job_ids: List[int]):
+        """Отметка об успешной отправке"""
+        if not job_ids:
+            return
+        with self.get_connection() as conn:
+            conn.executemany(
+                "UPDATE delivery_jobs SET status = 'done', lease_until = NULL WHERE id = ?",
+                [(job_id,) for job_id in job_ids]
+            )
+            conn.commit()
+
+    def fail(self, job_id: int, error: str, retry_after: Optional[float] = None):
+        """
+        Ошибка отправки
+
+        С retry_after задание вернётся в очередь через указанное число секунд
+        (если не исчерпаны попытки), без него - помечается как проваленное.
+        """
+        self.fail_many([(job_id, error, retry_after)])
+
+    def fail_many(self, failures: List[Tuple[int, str, Optional[float]]]):
+        """Ошибки отправки пачкой (job_id, ошибка, retry_after) - одна транзакция, как fail"""
+        if not failures:
+            return
+        now = time.time()
+        retries = [(Config.DELIVERY_MAX_ATTEMPTS, now + retry_after, error, job_id)
+                   for job_id, error, retry_after in failures if retry_after is not None]
+        final = [(error, job_id) for job_id, error, retry_after in failures if retry_after is None]
+        with self.get_connection() as conn:
+            conn.executemany('''
+                UPDATE delivery_jobs
+                SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,
+                    available_at = ?, lease_until = NULL, last_error = ?
+                WHERE id = ?
+            ''', retries)
+            conn.executemany(
+                "UPDATE delivery_jobs SET status = 'failed', lease_until = NULL, last_error = ? WHERE id = ?",
+                final
+            )
+            conn.commit()
+
+    def release(self, job_ids: List[int]):
+        """Возврат арендованных, но не отправленных заданий (при остановке воркера)"""
+        if not job_ids:
+            return
+        with self.get_connection() as conn:
+            conn.executemany(
+                "UPDATE delivery_jobs SET status = 'pending', lease_until = NULL, "
+                "attempts = attempts - 1 WHERE id = ? AND status = 'leased'",
+                [(job_id,) for job_id in job_ids]
+            )
+            conn.commit()
+
+    def purge(self, older_than: float) -> int:
+        """Удаление завершённых заданий старше older_than секунд"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM delivery_jobs WHERE status IN ('done', 'failed') AND created_at < ?",
+                (time.time() - older_than,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def checkpoint(self):
+        """Перенос WAL в основной файл очереди (при остановке)"""
+        with self.get_connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def stats(self) -> Dict[str, int]:
+        """Количество заданий по статусам"""
+        with self.get_connection() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM delivery_jobs GROUP BY status').fetchall()
+        result = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        result.update({status: count for status, count in rows})
+        return result
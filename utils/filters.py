@@ -1,32 +1,29 @@
 import re
 from typing import Dict, List, Tuple, Optional
-from config import Config
+from utils.fruit_catalog import get_catalog
+
+# ========== ПРЕДКОМПИЛИРОВАННЫЕ ШАБЛОНЫ ==========
+
+# Строка стока: "x1 @Pear" (пробелы по краям строки допускаются)
+STOCK_LINE_RE = re.compile(r'^[^\S\n]*x(\d+)[^\S\n]+(.*\S)', re.MULTILINE)
+
+# Ссылка на сервер Roblox в сообщении о тотеме
+ROBLOX_LINK_RE = re.compile(r'(https://www\.roblox\.com/[^\s]+Server)')
+
+WHITESPACE_RE = re.compile(r'\s+')
+
 
 class MessageFilter:
     @staticmethod
     def clean_fruit_name(fruit_name: str) -> str:
-        """Очистка названия фрукта от @ и замена по словарю"""
+        """Очистка названия фрукта от @ и приведение к каноническому виду"""
+        fruit_name = fruit_name.strip()
         # Убираем начальный @ если есть
         if fruit_name.startswith("@"):
-            fruit_name = fruit_name[1:]
-        
-        # Заменяем по словарю REPLACE_WORDS
-        for old, new in Config.REPLACE_WORDS.items():
-            if old in fruit_name:
-                fruit_name = fruit_name.replace(old, new)
-                break
-        
-        # Дополнительные замены
-        fruit_name = fruit_name.replace("DragonFruit", "Dragon Fruit")
-        fruit_name = fruit_name.replace("BloodstoneCycad", "Bloodstone Cycad")
-        fruit_name = fruit_name.replace("ColossalPinecone", "Colossal Pinecone")
-        fruit_name = fruit_name.replace("FrankenKiwi", "Franken Kiwi")
-        fruit_name = fruit_name.replace("DeepseaPearlFruit", "Deepsea Pearl Fruit")
-        fruit_name = fruit_name.replace("VoltGinkgo", "Volt Ginkgo")
-        fruit_name = fruit_name.replace("CandyCorn", "Candy Corn")
-        fruit_name = fruit_name.replace("Candycane", "Candycane")
-        
-        return fruit_name.strip()
+            fruit_name = fruit_name[1:].strip()
+        
+        record = get_catalog().resolve(fruit_name)
+        return record.key if record else fruit_name
     
     @staticmethod
     def extract_fruits(text: str) -> List[Dict]:
@@ -35,81 +32,56 @@ class MessageFilter:
         Формат: 〔🍇〕stock: FoodStock Update\nx1 @Pear
         """
         fruits = []
-        lines = text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            # Ищем паттерн типа x1 @Pear или x2 @Acorn
-            match = re.match(r'x(\d+)\s+(.+)', line)
-            if match:
-                quantity = int(match.group(1))
-                raw_fruit_name = match.group(2).strip()
-                
-                # Очищаем название фрукта
-                fruit_name = MessageFilter.clean_fruit_name(raw_fruit_name)
-                
-                # Проверяем, является ли это известным фруктом
-                if fruit_name in Config.AVAILABLE_FRUITS_EN:
-                    fruits.append({
-                        "name": fruit_name,
-                        "quantity": quantity,
-                        "raw_name": raw_fruit_name
-                    })
+        catalog = get_catalog()
+        
+        # Один проход по тексту вместо split + re.match на каждую строку
+        for match in STOCK_LINE_RE.finditer(text):
+            raw_fruit_name = match.group(2)
+            
+            # Приводим название к каноническому виду и проверяем, известен ли фрукт
+            name = raw_fruit_name[1:].strip() if raw_fruit_name.startswith("@") else raw_fruit_name
+            record = catalog.resolve(name)
+            
+            if record:
+                fruits.append({
+                    "name": record.key,
+                    "quantity": int(match.group(1)),
+                    "raw_name": raw_fruit_name
+                })
         
         return fruits
     
     @staticmethod
     def get_fruit_emoji(fruit_name: str, lang: str = "EN") -> str:
         """Получение эмодзи для фрукта"""
-        if lang == "RUS":
-            from utils.messages import locale_manager
-            russian_name = locale_manager.translate_fruit(fruit_name, lang)
-            return Config.FRUIT_EMOJIS_RU.get(russian_name, "🍎")
-        else:
-            return Config.FRUIT_EMOJIS_EN.get(fruit_name, "🍎")
+        return get_catalog().emoji(fruit_name, lang)
     
     @staticmethod
     def should_bold(fruit_name: str) -> bool:
         """Нужно ли выделять фрукт жирным"""
-        return Config.BOLD_FRUITS.get(fruit_name, False)
+        record = get_catalog().get(fruit_name)
+        return record.bold if record else False
     
     @staticmethod
     def format_food_message(fruits: List[Dict], lang: str = "EN") -> str:
         """Форматирование сообщения о еде для отправки - БЕЗ заголовка"""
-        from utils.messages import locale_manager
+        catalog = get_catalog()
         
-        lines = []
-        
-        for fruit in fruits:
-            fruit_name = fruit["name"]
-            quantity = fruit["quantity"]
-            
-            # Получаем эмодзи для фрукта
-            emoji = MessageFilter.get_fruit_emoji(fruit_name, lang)
-            
-            # Получаем отображаемое имя (с переводом для русского)
-            if lang == "RUS":
-                fruit_display = locale_manager.translate_fruit(fruit_name, "RUS")
-            else:
-                fruit_display = fruit_name
-            
-            # Проверяем, нужно ли выделять жирным
-            if MessageFilter.should_bold(fruit_name):
-                line = f"<b>{emoji} x{quantity} {fruit_display}</b> — stock"
-            else:
-                line = f"{emoji} x{quantity} {fruit_display} — stock"
-            
-            lines.append(line)
+        # Строки собираются из готовых фрагментов каталога
+        lines = [catalog.render_stock(fruit["name"], fruit["quantity"], lang) for fruit in fruits]
         
         # Возвращаем только список фруктов, БЕЗ заголовка
         return "\n".join(lines)
     
     @staticmethod
-    def extract_totem_info(text: str) -> Tuple[Optional[str], str, Optional[str]]:
+    def extract_totem_info(text: str, text_lower: Optional[str] = None) -> Tuple[Optional[str], str, Optional[str]]:
         """Извлечение информации о тотеме - ТОЛЬКО если есть ссылка Roblox"""
+        if text_lower is None:
+            text_lower = text.lower()
+        
         # Определяем тип тотема
-        is_free = "totem-free:" in text.lower()
-        is_paid = "totem-paid:" in text.lower()
+        is_free = "totem-free:" in text_lower
+        is_paid = not is_free and "totem-paid:" in text_lower
         
         if not (is_free or is_paid):
             return None, text, None
@@ -120,8 +92,7 @@ class MessageFilter:
         cleaned_text = text.replace(f"{totem_type}:", "").strip()
         
         # Ищем ссылку Roblox - ОБЯЗАТЕЛЬНО должна быть!
-        link_pattern = r'(https://www\.roblox\.com/[^\s]+Server)'
-        match = re.search(link_pattern, cleaned_text)
+        match = ROBLOX_LINK_RE.search(cleaned_text)
         
         # ЕСЛИ ССЫЛКИ НЕТ - не отправляем тотем
         if not match:
@@ -157,8 +128,7 @@ class MessageFilter:
         # Формируем заголовок
         if link:
             # Экранируем специальные символы для Markdown
-            import re
-            link_escaped = link.replace('(', '\(').replace(')', '\)')
+            link_escaped = link.replace('(', '\\(').replace(')', '\\)')
             title = f"{title_emoji} [{title_base}]({link_escaped}):"
             
             # Убираем ссылку из текста если она там есть
@@ -168,14 +138,13 @@ class MessageFilter:
             title = f"{title_emoji} {title_base}:"
     
         # Очищаем текст от лишних пробелов
-        import re
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = WHITESPACE_RE.sub(' ', text).strip()
     
         return f"{title}\n\n{text}"
     
     @staticmethod
     def classify_message(text: str) -> Dict:
-        """Классификация входящего сообщения"""
+        """Классификация входящего сообщения (текст приводится к нижнему регистру один раз)"""
         text_lower = text.lower()
         
         if "stock:" in text_lower and "foodstock update" in text_lower:
@@ -186,7 +155,7 @@ class MessageFilter:
                     "data": fruits
                 }
         
-        totem_type, cleaned_text, link = MessageFilter.extract_totem_info(text)
+        totem_type, cleaned_text, link = MessageFilter.extract_totem_info(text, text_lower)
         if totem_type:
             return {
                 "type": "totem",
@@ -0,0 +1,209 @@
+"""
+fruit_catalog.py - Единый каталог фруктов
+
+Все сведения о фрукте (id, варианты написания, названия, эмодзи, жирность
+и готовые HTML-фрагменты) собраны в одной неизменяемой записи. Каталог
+загружается из Config.FRUIT_CATALOG_PATH и дальше только читается: фильтры,
+клавиатуры настроек, статистика и уведомления берут данные отсюда.
+
+При перезагрузке собирается новый каталог и атомарно подменяет старый;
+обработчики, уже получившие ссылку на старый, доработают с ним.
+"""
+
+import html
+import json
+import logging
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from config import Config, BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMOJI = "🍎"
+
+
+@dataclass(frozen=True)
+class FruitLocale:
+    """Представление фрукта на одном языке"""
+    name: str
+    emoji: str
+    display: str        # "🍐 Груша" - для настроек и статистики
+    stock_prefix: str   # "<b>🍐 x" - часть строки стока до количества
+    stock_suffix: str   # " Груша</b> — stock" - часть строки стока после количества
+
+    def render_stock(self, quantity: int) -> str:
+        """Строка уведомления о стоке: "🍐 x2 Груша — stock" """
+        return f"{self.stock_prefix}{quantity}{self.stock_suffix}"
+
+
+@dataclass(frozen=True)
+class FruitRecord:
+    """Неизменяемая запись о фрукте"""
+    id: int                     # Стабильный числовой id (для callback-данных)
+    key: str                    # Каноническое английское название (хранится в БД)
+    aliases: Tuple[str, ...]    # Варианты написания в постах канала (без @)
+    bold: bool
+    ru: FruitLocale
+    en: FruitLocale
+
+    def locale(self, lang: str) -> FruitLocale:
+        """Представление для языка пользователя ("RUS"/"ru" - русский, иначе английский)"""
+        return self.ru if lang in ("RUS", "ru") else self.en
+
+
+def _make_locale(name: str, emoji: str, bold: bool) -> FruitLocale:
+    """Подготовка представления с заранее собранными HTML-фрагментами"""
+    safe_name = html.escape(name, quote=False)
+    if bold:
+        prefix = f"<b>{emoji} x"
+        suffix = f" {safe_name}</b> — stock"
+    else:
+        prefix = f"{emoji} x"
+        suffix = f" {safe_name} — stock"
+
+    return FruitLocale(
+        name=name,
+        emoji=emoji,
+        display=f"{emoji} {name}",
+        stock_prefix=prefix,
+        stock_suffix=suffix
+    )
+
+
+class FruitCatalog:
+    """Каталог фруктов с индексами по названию, id и вариантам написания"""
+
+    def __init__(self, records: List[FruitRecord]):
+        self.records: Tuple[FruitRecord, ...] = tuple(records)
+        self.keys: Tuple[str, ...] = tuple(r.key for r in self.records)
+
+        by_alias = {}
+        for record in self.records:
+            for alias in record.aliases:
+                by_alias.setdefault(alias, record)
+
+        self._by_key: Mapping[str, FruitRecord] = MappingProxyType({r.key: r for r in self.records})
+        self._by_id: Mapping[int, FruitRecord] = MappingProxyType({r.id: r for r in self.records})
+        self._by_alias: Mapping[str, FruitRecord] = MappingProxyType(by_alias)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._by_key
+
+    def get(self, key: str) -> Optional[FruitRecord]:
+        """Запись по каноническому названию"""
+        return self._by_key.get(key)
+
+    def get_by_id(self, fruit_id: int) -> Optional[FruitRecord]:
+        """Запись по числовому id"""
+        return self._by_id.get(fruit_id)
+
+    def resolve(self, name: str) -> Optional[FruitRecord]:
+        """Запись по варианту написания из поста ("DragonFruit", "Dragon Fruit")"""
+        return self._by_alias.get(name)
+
+    def translate(self, key: str, lang: str) -> str:
+        """Название фрукта на языке пользователя (неизвестные возвращаются как есть)"""
+        record = self._by_key.get(key)
+        return record.locale(lang).name if record else key
+
+    def emoji(self, key: str, lang: str = "EN") -> str:
+        """Эмодзи фрукта"""
+        record = self._by_key.get(key)
+        return record.locale(lang).emoji if record else DEFAULT_EMOJI
+
+    def display(self, key: str, lang: str) -> str:
+        """Эмодзи + название: "🍐 Груша" """
+        record = self._by_key.get(key)
+        if record:
+            return record.locale(lang).display
+        return f"{DEFAULT_EMOJI} {key}"
+
+    def render_stock(self, key: str, quantity: int, lang: str) -> str:
+        """Строка стока для уведомления (с выделением жирным, если нужно)"""
+        record = self._by_key.get(key)
+        if record:
+            return record.locale(lang).render_stock(quantity)
+        return f"{DEFAULT_EMOJI} x{quantity} {html.escape(key, quote=False)} — stock"
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FruitCatalog":
+        """
+        Сборка каталога из содержимого fruits.json
+        
+        Raises:
+            ValueError: повторяющиеся id/названия или незаполненные поля
+        """
+        records = []
+        seen_ids = set()
+        seen_keys = set()
+        
+        for item in data.get("fruits", []):
+            fruit_id = item.get("id")
+            key = item.get("key")
+            if not isinstance(fruit_id, int) or not key:
+                raise ValueError(f"У фрукта должны быть id и key: {item}")
+            if fruit_id in seen_ids or key in seen_keys:
+                raise ValueError(f"Повторяющийся фрукт: id={fruit_id}, key={key}")
+            seen_ids.add(fruit_id)
+            seen_keys.add(key)
+            
+            # Выключенные фрукты (например, ещё не вышедшие) в каталог не попадают
+            if not item.get("enabled", True):
+                continue
+            
+            bold = bool(item.get("bold", False))
+            emoji = item.get("emoji", DEFAULT_EMOJI)
+            
+            # Каноническое, слитное (DragonFruit) и дополнительные варианты
+            aliases = [key, key.replace(" ", "")]
+            for alias in item.get("aliases", []):
+                alias = alias.lstrip("@")
+                if alias not in aliases:
+                    aliases.append(alias)
+            
+            records.append(FruitRecord(
+                id=fruit_id,
+                key=key,
+                aliases=tuple(aliases),
+                bold=bold,
+                ru=_make_locale(item.get("name_ru", key), item.get("emoji_ru", emoji), bold),
+                en=_make_locale(key, emoji, bold)
+            ))
+        
+        return cls(records)
+    
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "FruitCatalog":
+        """Загрузка каталога из файла (по умолчанию Config.FRUIT_CATALOG_PATH)"""
+        with open(path or get_catalog_path(), "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def get_catalog_path() -> str:
+    """Абсолютный путь к файлу каталога"""
+    return os.path.join(BASE_DIR, Config.FRUIT_CATALOG_PATH)
+
+
+_catalog: Optional[FruitCatalog] = None
+
+
+def get_catalog() -> FruitCatalog:
+    """Текущий каталог (загружается при первом обращении)"""
+    global _catalog
+    if _catalog is None:
+        _catalog = FruitCatalog.load()
+        logger.info(f"🍎 Каталог фруктов загружен: {len(_catalog)} шт")
+    return _catalog
+
+
+def set_catalog(catalog: FruitCatalog) -> FruitCatalog:
+    """Атомарная подмена текущего каталога; возвращает предыдущий"""
+    global _catalog
+    previous, _catalog = _catalog, catalog
+    return previous
@@ -0,0 +1,183 @@
+"""
+health.py - HTTP-проверки живости и готовности для супервизора
+
+    GET /healthz - процесс жив и цикл событий отвечает (всегда 200, пока
+                   сервер вообще может ответить)
+    GET /readyz  - бот готов работать: база доступна, получение обновлений
+                   идёт (последний успешный getUpdates в polling или
+                   установленный вебхук). 200 или 503 + JSON с деталями:
+                   задачи планировщика, глубина очереди доставки, задержка
+                   цикла.
+
+Сервер работает в том же цикле событий, слушает только localhost и по
+умолчанию выключен (Config.HEALTH_ENABLED). Тяжёлые проверки (запрос к базе,
+очередь) кэшируются на HEALTH_CACHE_SECONDS, так что частый опрос их не
+умножает.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+
+from config import Config
+from utils.delivery import get_queue
+from utils.loop_monitor import monitor as loop_monitor
+
+logger = logging.getLogger(__name__)
+
+
+class HealthState:
+    """Отметки, которые обновляют middleware и bot.py"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.last_poll: Optional[float] = None     # Последний успешный getUpdates
+        self.last_update: Optional[float] = None   # Последнее полученное обновление
+        self.webhook_set = False
+        self.schedulers: List = []
+        self.leader = None
+
+
+state = HealthState()
+
+
+# ========== ОТМЕТКИ ==========
+
+class PollTrackingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время последнего успешного getUpdates"""
+
+    async def __call__(self, make_request, bot, method):
+        response = await make_request(bot, method)
+        if isinstance(method, GetUpdates):
+            state.last_poll = time.time()
+        return response
+
+
+class UpdateTrackingMiddleware(BaseMiddleware):
+    """Внешний middleware диспетчера: время последнего обновления"""
+
+    async def __call__(self, handler, event, data):
+        state.last_update = time.time()
+        return await handler(event, data)
+
+
+def setup_health(dp: Dispatcher, bot: Bot):
+    """Подключение отметок к диспетчеру и сессии бота"""
+    dp.update.outer_middleware(UpdateTrackingMiddleware())
+    bot.session.middleware(PollTrackingMiddleware())
+
+
+# ========== ПРОВЕРКИ ==========
+
+def _age(moment: Optional[float], now: float) -> Optional[float]:
+    return round(now - moment, 1) if moment else None
+
+
+def _check_storage() -> Dict[str, Any]:
+    """База и очередь доставки (в потоке - это запросы sqlite)"""
+    result: Dict[str, Any] = {}
+    try:
+        with sqlite3.connect(Config.DATABASE_PATH, timeout=2) as conn:
+            conn.execute("SELECT 1").fetchone()
+        result["database"] = {"ok": True}
+    except sqlite3.Error as e:
+        result["database"] = {"ok": False, "error": str(e)}
+
+    try:
+        result["delivery_queue"] = get_queue().stats()
+    except sqlite3.Error as e:
+        result["delivery_queue"] = {"error": str(e)}
+    return result
+
+
+def _jobs_status(now: float) -> List[Dict[str, Any]]:
+    jobs = []
+    for scheduler in state.schedulers:
+        for job in scheduler.status():
+            overdue = job["next_run"] is not None and not job["running"] and now - job["next_run"] > 60
+            jobs.append({
+                "name": job["name"],
+                "scheduler": scheduler.name,
+                "last_run_ago": _age(job["last_run"], now),
+                "next_run_in": round(job["next_run"] - now, 1) if job["next_run"] else None,
+                "running": job["running"],
+                "errors": job["errors"],
+                "overdue": overdue,
+            })
+    return jobs
+
+
+_cache: Dict[str, Any] = {}
+_cache_time = 0.0
+
+
+async def readiness() -> Dict[str, Any]:
+    """Отчёт о готовности (поле ready - итог)"""
+    global _cache, _cache_time
+    now = time.time()
+    if now - _cache_time > Config.HEALTH_CACHE_SECONDS:
+        _cache = await asyncio.to_thread(_check_storage)
+        _cache_time = now
+
+    if Config.RUN_MODE == "webhook":
+        updates_ok = state.webhook_set
+    else:
+        updates_ok = state.last_poll is not None and now - state.last_poll < Config.HEALTH_POLL_STALE
+
+    lag = loop_monitor.percentiles()
+    leader = state.leader
+    report = {
+        "mode": Config.RUN_MODE,
+        "uptime": round(now - state.started_at),
+        "updates": {
+            "ok": updates_ok,
+            "last_poll_ago": _age(state.last_poll, now),
+            "last_update_ago": _age(state.last_update, now),
+            "webhook_set": state.webhook_set,
+        },
+        "leader": bool(leader and leader.is_leader),
+        "jobs": _jobs_status(now),
+        "loop_lag_ms": {key: round(value * 1000, 1) for key, value in lag.items()},
+        **_cache,
+    }
+    report["ready"] = bool(_cache.get("database", {}).get("ok")) and updates_ok
+    return report
+
+
+# ========== СЕРВЕР ==========
+
+async def health_server():
+    """Фоновая задача: HTTP-сервер проверок (останавливается отменой)"""
+    from aiohttp import web
+
+    async def healthz(request):
+        return web.json_response({"alive": True, "uptime": round(time.time() - state.started_at)})
+
+    async def readyz(request):
+        report = await readiness()
+        return web.json_response(
+            report, status=200 if report["ready"] else 503,
+            dumps=lambda data: json.dumps(data, ensure_ascii=False)
+        )
+
+    app = web.Application()
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=Config.HEALTH_HOST, port=Config.HEALTH_PORT)
+    await site.start()
+    logger.info(f"🩺 Проверки здоровья: http://{Config.HEALTH_HOST}:{Config.HEALTH_PORT}/readyz")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,85 @@
+"""
+hot_reload.py - Горячая перезагрузка каталога фруктов и локализаций
+
+Файлы читаются и разбираются в отдельном потоке, после чего новые данные
+атомарно подменяют старые. Обработка сообщений при этом не блокируется,
+а готовые строки каталога обновляются вместе с ним.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+from utils.fruit_catalog import FruitCatalog, get_catalog_path, set_catalog
+from utils.messages import locale_manager
+
+logger = logging.getLogger(__name__)
+
+
+def get_watched_files() -> list:
+    """Файлы, изменения которых отслеживаются"""
+    files = [get_catalog_path()]
+    locales_dir = locale_manager.locales_dir
+    for filename in sorted(os.listdir(locales_dir)):
+        if filename.endswith(".json"):
+            files.append(os.path.join(locales_dir, filename))
+    return files
+
+
+def get_mtimes() -> Dict[str, float]:
+    """Время изменения отслеживаемых файлов"""
+    mtimes = {}
+    for path in get_watched_files():
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            mtimes[path] = 0.0
+    return mtimes
+
+
+async def reload_data() -> Dict:
+    """
+    Перечитать каталог фруктов и локализации
+    
+    Данные подменяются только если оба источника прочитаны без ошибок.
+    
+    Returns:
+        Dict: количество фруктов и список языков после перезагрузки
+    """
+    catalog = await asyncio.to_thread(FruitCatalog.load)
+    locales = await asyncio.to_thread(locale_manager.read_locales)
+    
+    locale_manager.set_locales(locales)
+    set_catalog(catalog)
+    
+    logger.info(f"🔄 Данные перезагружены: фруктов {len(catalog)}, языки {sorted(locales)}")
+    
+    return {
+        "fruits": len(catalog),
+        "languages": sorted(locales)
+    }
+
+
+# Время изменения файлов при последней проверке (None - проверок ещё не было)
+_mtimes: Optional[Dict[str, float]] = None
+
+
+async def check_for_changes():
+    """
+    Задача планировщика: перезагрузка при изменении файлов
+    Запускается раз в Config.HOT_RELOAD_INTERVAL секунд
+    """
+    global _mtimes
+    current = await asyncio.to_thread(get_mtimes)
+    if _mtimes is None or current == _mtimes:
+        _mtimes = current
+        return
+    
+    # Запоминаем сразу, чтобы не повторять ошибку на каждом запуске -
+    # следующее сохранение файла снова изменит время
+    _mtimes = current
+    try:
+        await reload_data()
+    except Exception as e:
+        logger.error(f"❌ Ошибка горячей перезагрузки (оставлены прежние данные): {e}")
@@ -0,0 +1,252 @@
+"""
+incremental_backup.py - Инкрементальные бэкапы (Config.BACKUP_MODE = "incremental")
+
+Триггеры на таблицах Config.INCREMENTAL_TABLES записывают в change_journal
+rowid каждой изменённой строки. Раз в AUTO_BACKUP_INTERVAL часов журнал
+сворачивается в дельту - NDJSON.gz с текущим состоянием изменённых строк
+(upsert) или их удалением (delete); несколько изменений одной строки дают
+одну запись. Полный снимок (backup_utils) снимается, только если его ещё
+нет после включения журнала или он старше FULL_BACKUP_INTERVAL_DAYS.
+
+Номера записей журнала (seq) растут монотонно (AUTOINCREMENT) и попадают
+в полный снимок вместе с базой, поэтому restore_backup.py знает, какие
+дельты применять к снимку: только с to_seq больше последнего seq снимка.
+Дельты записываются в каталог бэкапов со ссылкой на свой полный снимок.
+"""
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from backup_utils import DELTA_PREFIX, BackupCatalog, quote_identifier
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def journal_high_water(conn: sqlite3.Connection) -> int:
+    """Последний выданный seq журнала (0, если журнал ещё пуст)"""
+    try:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_journal'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def primary_key(conn: sqlite3.Connection, table: str) -> str:
+    """Колонка INTEGER PRIMARY KEY (она же rowid) таблицы"""
+    for _, name, col_type, _, _, pk in conn.execute(f"PRAGMA table_info({quote_identifier(table)})"):
+        if pk == 1 and col_type.upper() == "INTEGER":
+            return name
+    raise ValueError(f"У таблицы {table} нет INTEGER PRIMARY KEY - инкрементальный бэкап не поддерживается")
+
+
+class IncrementalBackup:
+    def __init__(self, db_path: str = Config.DATABASE_PATH, backup_dir: str = "database_backups",
+                 tables: Tuple[str, ...] = Config.INCREMENTAL_TABLES, catalog: Optional[BackupCatalog] = None):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.tables = tables
+        self.catalog = catalog or BackupCatalog(backup_dir)
+
+    def get_connection(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    # ========== ЖУРНАЛ ==========
+
+    def install(self) -> bool:
+        """
+        Создание журнала и триггеров (идемпотентно)
+
+        Returns:
+            True, если журнал только что включён - нужен новый полный снимок
+        """
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS change_journal (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tbl TEXT NOT NULL,
+                    row_id INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS backup_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            created = False
+            for table in self.tables:
+                primary_key(conn, table)  # Проверка, что rowid стабилен
+                for event, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                    trigger = f"journal_{table}_{event.lower()}"
+                    exists = conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger,)
+                    ).fetchone()
+                    if exists:
+                        continue
+                    conn.execute(f'''
+                        CREATE TRIGGER {quote_identifier(trigger)} AFTER {event} ON {quote_identifier(table)}
+                        BEGIN
+                            INSERT INTO change_journal (tbl, row_id) VALUES ('{table.replace("'", "''")}', {ref}.rowid);
+                        END
+                    ''')
+                    created = True
+            if created:
+                conn.execute(
+                    "INSERT OR REPLACE INTO backup_meta (key, value) VALUES ('journal_installed_at', ?)",
+                    (str(time.time()),)
+                )
+            conn.commit()
+        if created:
+            logger.info(f"🧩 Журнал изменений включён для таблиц: {', '.join(self.tables)}")
+        return created
+
+    def uninstall(self):
+        """Удаление триггеров и журнала (при возврате к полным бэкапам)"""
+        with self.get_connection() as conn:
+            triggers = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'journal\\_%' ESCAPE '\\'"
+            )]
+            for trigger in triggers:
+                conn.execute(f"DROP TRIGGER IF EXISTS {quote_identifier(trigger)}")
+            conn.execute("DROP TABLE IF EXISTS change_journal")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'backup_meta'").fetchone():
+                conn.execute("DELETE FROM backup_meta WHERE key IN ('journal_installed_at', 'last_full_at')")
+            conn.commit()
+        if triggers:
+            logger.info("🧩 Журнал изменений выключен")
+
+    def pending_changes(self) -> int:
+        with self.get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM change_journal").fetchone()[0]
+
+    # ========== ПОЛНЫЙ СНИМОК ИЛИ ДЕЛЬТА ==========
+
+    def _meta(self, conn, key: str) -> Optional[float]:
+        row = conn.execute("SELECT value FROM backup_meta WHERE key = ?", (key,)).fetchone()
+        return float(row[0]) if row else None
+
+    def needs_full(self) -> bool:
+        """Нужен ли полный снимок: его нет после включения журнала или он слишком старый"""
+        with self.get_connection() as conn:
+            installed_at = self._meta(conn, "journal_installed_at") or 0
+            last_full_at = self._meta(conn, "last_full_at")
+        if last_full_at is None or last_full_at < installed_at:
+            return True
+        return time.time() - last_full_at > Config.FULL_BACKUP_INTERVAL_DAYS * 86400
+
+    def mark_full(self, started_at: float):
+        """Отметка о полном снимке (время начала - изменения после него попадут в дельты)"""
+        with self.get_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO backup_meta (key, value) VALUES ('last_full_at', ?)", (str(started_at),)
+            )
+            conn.commit()
+
+    def create_delta(self) -> Optional[str]:
+        """
+        Дельта с изменениями из журнала (блокирующий вызов)
+
+        Returns:
+            Путь к файлу или None, если изменений нет
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        try:
+            # Одна транзакция чтения: журнал и строки видны в одном согласованном состоянии
+            conn.execute("BEGIN")
+            to_seq = conn.execute("SELECT MAX(seq) FROM change_journal").fetchone()[0]
+            if to_seq is None:
+                conn.rollback()
+                return None
+            from_seq = conn.execute("SELECT MIN(seq) FROM change_journal").fetchone()[0]
+
+            changed: Dict[str, List[int]] = {}
+            for row in conn.execute(
+                "SELECT DISTINCT tbl, row_id FROM change_journal WHERE seq <= ? ORDER BY tbl, row_id", (to_seq,)
+            ):
+                changed.setdefault(row["tbl"], []).append(row["row_id"])
+
+            records = []
+            counts = {"upsert": 0, "delete": 0}
+            for table, row_ids in changed.items():
+                key = primary_key(conn, table)
+                for row_id in row_ids:
+                    current = conn.execute(
+                        f"SELECT * FROM {quote_identifier(table)} WHERE rowid = ?", (row_id,)
+                    ).fetchone()
+                    if current is None:
+                        records.append({"t": table, "op": "delete", "key": key, "id": row_id})
+                        counts["delete"] += 1
+                    else:
+                        records.append({"t": table, "op": "upsert", "key": key, "row": dict(current)})
+                        counts["upsert"] += 1
+            conn.rollback()
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            delta_name = f"{DELTA_PREFIX}{timestamp}_{to_seq}.ndjson.gz"
+            delta_path = os.path.join(self.backup_dir, delta_name)
+            # Полный снимок, к которому применяется дельта
+            last_full = self.catalog.latest("full")
+            base = last_full["file"] if last_full else None
+            header = {
+                "type": "delta", "base": base, "from_seq": from_seq, "to_seq": to_seq,
+                "created": datetime.now().isoformat(timespec="seconds"), **counts,
+            }
+            with gzip.open(delta_path + ".tmp", "wt", encoding="utf-8") as f:
+                for record in [header] + records:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str, separators=(",", ":")) + "\n")
+            os.replace(delta_path + ".tmp", delta_path)
+            entry = self.catalog.add(delta_path, "delta", base=base)
+
+            # Файл записан - теперь можно забыть эти изменения (новые получили seq > to_seq)
+            conn.execute("DELETE FROM change_journal WHERE seq <= ?", (to_seq,))
+            conn.commit()
+
+            logger.info(
+                f"🧩 Дельта {delta_name}: {counts['upsert']} изменено, {counts['delete']} удалено "
+                f"({entry['size']:,} байт)"
+            )
+            return delta_path
+        finally:
+            conn.close()
+
+
+# ========== ВОССТАНОВЛЕНИЕ ==========
+
+def read_delta(path: str) -> Tuple[dict, List[dict]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    return lines[0], lines[1:]
+
+
+def apply_delta(conn: sqlite3.Connection, records: List[dict]):
+    """Применение записей дельты: сначала удаления, затем upsert (UNIQUE-ключи не конфликтуют)"""
+    for record in records:
+        if record["op"] == "delete":
+            conn.execute(
+                f"DELETE FROM {quote_identifier(record['t'])} WHERE {quote_identifier(record['key'])} = ?",
+                (record["id"],)
+            )
+    for record in records:
+        if record["op"] == "upsert":
+            row = record["row"]
+            key = quote_identifier(record["key"])
+            columns = ", ".join(quote_identifier(col) for col in row)
+            placeholders = ", ".join("?" for _ in row)
+            updates = ", ".join(
+                f"{quote_identifier(col)} = excluded.{quote_identifier(col)}" for col in row if col != record["key"]
+            )
+            conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            conn.execute(
+                f"INSERT INTO {quote_identifier(record['t'])} ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT({key}) {conflict}",
+                list(row.values())
+            )
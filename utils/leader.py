@@ -0,0 +1,142 @@
+"""
+leader.py - Выбор лидера для фоновых задач в единственном экземпляре
+
+Проверка подписок и автобэкапы должны работать ровно в одном процессе,
+даже если запущено несколько копий бота (blue/green, webhook + polling).
+Лидер держит аренду (строку в таблице leader_lease общей базы) и продлевает
+её каждые LEADER_RENEW_INTERVAL секунд. Если лидер упал, аренда истекает
+через LEADER_LEASE_TTL секунд и её забирает следующий процесс; при
+нормальной остановке аренда освобождается сразу. Временная ошибка базы
+("database is locked" во время бэкапа) лидерство не снимает: задачи
+останавливаются, только если аренда могла истечь до следующей попытки.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    def __init__(self, name: str, db_path: str = Config.DATABASE_PATH,
+                 ttl: Optional[float] = None, renew_interval: Optional[float] = None):
+        self.name = name
+        self.db_path = db_path
+        self.ttl = ttl or Config.LEADER_LEASE_TTL
+        self.renew_interval = renew_interval or Config.LEADER_RENEW_INTERVAL
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        self.init_db()
+
+    def get_connection(self):
+        """Подключение к общей базе"""
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def init_db(self):
+        """Создание таблицы аренды"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leader_lease (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.commit()
+
+    def try_acquire(self) -> bool:
+        """
+        Захват или продление аренды одним UPSERT
+
+        Строка обновляется, только если аренда наша или уже истекла, поэтому
+        одновременный захват двумя процессами невозможен.
+        """
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO leader_lease (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at < ?
+            ''', (self.name, self.holder, now + self.ttl, now))
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def release(self):
+        """Освобождение аренды (другой процесс заберёт её без ожидания TTL)"""
+        with self.get_connection() as conn:
+            conn.execute('DELETE FROM leader_lease WHERE name = ? AND holder = ?', (self.name, self.holder))
+            conn.commit()
+
+    def current_leader(self) -> Optional[str]:
+        """Текущий держатель аренды (None, если аренды нет или она истекла)"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                'SELECT holder FROM leader_lease WHERE name = ? AND expires_at >= ?',
+                (self.name, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    async def run(self, jobs: Dict[str, Callable[[], Awaitable]]):
+        """
+        Запуск задач, пока этот процесс - лидер
+
+        Args:
+            jobs: имя задачи -> фабрика корутины (вызывается при каждом получении лидерства)
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+        last_renewed = 0.0  # Начало последнего успешного продления (аренда действует ttl от него)
+
+        try:
+            while True:
+                attempt_started = time.time()
+                try:
+                    acquired = await asyncio.to_thread(self.try_acquire)
+                    if acquired:
+                        last_renewed = attempt_started
+                except sqlite3.Error as e:
+                    # Аренда ещё наша, если не истечёт до следующей попытки
+                    lease_left = last_renewed + self.ttl - time.time()
+                    acquired = self.is_leader and lease_left > self.renew_interval
+                    if acquired:
+                        logger.warning(f"⚠️ Ошибка продления аренды {self.name}: {e}, "
+                                       f"аренда действует ещё {lease_left:.0f} с, повторю")
+                    else:
+                        logger.error(f"❌ Ошибка продления аренды {self.name}: {e}")
+
+                if acquired and not self.is_leader:
+                    self.is_leader = True
+                    logger.info(f"👑 Процесс {self.holder} стал лидером ({self.name}), запускаю: {', '.join(jobs)}")
+                    tasks = {name: asyncio.create_task(factory()) for name, factory in jobs.items()}
+
+                elif not acquired and self.is_leader:
+                    self.is_leader = False
+                    logger.warning(f"⚠️ Процесс {self.holder} потерял лидерство ({self.name}), останавливаю задачи")
+                    await self._cancel(tasks)
+                    tasks = {}
+
+                await asyncio.sleep(self.renew_interval)
+
+        finally:
+            await self._cancel(tasks)
+            if self.is_leader:
+                self.is_leader = False
+                try:
+                    self.release()
+                    logger.info(f"👑 Аренда {self.name} освобождена")
+                except sqlite3.Error as e:
+                    logger.error(f"❌ Не удалось освободить аренду {self.name}: {e}")
+
+    @staticmethod
+    async def _cancel(tasks: Dict[str, asyncio.Task]):
+        """Остановка задач лидера"""
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
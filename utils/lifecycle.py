@@ -0,0 +1,123 @@
+"""
+lifecycle.py - Жизненный цикл процесса: фоновые задачи и корректная остановка
+
+Все фоновые задачи запускаются через start_task() и хранятся по имени, а
+каждая рассылка регистрируется как FanOut со списком ещё не отправленных
+сообщений. При остановке bot.on_shutdown даёт рассылкам доработать до
+дедлайна, остаток сохраняет в очередь доставки и останавливает задачи.
+"""
+
+import asyncio
+import logging
+import signal
+from typing import Callable, Coroutine, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_tasks: Dict[str, asyncio.Task] = {}
+_fanouts: Set["FanOut"] = set()
+_stopping = False
+
+
+def is_stopping() -> bool:
+    """Идёт ли остановка (новые рассылки сразу уходят в очередь)"""
+    return _stopping
+
+
+def begin_shutdown():
+    """Отметка о начале остановки"""
+    global _stopping
+    _stopping = True
+
+
+def install_signal_handlers(callback: Callable[[], None]) -> bool:
+    """SIGINT/SIGTERM -> callback; False, если платформа не поддерживает (Windows)"""
+    loop = asyncio.get_running_loop()
+    try:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, callback)
+        return True
+    except (NotImplementedError, RuntimeError):
+        return False
+
+
+# ========== ФОНОВЫЕ ЗАДАЧИ ==========
+
+def start_task(coro: Coroutine, name: str) -> asyncio.Task:
+    """Запуск именованной фоновой задачи"""
+    task = asyncio.create_task(coro, name=name)
+    _tasks[name] = task
+    task.add_done_callback(lambda t: _tasks.pop(name, None) if _tasks.get(name) is t else None)
+    return task
+
+
+def running_tasks() -> List[str]:
+    """Имена работающих фоновых задач"""
+    return [name for name, task in _tasks.items() if not task.done()]
+
+
+async def stop_tasks(timeout: float = 10) -> List[str]:
+    """Отмена всех фоновых задач; возвращает имена остановленных"""
+    tasks = dict(_tasks)
+    for task in tasks.values():
+        task.cancel()
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=timeout)
+    _tasks.clear()
+    return list(tasks)
+
+
+# ========== РАССЫЛКИ ==========
+
+class FanOut:
+    """Рассылка в процессе: какие сообщения ещё не отправлены"""
+
+    def __init__(self, messages: list):
+        self.pending = dict(enumerate(messages))
+        self.total = len(messages)
+        self.task: Optional[asyncio.Task] = asyncio.current_task()
+
+    def mark_sent(self, index: int):
+        """Сообщение отправлено (или окончательно не отправлено) - сохранять не нужно"""
+        self.pending.pop(index, None)
+
+    def __enter__(self) -> "FanOut":
+        _fanouts.add(self)
+        return self
+
+    def __exit__(self, *exc):
+        _fanouts.discard(self)
+
+
+def active_fanouts() -> int:
+    """Число рассылок в процессе"""
+    return len(_fanouts)
+
+
+async def drain_fanouts(timeout: float) -> Tuple[int, list]:
+    """
+    Ожидание рассылок до дедлайна
+
+    Returns:
+        (сколько рассылок завершилось само, неотправленные сообщения прерванных)
+    """
+    fanouts = list(_fanouts)
+    tasks = {f.task for f in fanouts if f.task and not f.task.done()}
+    if not tasks:
+        return len(fanouts), []
+
+    logger.info(f"⏳ Жду завершения {len(tasks)} рассылок (до {timeout} с)...")
+    _, still_running = await asyncio.wait(tasks, timeout=timeout)
+
+    # Снимок до отмены: сообщение, отправка которого прервана, лучше повторить, чем потерять
+    remaining = []
+    interrupted = [f for f in fanouts if f.task in still_running]
+    for fanout in interrupted:
+        remaining.extend(fanout.pending.values())
+
+    for task in still_running:
+        task.cancel()
+    if still_running:
+        await asyncio.wait(still_running, timeout=5)
+
+    return len(fanouts) - len(interrupted), remaining
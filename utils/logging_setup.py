@@ -0,0 +1,103 @@
+"""
+logging_setup.py - Неблокирующее логирование
+
+Обработчики логов в цикле событий только кладут запись в очередь
+(QueueHandler), а пишет в stdout отдельный поток (QueueListener), так что
+медленный терминал или перенаправленный вывод не тормозит бота.
+
+Структурированные поля передаются через extra=kv(...):
+
+    logger.info("📊 Рассылка завершена", extra=kv(job="food", sent=120, errors=2))
+    -> ... - 📊 Рассылка завершена | job=food sent=120 errors=2
+
+Для частых логгеров (Config.LOG_SAMPLING) записи ниже WARNING
+прореживаются: проходит одна из N. Предупреждения и ошибки не теряются.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Dict, Optional
+
+from config import Config
+
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def kv(**fields) -> dict:
+    """Поля для extra=: logger.info("...", extra=kv(user_id=1, sent=5))"""
+    return {"fields": fields}
+
+
+def _format_value(value) -> str:
+    text = str(value)
+    if not text or any(ch in text for ch in ' ="\n'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Обычная строка лога + поля записи в виде key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " | " + " ".join(f"{key}={_format_value(value)}" for key, value in fields.items())
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает одну из N записей ниже WARNING для заданных логгеров (и их потомков)"""
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = {name: rate for name, rate in rates.items() if rate > 1}
+        self.counters: Dict[str, int] = {}
+
+    def _rate_for(self, name: str) -> Optional[int]:
+        while name:
+            rate = self.rates.get(name)
+            if rate:
+                return rate
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate_for(record.name)
+        if not rate:
+            return True
+        count = self.counters.get(record.name, 0)
+        self.counters[record.name] = count + 1
+        return count % rate == 0
+
+
+def setup_logging(fmt: str = DEFAULT_FORMAT) -> logging.handlers.QueueListener:
+    """
+    Настройка корневого логгера: очередь + поток-писатель
+
+    Поток останавливается (с дописыванием очереди) при выходе из процесса.
+    """
+    log_queue = queue.SimpleQueue()
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(Config.LOG_SAMPLING))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(KeyValueFormatter(fmt))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(Config.LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,198 @@
+"""
+loop_monitor.py - Задержка цикла событий и поиск блокирующих вызовов
+
+Задача-пульс в цикле событий засыпает на LOOP_MONITOR_INTERVAL секунд и
+отмечает, насколько позже она проснулась: это и есть задержка цикла, на
+которую опаздывает обработка всех обновлений. Из последних замеров
+считаются перцентили.
+
+Сторожевой поток следит за временем последнего пульса. Если цикл не
+отвечает дольше LOOP_BLOCK_THRESHOLD секунд, поток снимает стек главного
+потока в этот момент - то есть стек вызова, который держит цикл (sqlite,
+gzip, чтение файла...). Блокировки группируются по строке нашего кода,
+с которой начался блокирующий вызов; отчёт показывает админ-команда /loop
+и периодическое сообщение администратору.
+"""
+
+import asyncio
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+from config import Config, BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних замеров задержки хранить для перцентилей
+SAMPLES = 3000
+
+
+class Offender:
+    """Место в коде, блокировавшее цикл"""
+
+    __slots__ = ("location", "count", "total", "max_lag", "stack", "last_seen")
+
+    def __init__(self, location: str):
+        self.location = location
+        self.stack = ""
+        self.count = 0
+        self.total = 0.0
+        self.max_lag = 0.0
+        self.last_seen = 0.0
+
+
+class LoopMonitor:
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None):
+        self.interval = interval or Config.LOOP_MONITOR_INTERVAL
+        self.threshold = threshold or Config.LOOP_BLOCK_THRESHOLD
+        self.samples: deque = deque(maxlen=SAMPLES)
+        self.max_lag = 0.0
+        self.blocks = 0
+        self.offenders: Dict[str, Offender] = {}
+
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reported: Dict[str, int] = {}
+
+    # ========== ПУЛЬС ==========
+
+    async def run(self):
+        """Задача-пульс; сторожевой поток запускается и останавливается вместе с ней"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🩺 Монитор цикла запущен (порог блокировки {self.threshold} с)")
+
+        try:
+            while True:
+                started = time.monotonic()
+                self._last_beat = started
+                await asyncio.sleep(self.interval)
+                lag = max(time.monotonic() - started - self.interval, 0.0)
+                self.samples.append(lag)
+                if lag > self.max_lag:
+                    self.max_lag = lag
+        finally:
+            self._stop.set()
+
+    def percentiles(self) -> Dict[str, float]:
+        """p50/p95/p99/max по последним замерам, секунды"""
+        if not self.samples:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {
+            "p50": ordered[int(last * 0.50)],
+            "p95": ordered[int(last * 0.95)],
+            "p99": ordered[int(last * 0.99)],
+            "max": self.max_lag,
+        }
+
+    # ========== СТОРОЖЕВОЙ ПОТОК ==========
+
+    def _watch(self):
+        stalled_beat = None  # Пульс, на котором застрял текущий блок
+        offender = None
+        longest = 0.0
+
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+
+            if stalled < self.threshold:
+                if offender is not None:
+                    logger.warning(f"🐢 Цикл событий был заблокирован на {longest:.2f} с: {offender.location}")
+                stalled_beat = offender = None
+                continue
+
+            if beat != stalled_beat:
+                # Новая блокировка: стек снимается один раз, пока вызов ещё выполняется
+                stalled_beat = beat
+                offender = self._capture()
+                if offender is None:
+                    continue
+                offender.count += 1
+                self.blocks += 1
+                offender.total += stalled
+            elif offender is not None:
+                offender.total += self.interval
+
+            if offender is not None:
+                longest = stalled
+                offender.max_lag = max(offender.max_lag, stalled)
+                offender.last_seen = time.time()
+
+    def _capture(self) -> Optional[Offender]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+
+        frames = traceback.extract_stack(frame)
+        location = _own_location(frames)
+        offender = self.offenders.get(location)
+        if offender is None:
+            offender = self.offenders[location] = Offender(location)
+        offender.stack = "".join(traceback.format_list(frames[-12:]))
+        return offender
+
+    def top_offenders(self, limit: int = 10) -> List[Offender]:
+        """Места блокировок по суммарному времени"""
+        return sorted(list(self.offenders.values()), key=lambda o: o.total, reverse=True)[:limit]
+
+    def new_offenders(self) -> List[Offender]:
+        """Блокировки, появившиеся с прошлого вызова (для периодического отчёта)"""
+        fresh = [o for o in self.top_offenders(limit=len(self.offenders))
+                 if o.count > self._reported.get(o.location, 0)]
+        for offender in fresh:
+            self._reported[offender.location] = offender.count
+        return fresh
+
+
+def _own_location(frames: traceback.StackSummary) -> str:
+    """Самый глубокий кадр нашего кода (а не библиотеки): 'bot.py:42 create_backup'"""
+    for frame in reversed(frames):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(BASE_DIR) and "site-packages" not in path and not path.endswith("loop_monitor.py"):
+            return f"{os.path.relpath(path, BASE_DIR)}:{frame.lineno} {frame.name}"
+    frame = frames[-1]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+
+
+monitor = LoopMonitor()
+
+
+def format_report(offenders: List[Offender], with_stack: bool = True) -> str:
+    """Текст отчёта для администратора (HTML)"""
+    stats = monitor.percentiles()
+    lines = [
+        "🩺 <b>Задержка цикла событий</b>",
+        f"p50 {stats['p50'] * 1000:.0f} мс · p95 {stats['p95'] * 1000:.0f} мс · "
+        f"p99 {stats['p99'] * 1000:.0f} мс · max {stats['max'] * 1000:.0f} мс",
+        f"Блокировок дольше {monitor.threshold} с: {monitor.blocks}",
+    ]
+    for offender in offenders:
+        lines.append(
+            f"\n🐢 <code>{html.escape(offender.location)}</code>\n"
+            f"раз: {offender.count}, всего {offender.total:.1f} с, max {offender.max_lag:.2f} с"
+        )
+        if with_stack:
+            lines.append(f"<pre>{html.escape(offender.stack[-1500:])}</pre>")
+    return "\n".join(lines)
+
+
+async def report_loop_blocking(bot):
+    """Задача планировщика: сообщить администратору о новых блокировках цикла"""
+    offenders = monitor.new_offenders()
+    if not offenders:
+        return
+    await bot.send_message(Config.ADMIN_ID, format_report(offenders[:3]), parse_mode="HTML")
@@ -1,61 +1,152 @@
 import json
+import logging
 import os
-from typing import Dict, Any
-from config import Config
+from string import Formatter
+from typing import Dict, Any, Optional, Tuple
+from config import BASE_DIR
+from utils.fruit_catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+# Язык, на который откатываемся при отсутствии языка или ключа
+DEFAULT_LANG = "ru"
+
+# Ключи, которые использует код бота - проверяются при загрузке
+REQUIRED_KEYS = (
+    "start.welcome",
+    "start.choose_language",
+    "subscription.require",
+    "subscription.check_button",
+    "subscription.not_subscribed",
+    "settings.title",
+    "settings.food_button",
+    "settings.free_totems_button",
+    "settings.paid_totems_button",
+    "settings.back_button",
+    "settings.food_selection",
+    "settings.select_all",
+    "settings.save_button",
+    "settings.saved",
+    "settings.no_fruits_selected",
+    "notifications.unsubscribed",
+    "admin.stats",
+)
+
+
+class Template:
+    """Заранее разобранный шаблон строки локализации"""
+    __slots__ = ("text", "fields")
+    
+    def __init__(self, text: str):
+        self.text = text
+        try:
+            self.fields = tuple(name for _, name, _, _ in Formatter().parse(text) if name is not None)
+        except ValueError:
+            # Непарные фигурные скобки - строка выводится как есть
+            self.fields = ()
+    
+    def render(self, kwargs: Dict[str, Any]) -> str:
+        """Подстановка параметров; при ошибке возвращается исходный текст"""
+        if not self.fields or not kwargs:
+            return self.text
+        try:
+            return self.text.format(**kwargs)
+        except (KeyError, IndexError, ValueError, AttributeError):
+            return self.text
+
+
+def flatten_locale(data: Dict, prefix: str = "") -> Dict[str, str]:
+    """Вложенный словарь локализации -> {"settings.title": "..."}"""
+    flat = {}
+    for name, value in data.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(flatten_locale(value, f"{key}."))
+        elif isinstance(value, str):
+            flat[key] = value
+    return flat
+
 
 class LocaleManager:
-    def __init__(self):
+    def __init__(self, locales_dir: Optional[str] = None):
+        # Каталог ищется относительно проекта, а не текущей директории процесса
+        self.locales_dir = locales_dir or os.path.join(BASE_DIR, "locales")
         self.locales = {}
-        self.load_locales()
+        self.templates: Dict[Tuple[str, str], Template] = {}
+        # Файлы читаются при первом обращении (или явным load_locales при запуске бота)
+        self.loaded = False
     
-    def load_locales(self):
-        """Загрузка локализаций из файлов"""
-        locales_dir = "locales"
-        for filename in os.listdir(locales_dir):
+    def read_locales(self) -> Dict[str, Dict]:
+        """Чтение локализаций из файлов (без изменения текущих)"""
+        locales = {}
+        for filename in os.listdir(self.locales_dir):
             if filename.endswith(".json"):
                 lang = filename.split(".")[0]
-                with open(os.path.join(locales_dir, filename), 'r', encoding='utf-8') as f:
-                    self.locales[lang] = json.load(f)
+                with open(os.path.join(self.locales_dir, filename), 'r', encoding='utf-8') as f:
+                    locales[lang] = json.load(f)
+        return locales
     
-    def get_text(self, lang: str, key: str, **kwargs) -> str:
-        """Получение текста по ключу с подстановкой параметров"""
-        keys = key.split(".")
-        text = self.locales.get(lang, self.locales["ru"])
+    def load_locales(self):
+        """Загрузка локализаций из файлов"""
+        self.set_locales(self.read_locales())
+    
+    def build_templates(self, locales: Dict[str, Dict]) -> Dict[Tuple[str, str], Template]:
+        """
+        Плоская таблица {(язык, ключ): шаблон} с проверкой ключей
+        
+        Raises:
+            ValueError: нет основной локализации или в ней нет нужных ключей
+        """
+        if DEFAULT_LANG not in locales:
+            raise ValueError(f"Не найдена основная локализация {DEFAULT_LANG}.json")
+        
+        flat = {lang: flatten_locale(data) for lang, data in locales.items()}
         
-        for k in keys:
-            if isinstance(text, dict):
-                text = text.get(k, "")
-            else:
-                return key
+        missing_required = [key for key in REQUIRED_KEYS if key not in flat[DEFAULT_LANG]]
+        if missing_required:
+            raise ValueError(f"В {DEFAULT_LANG}.json нет ключей: {', '.join(missing_required)}")
         
-        if text and kwargs:
-            try:
-                return text.format(**kwargs)
-            except:
-                return text
+        # Ключи, которых нет в других языках, будут браться из основного
+        all_keys = set().union(*flat.values())
+        for lang, texts in flat.items():
+            missing = sorted(all_keys - texts.keys())
+            if missing:
+                logger.warning(f"⚠️ В локализации {lang} нет ключей ({len(missing)}): {', '.join(missing)}")
         
-        return text or key
+        return {
+            (lang, key): Template(text)
+            for lang, texts in flat.items()
+            for key, text in texts.items()
+        }
+    
+    def set_locales(self, locales: Dict[str, Dict]):
+        """Атомарная подмена локализаций (используется при горячей перезагрузке)"""
+        templates = self.build_templates(locales)
+        self.locales = locales
+        self.templates = templates
+        self.loaded = True
+    
+    def get_text(self, lang: str, key: str, **kwargs) -> str:
+        """Получение текста по ключу с подстановкой параметров"""
+        if not self.loaded:
+            self.load_locales()
+        template = self.templates.get((lang, key)) or self.templates.get((DEFAULT_LANG, key))
+        if template is None:
+            return key
+        
+        return template.render(kwargs) or key
     
     def translate_fruit(self, fruit_name: str, lang: str) -> str:
         """Перевод названия фрукта"""
-        if lang == "RUS":
-            return Config.FRUIT_TRANSLATIONS.get(fruit_name, fruit_name)
-        return fruit_name
+        return get_catalog().translate(fruit_name, lang)
     
     def get_fruit_emoji(self, fruit_name: str, lang: str) -> str:
         """Получение эмодзи для фрукта"""
-        from utils.filters import MessageFilter
-        return MessageFilter.get_fruit_emoji(fruit_name, lang)
+        return get_catalog().emoji(fruit_name, lang)
     
     def get_fruit_display(self, fruit_name: str, lang: str) -> str:
         """Получение отображаемого названия фрукта с эмодзи"""
-        if lang == "RUS":
-            translated = self.translate_fruit(fruit_name, lang)
-            emoji = self.get_fruit_emoji(fruit_name, lang)
-            return f"{emoji} {translated}"
-        else:
-            emoji = self.get_fruit_emoji(fruit_name, lang)
-            return f"{emoji} {fruit_name}"
-
-# Создаем глобальный экземпляр
+        return get_catalog().display(fruit_name, lang)
+
+# Создаем глобальный экземпляр (без чтения файлов при импорте)
 locale_manager = LocaleManager()
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+metrics.py - Метрики обработки обновлений
+
+Что считается:
+- по типам обновлений (внешний middleware диспетчера): количество, время
+  полной обработки, ошибки, обновления в обработке;
+- по обработчикам (middleware на каждом событии каждого роутера): то же
+  самое, с разбивкой "роутер / обработчик".
+
+Внешний middleware не видит, какой обработчик сработал, поэтому разбивка по
+обработчикам делается внутренними middleware, которые aiogram вызывает уже
+для найденного обработчика.
+
+Снимок в текстовом формате OpenMetrics периодически пишется в
+Config.METRICS_SNAPSHOT_PATH; те же данные показывает админ-команда /metrics.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+from config import Config, BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержки, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    __slots__ = ("counts", "total", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # Последняя - +Inf
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(LATENCY_BUCKETS)
+        self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
+
+class Series:
+    """Счётчики одной серии (тип обновления или обработчик)"""
+
+    __slots__ = ("count", "errors", "in_flight", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = Histogram()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started_at = time.time()
+        self.updates: Dict[str, Series] = {}
+        self.handlers: Dict[Tuple[str, str], Series] = {}
+
+    def update_series(self, event_type: str) -> Series:
+        series = self.updates.get(event_type)
+        if series is None:
+            series = self.updates[event_type] = Series()
+        return series
+
+    def handler_series(self, router: str, handler: str) -> Series:
+        key = (router, handler)
+        series = self.handlers.get(key)
+        if series is None:
+            series = self.handlers[key] = Series()
+        return series
+
+    def render_openmetrics(self) -> str:
+        """Снимок в текстовом формате OpenMetrics"""
+        lines = []
+        groups = (
+            ("bot_updates", "Обработка обновлений по типу", "type",
+             [((t,), s) for t, s in self.updates.items()]),
+            ("bot_handler", "Обработка по обработчикам", "router,handler",
+             [(k, s) for k, s in self.handlers.items()]),
+        )
+
+        for name, help_text, label_names, items in groups:
+            names = label_names.split(",")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"# HELP {name} {help_text}")
+            for values, series in items:
+                lines.append(f"{name}_total{{{_labels(names, values)}}} {series.count}")
+
+            lines.append(f"# TYPE {name}_errors counter")
+            for values, series in items:
+                lines.append(f"{name}_errors_total{{{_labels(names, values)}}} {series.errors}")
+
+            lines.append(f"# TYPE {name}_in_flight gauge")
+            for values, series in items:
+                lines.append(f"{name}_in_flight{{{_labels(names, values)}}} {series.in_flight}")
+
+            lines.append(f"# TYPE {name}_seconds histogram")
+            for values, series in items:
+                labels = _labels(names, values)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), series.latency.counts):
+                    cumulative += count
+                    lines.append(f'{name}_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_seconds_count{{{labels}}} {series.latency.total}")
+                lines.append(f"{name}_seconds_sum{{{labels}}} {series.latency.sum:.6f}")
+
+        lines.append("# TYPE bot_uptime_seconds gauge")
+        lines.append(f"bot_uptime_seconds {time.time() - self.started_at:.0f}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def top_handlers(self, limit: int = 15) -> List[Tuple[Tuple[str, str], Series]]:
+        """Обработчики по суммарному времени"""
+        return sorted(self.handlers.items(), key=lambda item: item[1].latency.sum, reverse=True)[:limit]
+
+
+def _labels(names: List[str], values: Tuple[str, ...]) -> str:
+    return ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+
+
+registry = MetricsRegistry()
+
+
+# ========== MIDDLEWARE ==========
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware диспетчера: полное время обработки обновления по типу"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        series = registry.update_series(getattr(event, "event_type", type(event).__name__))
+        series.count += 1
+        series.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            series.errors += 1
+            raise
+        finally:
+            series.in_flight -= 1
+            series.latency.observe(time.perf_counter() - start)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время конкретного обработчика"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        if callback is None:
+            return await handler(event, data)
+
+        # handlers.group_commands -> group_commands
+        router_name = callback.__module__.rsplit(".", 1)[-1]
+        series = registry.handler_series(router_name, callback.__name__)
+        series.count += 1
+        series.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            series.errors += 1
+            raise
+        finally:
+            series.in_flight -= 1
+            series.latency.observe(time.perf_counter() - start)
+
+
+def setup_metrics(dp: Dispatcher):
+    """Подключение middleware ко всем роутерам (вызывать после include_router)"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+
+    handler_middleware = HandlerMetricsMiddleware()
+    for router in dp.chain_tail:
+        for name, observer in router.observers.items():
+            if name in ("update", "error"):
+                continue
+            observer.middleware(handler_middleware)
+
+
+# ========== СНИМКИ ==========
+
+def get_snapshot_path() -> str:
+    return os.path.join(BASE_DIR, Config.METRICS_SNAPSHOT_PATH)
+
+
+def write_snapshot(text: str):
+    """Атомарная запись снимка (читатель не увидит полузаписанный файл)"""
+    path = get_snapshot_path()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+async def save_metrics_snapshot():
+    """Задача планировщика: запись снимка метрик раз в Config.METRICS_SNAPSHOT_INTERVAL секунд"""
+    try:
+        # Текст собирается в цикле событий (счётчики не меняются посреди сборки), пишется в потоке
+        await asyncio.to_thread(write_snapshot, registry.render_openmetrics())
+    except Exception as e:
+        logger.error(f"❌ Ошибка записи снимка метрик: {e}")
@@ -0,0 +1,265 @@
+"""
+scheduler.py - Планировщик периодических задач
+
+Один цикл на все задачи: он вычисляет ближайшее время запуска и спит ровно
+до него (или до добавления новой задачи), без опроса раз в минуту.
+
+Для каждой задачи:
+- расписание - интервал (interval, секунды) или время суток (daily_at="03:00");
+- время последнего запуска хранится в таблице scheduler_runs общей базы,
+  так что после перезапуска бота задача продолжает своё расписание;
+- пропущенный запуск (бот был выключен или цикл задержался) выполняется
+  один раз сразу, если опоздание не больше misfire_grace или catch_up=True,
+  иначе задача ждёт следующего слота;
+- jitter - случайная задержка, чтобы копии бота и соседние задачи не
+  стартовали в одну секунду;
+- max_instances - сколько запусков может идти одновременно; лишний запуск
+  пропускается;
+- run_on_start - первый запуск через first_delay после старта, даже если
+  по сохранённому расписанию ещё рано (дальше - обычное расписание).
+"""
+
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Максимальный сон цикла: перепроверка расписания после смены системного времени или сна машины
+MAX_SLEEP = 600
+
+
+class Job:
+    """Задача планировщика и её состояние"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: Optional[float] = None,
+                 daily_at: Optional[str] = None, first_delay: float = 0, jitter: float = 0,
+                 misfire_grace: Optional[float] = None, catch_up: bool = True,
+                 max_instances: int = 1, persistent: bool = True, run_on_start: bool = False):
+        if (interval is None) == (daily_at is None):
+            raise ValueError(f"{name}: нужно указать ровно одно из interval или daily_at")
+
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.daily_at = tuple(int(part) for part in daily_at.split(":")) if daily_at else None
+        self.first_delay = first_delay
+        self.jitter = jitter
+        self.misfire_grace = Config.SCHEDULER_MISFIRE_GRACE if misfire_grace is None else misfire_grace
+        self.catch_up = catch_up
+        self.max_instances = max_instances
+        self.persistent = persistent
+        self.run_on_start = run_on_start
+
+        self.last_run: Optional[float] = None      # Плановое время последнего запуска
+        self.next_slot: Optional[float] = None     # Плановое время следующего (без jitter)
+        self.next_run: Optional[float] = None      # Фактическое время следующего (с jitter)
+        self.tasks: set = set()
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def slot_after(self, moment: float) -> float:
+        """Ближайший слот расписания строго после moment"""
+        if self.interval is not None:
+            return moment + self.interval
+
+        hour, minute = self.daily_at
+        current = datetime.fromtimestamp(moment)
+        slot = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if slot <= current:
+            slot += timedelta(days=1)
+        return slot.timestamp()
+
+    def describe(self) -> str:
+        if self.interval is not None:
+            return f"каждые {self.interval:g} с"
+        return "ежедневно в {:02d}:{:02d}".format(*self.daily_at)
+
+
+class Scheduler:
+    def __init__(self, name: str, db_path: str = Config.DATABASE_PATH):
+        self.name = name
+        self.db_path = db_path
+        self.jobs: Dict[str, Job] = {}
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+    # ========== ХРАНЕНИЕ ==========
+
+    def get_connection(self):
+        """Подключение к общей базе"""
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def init_db(self):
+        """Создание таблицы запусков"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scheduler_runs (
+                    name TEXT PRIMARY KEY,
+                    last_run REAL NOT NULL,
+                    finished_at REAL,
+                    duration REAL,
+                    status TEXT,
+                    error TEXT
+                )
+            ''')
+            conn.commit()
+
+    def load_last_runs(self) -> Dict[str, float]:
+        """Плановое время последних запусков сохраняемых задач"""
+        self.init_db()
+        with self.get_connection() as conn:
+            rows = conn.execute('SELECT name, last_run FROM scheduler_runs').fetchall()
+        return dict(rows)
+
+    def save_run(self, name: str, last_run: float, duration: float, error: Optional[str]):
+        with self.get_connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO scheduler_runs (name, last_run, finished_at, duration, status, error) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (name, last_run, time.time(), duration, "error" if error else "ok", error)
+            )
+            conn.commit()
+
+    # ========== РАСПИСАНИЕ ==========
+
+    def add_job(self, name: str, func: Callable[[], Awaitable], **options) -> Job:
+        """Добавление задачи (параметры - как у Job); работающий цикл сразу пересчитает сон"""
+        job = Job(name, func, **options)
+        self.jobs[name] = job
+        if self._running:
+            self._plan_first(job, time.time())
+            self._wakeup.set()
+        return job
+
+    def _plan(self, job: Job, slot: float):
+        job.next_slot = slot
+        job.next_run = slot + (random.uniform(0, job.jitter) if job.jitter else 0)
+
+    def _plan_first(self, job: Job, now: float):
+        """Первый запуск: по сохранённому расписанию или через first_delay"""
+        if job.run_on_start:
+            self._plan(job, now + job.first_delay)
+            return
+        if job.last_run is None:
+            self._plan(job, now + job.first_delay if job.interval is not None else job.slot_after(now))
+            return
+
+        slot = job.slot_after(job.last_run)
+        late = now - slot
+        if late <= 0:
+            self._plan(job, slot)
+        elif late <= job.misfire_grace or job.catch_up:
+            # Все пропущенные слоты схлопываются в один запуск
+            logger.info(f"⏰ {job.name}: пропущен запуск ({late / 60:.0f} мин назад), выполняю сейчас")
+            self._plan(job, now + job.first_delay)
+        else:
+            logger.info(f"⏰ {job.name}: пропущен запуск ({late / 60:.0f} мин назад), жду следующий слот")
+            self._plan(job, job.slot_after(now))
+
+    def _fire(self, job: Job, now: float):
+        """Запуск задачи, если лимит одновременных запусков позволяет"""
+        slot = job.next_slot
+        late = now - job.next_run
+
+        # Следующий слот - от планового времени, а не от фактического, чтобы расписание не дрейфовало
+        next_slot = job.slot_after(slot)
+        if next_slot <= now:
+            next_slot = job.slot_after(now)
+        self._plan(job, next_slot)
+
+        if late > job.misfire_grace and not job.catch_up:
+            job.skipped += 1
+            logger.warning(f"⏰ {job.name}: опоздание {late:.0f} с больше допустимого, запуск пропущен")
+            return
+
+        if len(job.tasks) >= job.max_instances:
+            job.skipped += 1
+            logger.warning(f"⏰ {job.name}: предыдущий запуск ещё идёт, запуск пропущен")
+            return
+
+        task = asyncio.create_task(self._execute(job, slot), name=f"{self.name}:{job.name}")
+        job.tasks.add(task)
+        task.add_done_callback(job.tasks.discard)
+
+    async def _execute(self, job: Job, slot: float):
+        started = time.perf_counter()
+        error = None
+        job.runs += 1
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.errors += 1
+            error = str(e)
+            logger.error(f"❌ Ошибка задачи {job.name}: {e}")
+
+        job.last_run = slot
+        if job.persistent:
+            try:
+                await asyncio.to_thread(self.save_run, job.name, slot, time.perf_counter() - started, error)
+            except sqlite3.Error as e:
+                logger.error(f"❌ Не удалось сохранить запуск {job.name}: {e}")
+
+    # ========== ЦИКЛ ==========
+
+    async def run(self):
+        """Цикл планировщика (останавливается отменой задачи вместе с запущенными задачами)"""
+        if any(job.persistent for job in self.jobs.values()):
+            last_runs = await asyncio.to_thread(self.load_last_runs)
+            for job in self.jobs.values():
+                if job.persistent:
+                    job.last_run = last_runs.get(job.name)
+
+        now = time.time()
+        for job in self.jobs.values():
+            self._plan_first(job, now)
+            logger.info(
+                f"⏰ {job.name}: {job.describe()}, следующий запуск "
+                f"{datetime.fromtimestamp(job.next_run).strftime('%d.%m %H:%M:%S')}"
+            )
+
+        self._running = True
+        try:
+            while True:
+                now = time.time()
+                for job in list(self.jobs.values()):
+                    if job.next_run <= now:
+                        self._fire(job, now)
+
+                delay = min((job.next_run for job in self.jobs.values()), default=now + MAX_SLEEP) - time.time()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(max(delay, 0), MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._running = False
+            tasks = [task for job in self.jobs.values() for task in job.tasks]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def status(self) -> List[Dict]:
+        """Состояние задач (для админ-панели и логов)"""
+        return [
+            {
+                "name": job.name,
+                "schedule": job.describe(),
+                "last_run": job.last_run,
+                "next_run": job.next_run,
+                "running": len(job.tasks),
+                "runs": job.runs,
+                "errors": job.errors,
+                "skipped": job.skipped,
+            }
+            for job in self.jobs.values()
+        ]
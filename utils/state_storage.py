@@ -0,0 +1,253 @@
+"""
+state_storage.py - Состояние, переживающее перезапуск бота
+
+- SQLiteStorage - хранилище FSM для aiogram (выбор фруктов, рассылка,
+  чаты с админом, публикации). Запись - в SQLite из пула потоков, чтение -
+  из ограниченного кэша в памяти (TTLStore), так что обычный callback
+  в базу за чтением не ходит.
+- StateMap - небольшой словарь "ключ -> значение" с записью в ту же базу
+  (активные чаты админ <-> пользователь). Все живые записи держатся в
+  памяти, проверка "есть ли чат" - обычный поиск в dict.
+
+Данные сериализуются компактным JSON, у каждой записи свой срок жизни.
+База отдельная (Config.STATE_DB_PATH, WAL), чтобы не мешать основной.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, MutableMapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import Config, BASE_DIR
+from utils.ttl_store import TTLStore
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(value: Any) -> str:
+    """Компактный JSON: без пробелов и \\u-экранирования кириллицы"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class StateDB:
+    """Подключение к базе состояний и создание таблиц"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(BASE_DIR, Config.STATE_DB_PATH)
+        self.init_db()
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_db(self):
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fsm_state (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS state_map (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            ''')
+            conn.commit()
+
+    def purge(self) -> int:
+        """Удаление истёкших записей"""
+        now = time.time()
+        with self.get_connection() as conn:
+            removed = conn.execute('DELETE FROM fsm_state WHERE expires_at < ?', (now,)).rowcount
+            removed += conn.execute(
+                'DELETE FROM state_map WHERE expires_at IS NOT NULL AND expires_at < ?', (now,)
+            ).rowcount
+            conn.commit()
+        return removed
+
+
+_state_db: Optional[StateDB] = None
+
+
+def get_state_db() -> StateDB:
+    """Общая база состояний (создаётся при первом обращении, заодно чистит истёкшее)"""
+    global _state_db
+    if _state_db is None:
+        _state_db = StateDB()
+        removed = _state_db.purge()
+        if removed:
+            logger.info(f"🧹 Удалено истёкших состояний: {removed}")
+    return _state_db
+
+
+# ========== FSM ==========
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище aiogram в SQLite с кэшем в памяти"""
+
+    def __init__(self, db: Optional[StateDB] = None, ttl: Optional[float] = None,
+                 cache_size: Optional[int] = None):
+        self.db = db or get_state_db()
+        self.ttl = ttl or Config.FSM_STATE_TTL
+        # Значение в кэше: (state, data в JSON) - строка гарантирует копию при каждом чтении
+        self.cache = TTLStore(maxsize=cache_size or Config.FSM_CACHE_SIZE, ttl=self.ttl)
+
+    @staticmethod
+    def make_key(key: StorageKey) -> str:
+        """Компактный ключ: bot:chat:user[:thread[:business[:destiny]]]"""
+        parts = [key.bot_id, key.chat_id, key.user_id]
+        tail = [key.thread_id or "", key.business_connection_id or "",
+                "" if key.destiny == "default" else key.destiny]
+        while tail and tail[-1] == "":
+            tail.pop()
+        return ":".join(str(part) for part in parts + tail)
+
+    def _read(self, key: str) -> Tuple[Optional[str], str]:
+        with self.db.get_connection() as conn:
+            row = conn.execute(
+                'SELECT state, data FROM fsm_state WHERE key = ? AND expires_at >= ?',
+                (key, time.time())
+            ).fetchone()
+        return (row[0], row[1] or "{}") if row else (None, "{}")
+
+    def _write(self, key: str, state: Optional[str], data: str):
+        with self.db.get_connection() as conn:
+            if state is None and data == "{}":
+                conn.execute('DELETE FROM fsm_state WHERE key = ?', (key,))
+            else:
+                conn.execute(
+                    'INSERT OR REPLACE INTO fsm_state (key, state, data, expires_at) VALUES (?, ?, ?, ?)',
+                    (key, state, data, time.time() + self.ttl)
+                )
+            conn.commit()
+
+    async def _load(self, key: str) -> Tuple[Optional[str], str]:
+        record = self.cache.get(key)
+        if record is None:
+            record = await asyncio.to_thread(self._read, key)
+            self.cache.set(key, record)
+        return record
+
+    async def _store(self, key: str, state: Optional[str], data: str):
+        self.cache.set(key, (state, data))
+        await asyncio.to_thread(self._write, key, state, data)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.make_key(key)
+        _, data = await self._load(storage_key)
+        value = state.state if isinstance(state, State) else state
+        await self._store(storage_key, value, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.make_key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.make_key(key)
+        state, _ = await self._load(storage_key)
+        await self._store(storage_key, state, dumps(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.make_key(key))
+        return json.loads(data)
+
+    async def close(self) -> None:
+        self.cache.clear()
+
+
+# ========== СЛОВАРИ СОСТОЯНИЯ ==========
+
+class StateMap(MutableMapping):
+    """
+    Словарь с записью в базу состояний
+
+    Ключи и значения - всё, что сериализуется в JSON (числа, строки, списки).
+    Истёкшие записи не загружаются и пропадают при обращении. База читается
+    при первом обращении, так что словарь можно создавать при импорте модуля.
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, db: Optional[StateDB] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._db = db
+        self._loaded: Optional[Dict[Any, Tuple[Any, Optional[float]]]] = None
+
+    @property
+    def db(self) -> StateDB:
+        if self._db is None:
+            self._db = get_state_db()
+        return self._db
+
+    @property
+    def _data(self) -> Dict[Any, Tuple[Any, Optional[float]]]:
+        if self._loaded is None:
+            self._loaded = self._load()
+        return self._loaded
+
+    def _load(self) -> Dict[Any, Tuple[Any, Optional[float]]]:
+        data = {}
+        with self.db.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT key, value, expires_at FROM state_map '
+                'WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)',
+                (self.namespace, time.time())
+            ).fetchall()
+        for key, value, expires_at in rows:
+            data[json.loads(key)] = (json.loads(value), expires_at)
+        if rows:
+            logger.info(f"📂 Восстановлено {len(rows)} записей {self.namespace}")
+        return data
+
+    def _expired(self, key) -> bool:
+        _, expires_at = self._data[key]
+        if expires_at is not None and expires_at < time.time():
+            del self[key]
+            return True
+        return False
+
+    def __getitem__(self, key):
+        if key not in self._data or self._expired(key):
+            raise KeyError(key)
+        return self._data[key][0]
+
+    def __setitem__(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        with self.db.get_connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO state_map (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.namespace, dumps(key), dumps(value), expires_at)
+            )
+            conn.commit()
+
+    def __delitem__(self, key):
+        del self._data[key]
+        with self.db.get_connection() as conn:
+            conn.execute('DELETE FROM state_map WHERE namespace = ? AND key = ?', (self.namespace, dumps(key)))
+            conn.commit()
+
+    def __contains__(self, key) -> bool:
+        return key in self._data and not self._expired(key)
+
+    def __iter__(self) -> Iterator:
+        for key in list(self._data):
+            if key in self._data and not self._expired(key):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -10,13 +10,13 @@ from typing import List, Dict, Optional
 from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 
-from database import Database
+from utils.app_context import db
 from config import Config
 from utils.messages import locale_manager
 from utils.filters import MessageFilter
+from utils.fruit_catalog import get_catalog
 
 logger = logging.getLogger(__name__)
-db = Database()
 
 async def check_user_subscription(
     user_id: int, 
@@ -123,6 +123,7 @@ async def send_fruit_notification(
     
     logger.info(f"Sending {fruit_name} notification to {len(user_ids)} users")
     
+    catalog = get_catalog()
     success_count = 0
     for user_id in user_ids:
         try:
@@ -133,13 +134,8 @@ async def send_fruit_notification(
             
             lang = user.get("language", "RUS")
             
-            # Формируем сообщение
-            fruit_display = MessageFilter.get_fruit_emoji(fruit_name, lang)
-            if lang == "RUS":
-                fruit_name_rus = Config.FRUIT_TRANSLATIONS.get(fruit_name, fruit_name)
-                message_text = f"{fruit_display} x{quantity} {fruit_name_rus} — stock"
-            else:
-                message_text = f"{fruit_display} x{quantity} {fruit_name} — stock"
+            # Формируем сообщение из готовых фрагментов каталога
+            message_text = catalog.render_stock(fruit_name, quantity, lang)
             
             # Отправляем уведомление
             success = await send_notification(user_id, bot, message_text)
@@ -218,63 +214,55 @@ async def send_totem_notification(
     
     logger.info(f"Totem notifications sent: {success_count}/{len(user_ids)}")
 
-async def daily_subscription_check(bot: Bot):
+async def scheduled_subscription_check(bot: Bot):
     """
-    Ежедневная проверка подписок всех пользователей
-    Запускается как фоновая задача
+    Плановая проверка подписок всех пользователей
+    Один проход; периодичность (Config.SUBSCRIPTION_CHECK_INTERVAL) задаёт планировщик
     """
-    while True:
-        try:
-            logger.info("Starting daily subscription check...")
-            users = db.get_all_users()
-            unsubscribed_users = []
-            
-            for user in users:
-                user_id = user["user_id"]
-                
-                # Проверяем подписку (игнорируем исключения для проверки)
-                is_subscribed = await check_user_subscription(
-                    user_id,
-                    Config.REQUIRED_GROUP_ID,
-                    bot,
-                    ignore_exceptions=True
-                )
-                
-                # Проверяем, есть ли пользователь в исключениях
-                is_exception = db.is_exception(user_id)
-                
-                # Если пользователь в исключениях, считаем его подписанным
-                if is_exception:
-                    is_subscribed = True
-                
-                # Обновляем статус в БД
-                db.update_subscription(user_id, is_subscribed)
-                
-                # Если пользователь отписался и не в исключениях, отправляем уведомление
-                if user["is_subscribed"] and not is_subscribed and not is_exception:
-                    unsubscribed_users.append(user_id)
-            
-            # Отправляем уведомления отписавшимся пользователям
-            for user_id in unsubscribed_users:
-                user = db.get_user(user_id)
-                if user:
-                    lang = user.get("language", "RUS")
-                    lang_code = "ru" if lang == "RUS" else "en"
-                    
-                    text = locale_manager.get_text(lang_code, "notifications.unsubscribed")
-                    await send_notification(user_id, bot, text)
-                    
-                    # Небольшая задержка
-                    await asyncio.sleep(0.1)
+    logger.info("Starting scheduled subscription check...")
+    users = db.get_all_users()
+    unsubscribed_users = []
+    
+    for user in users:
+        user_id = user["user_id"]
+        
+        # Проверяем подписку (игнорируем исключения для проверки)
+        is_subscribed = await check_user_subscription(
+            user_id,
+            Config.REQUIRED_GROUP_ID,
+            bot,
+            ignore_exceptions=True
+        )
+        
+        # Проверяем, есть ли пользователь в исключениях
+        is_exception = db.is_exception(user_id)
+        
+        # Если пользователь в исключениях, считаем его подписанным
+        if is_exception:
+            is_subscribed = True
+        
+        # Обновляем статус в БД
+        db.update_subscription(user_id, is_subscribed)
+        
+        # Если пользователь отписался и не в исключениях, отправляем уведомление
+        if user["is_subscribed"] and not is_subscribed and not is_exception:
+            unsubscribed_users.append(user_id)
+    
+    # Отправляем уведомления отписавшимся пользователям
+    for user_id in unsubscribed_users:
+        user = db.get_user(user_id)
+        if user:
+            lang = user.get("language", "RUS")
+            lang_code = "ru" if lang == "RUS" else "en"
             
-            logger.info(f"Daily subscription check completed. Checked {len(users)} users, "
-                       f"{len(unsubscribed_users)} unsubscribed.")
+            text = locale_manager.get_text(lang_code, "notifications.unsubscribed")
+            await send_notification(user_id, bot, text)
             
-        except Exception as e:
-            logger.error(f"Error in daily subscription check: {e}")
-        
-        # Ждем интервал до следующей проверки
-        await asyncio.sleep(Config.SUBSCRIPTION_CHECK_INTERVAL)
+            # Небольшая задержка
+            await asyncio.sleep(0.1)
+    
+    logger.info(f"Scheduled subscription check completed. Checked {len(users)} users, "
+               f"{len(unsubscribed_users)} unsubscribed.")
 
 async def verify_all_subscriptions(bot: Bot) -> Dict[str, int]:
     """
@@ -0,0 +1,91 @@
+"""
+ttl_store.py - Ограниченное хранилище ключ-значение с TTL и LRU-вытеснением
+
+Память не растёт бесконечно: записей не больше maxsize (самые давно
+использованные вытесняются), а устаревшие по TTL удаляются при обращении.
+Используется как кэш чтения хранилища FSM (state_storage.SQLiteStorage).
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLStore:
+    """Словарь с ограничением размера (LRU) и временем жизни записей"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        
+        # Счётчики для метрик
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получение значения (обращение продлевает жизнь записи в LRU, но не TTL)"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохранение значения; при переполнении вытесняются самые старые записи"""
+        now = time.monotonic()
+        self._data[key] = (value, now + (ttl if ttl is not None else self.ttl))
+        self._data.move_to_end(key)
+        
+        self._purge_head(now)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удаление записи"""
+        item = self._data.pop(key, None)
+        return item[0] if item is not None else default
+    
+    def clear(self):
+        self._data.clear()
+    
+    def _purge_head(self, now: float):
+        """Удаление устаревших записей с начала очереди (амортизированно O(1))"""
+        while self._data:
+            key, (_, expires_at) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+            self.expirations += 1
+    
+    def stats(self) -> Dict[str, int]:
+        """Метрики хранилища"""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+worker.py - Процессы доставки уведомлений из очереди
+
+Используется вместе с DELIVERY_MODE=queue: бот (bot.py) разбирает посты
+канала и ставит готовые сообщения в очередь, а эти процессы забирают их
+пачками и отправляют. У каждого процесса своя HTTP-сессия и своя доля
+общего лимита Config.DELIVERY_RATE_LIMIT, так что рассылка масштабируется
+по ядрам без изменений в обработчиках.
+
+Запуск:
+    python worker.py              # Config.DELIVERY_WORKERS процессов
+    python worker.py --workers 4
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+from config import Config
+from utils.delivery import RateLimiter, deliver_batch, get_queue
+from utils import lifecycle
+from utils.logging_setup import setup_logging
+
+LOG_FORMAT = "%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s"
+setup_logging(LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+# Как часто первый воркер чистит выполненные задания (секунд)
+PURGE_INTERVAL = 600
+
+
+async def run_worker(index: int, total: int):
+    """Цикл одного воркера: аренда пачки -> отправка -> подтверждение"""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    limiter = RateLimiter(Config.DELIVERY_RATE_LIMIT / total)
+    queue = get_queue()
+
+    stop = asyncio.Event()
+    lifecycle.install_signal_handlers(stop.set)
+
+    # Своя сессия у каждого процесса
+    bot = Bot(
+        token=Config.BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+    logger.info(f"🚚 Воркер {worker_id} запущен ({Config.DELIVERY_RATE_LIMIT / total:.1f} сообщений/с)")
+
+    sent_total = 0
+    failed_total = 0
+    last_purge = 0.0
+
+    try:
+        while not stop.is_set():
+            if index == 0 and time.monotonic() - last_purge > PURGE_INTERVAL:
+                removed = queue.purge(Config.DELIVERY_KEEP_SECONDS)
+                if removed:
+                    logger.info(f"🧹 Удалено выполненных заданий: {removed}")
+                last_purge = time.monotonic()
+
+            jobs = queue.lease(worker_id, Config.DELIVERY_BATCH_SIZE, Config.DELIVERY_LEASE_SECONDS)
+            if not jobs:
+                # Очередь пуста - ждём секунду или сигнал остановки
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            sent, failed = await deliver_batch(bot, jobs, limiter, stop)
+            sent_total += sent
+            failed_total += failed
+            logger.info(f"📤 Пачка: отправлено {sent}, ошибок {failed} (всего {sent_total}/{failed_total})")
+
+    except Exception as e:
+        logger.error(f"💥 Критическая ошибка воркера {worker_id}: {e}")
+
+    finally:
+        await bot.session.close()
+        logger.info(f"👋 Воркер {worker_id} остановлен: отправлено {sent_total}, ошибок {failed_total}")
+
+
+def worker_main(index: int, total: int):
+    """Точка входа дочернего процесса"""
+    # Поток-писатель логов не переживает fork - запускаем свой
+    listener = setup_logging(LOG_FORMAT)
+    try:
+        asyncio.run(run_worker(index, total))
+    finally:
+        # Дочерний процесс завершается без atexit - дописываем логи явно
+        listener.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Процессы доставки уведомлений")
+    parser.add_argument("--workers", type=int, default=Config.DELIVERY_WORKERS, help="число процессов")
+    args = parser.parse_args()
+
+    if not Config.BOT_TOKEN:
+        logger.error("❌ BOT_TOKEN не найден!")
+        return 1
+
+    if Config.DELIVERY_MODE != "queue":
+        logger.warning("⚠️ DELIVERY_MODE не queue - бот рассылает сам, очередь будет пустой")
+
+    # Создаём таблицу до запуска воркеров
+    stats = get_queue().stats()
+    logger.info(f"📦 Очередь: {stats}")
+
+    processes = [
+        multiprocessing.Process(target=worker_main, args=(i, args.workers), name=f"delivery-{i}")
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # SIGTERM родителю пересылаем воркерам; SIGINT (Ctrl+C) они получают сами
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in processes if p.is_alive()])
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())